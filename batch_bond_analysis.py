@@ -4,20 +4,42 @@
 """
 
 import akshare as ak
+import argparse
 import pandas as pd
 import requests
 import os
 import numpy as np
 from datetime import datetime, time as dt_time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from tqdm import tqdm
 import time
 import re
+import unicodedata
 import threading
 import random
+import asyncio
+import sqlite3
+import json
+import hashlib
+import shutil
+import zipfile
+import bisect
+from abc import ABC, abstractmethod
+from contextlib import closing
 from dataclasses import dataclass, field
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Iterable
+from collections import deque, OrderedDict
 import warnings
+from urllib.parse import urlsplit
+from xml.sax.saxutils import escape
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.ipc as pa_ipc
+except ImportError:
+    pa = None
 
 
 # ==================== 配置模块 ====================
@@ -28,11 +50,91 @@ class Config:
     ONLINE_MODE: bool = True
     CACHE_DIR: str = "cache"
     CACHE_FILE_BASE: str = "bond_metadata_cache"
+    METADATA_DB_FILE: str = "bond_metadata.db"
+    METADATA_JOURNAL_FILE: str = "bond_metadata_journal.jsonl"
+    DEAL_CACHE_BASE: str = "bond_deal_cache"
+    CACHE_FORMAT: str = "parquet"  # 可选 parquet / arrow / csv，未安装 pyarrow 时回退为 csv
+    MANIFEST_FILE: str = "manifest.json"
+    CACHE_RETENTION_DAYS: Optional[int] = None  # 设置后早于最新分区该天数的日期分区将被删除，默认不清理
+    CACHE_MAX_PARTITIONS: Optional[int] = None  # 最多保留的日期分区数，None 表示不限
+    CACHE_COMPACT_AFTER_DAYS: Optional[int] = None  # 设置后早于最新分区该天数的日期分区转换为 CACHE_FORMAT 并移除旧版文件，默认不压缩
+    DEAL_HISTORY_DIR: str = "deal_history"  # CACHE_DIR 下的历史成交时间序列库
+    ROLLING_WINDOW_DAYS: int = 20  # 滚动统计窗口（按该券有成交的交易日计）
+    CURVE_CACHE_DIR: str = os.path.join("tools", "cache")  # tools/plot_bond_yield_curve.py 的收益率曲线缓存目录
     OUTPUT_FILE_BASE: str = "bond_analysis_results"
+    OUTPUT_FORMATS: List[str] = field(default_factory=lambda: ["xlsx"])  # 可任意组合 xlsx / parquet / jsonl / html
+    OUTPUT_CHUNK_ROWS: int = 5000  # 非 Excel 输出每块写入的行数
     CONCURRENT_THREADS: int = 1
-    SAVE_INTERVAL: int = 10
+    JOURNAL_COMPACT_INTERVAL: int = 50  # 每写入多少条日志合并一次到元数据库
     RETRY_COUNT: int = 5
     DELAY_BETWEEN_REQUESTS: float = 5.0
+    CHINAMONEY_BASE_URL: str = "https://www.chinamoney.com.cn"  # 可指向 tools/replay_server.py 离线回放
+    HTTP_RECORD_FILE: Optional[str] = None  # 设置后将元数据接口的请求与响应录制到该 JSON Lines 文件
+    
+    # 元数据抓取引擎：async 为自适应令牌桶异步抓取，thread 为固定延迟线程池
+    FETCH_ENGINE: str = "async"
+    ASYNC_CONCURRENCY: int = 4
+    RATE_INITIAL: float = 0.2  # 初始请求速率（次/秒）
+    RATE_MIN: float = 0.02
+    RATE_MAX: float = 2.0
+    RATE_ADDITIVE_INCREASE: float = 0.01  # 每次请求成功后速率加性增量
+    RATE_MULTIPLICATIVE_DECREASE: float = 0.5  # 触发 403/421 后速率乘数
+    
+    # 失败保护：负缓存、熔断与单次运行预算
+    NEGATIVE_CACHE_TTL_HOURS: float = 24.0  # 抓取失败债券的冷却时间，连续失败时按 2 的幂次增长
+    NEGATIVE_CACHE_MAX_TTL_DAYS: float = 30.0
+    CIRCUIT_BREAKER_THRESHOLD: int = 5  # 连续触发访问限制达到该次数后熔断
+    CIRCUIT_BREAKER_COOLDOWN: float = 300.0  # 熔断后暂停请求的秒数，之后放行一次试探请求
+    RUN_TIME_BUDGET_SECONDS: Optional[float] = 1800.0  # 单次运行抓取总耗时上限，None 表示不限
+    RUN_REQUEST_BUDGET: Optional[int] = 2000  # 单次运行请求总数上限，None 表示不限
+    
+    # 批量列表发现：按条件分页拉取 BondMarketInfoList2，一次性建立简称 -> bondDefinedCode 映射
+    UNIVERSE_BULK_DISCOVERY: bool = True
+    UNIVERSE_QUERIES: List[Dict[str, str]] = field(default_factory=lambda: [
+        {"bondName": "国债"}  # 也可按类型分页，如 {"bondType": "<中国货币网债券类型代码>"}
+    ])
+    UNIVERSE_PAGE_SIZE: int = 500
+    UNIVERSE_REFRESH_HOURS: float = 12.0  # 距上次列表超过该时长且存在未知债券时才重新列表
+    RESOLVER_TRUST_FALLBACK: bool = False  # 是否直接复用搜索回退（取首条）得到的代码；默认不复用，每次重新搜索，回退匹配均记入审计表
+    
+    # 报表期限分组：(标题, 最小剩余天数, 最大剩余天数)，两端均含，分组之间可以重叠（如累计分组）
+    REPORT_BUCKETS: List[tuple] = field(default_factory=lambda: [
+        ("小于6个月到期债券", 0, 180),
+        ("小于1年到期债券", 0, 365),
+        ("小于3年到期债券", 0, 1095)
+    ])
+    REPORT_YIELD_CUTOFF: float = 0.67  # 只保留税后收益率不低于组内最高值该比例的债券
+    REPORT_TOP_N: int = 10  # 按成交量取前 N 只
+    
+    # 盘中监控：按间隔重新拉取成交快照，只重算发生变化的债券
+    WATCH_INTERVAL_SECONDS: float = 60.0
+    WATCH_TOP_K: int = 10  # 每个期限分组展示的债券数（分组与收益率比例同 REPORT_BUCKETS / REPORT_YIELD_CUTOFF）
+    
+    # 定价引擎：由成交净价批量求解到期收益率
+    PRICING_TOLERANCE: float = 1e-9  # 全价残差容忍度（元/百元面值）
+    PRICING_MAX_ITER: int = 50
+    COUPON_SCHEDULE_CACHE_SIZE: int = 8192  # 付息日表 LRU 缓存条数（按 到期日/付息频率/结算日 区分）
+    
+    # 收益率曲线：对 CURVE_CACHE_DIR 中的中债国债曲线逐日拟合 Nelson-Siegel-Svensson 参数
+    CURVE_HISTORY_FILE: str = "china_bond_yield_cache"  # 与 tools/plot_bond_yield_curve.py 的缓存同名
+    CURVE_PARAMS_FILE: str = "china_bond_nss_params"
+    CURVE_MAX_AGE_DAYS: int = 10  # 结算日与最近曲线日期相差超过该天数时不计算曲线利差
+    RICH_CHEAP_THRESHOLD_BP: float = 5.0  # 相对拟合曲线的利差超过该值（BP）时标记偏便宜/偏贵
+    CURVE_WARM_START_MAX_RMSE_BP: float = 5.0  # 热启动拟合误差超过该值（BP）时改用网格初值重拟合
+    
+    # 情景重估：平移、扭曲（正为陡峭化、负为平坦化）及曲线缓存中的历史日间变动
+    SCENARIO_PARALLEL_SHIFTS_BP: List[float] = field(default_factory=lambda: [-100, -50, -25, 25, 50, 100, 200])
+    SCENARIO_TWIST_BP: List[float] = field(default_factory=lambda: [25, 50, -25, -50])
+    SCENARIO_HISTORY_DAYS: Optional[int] = None  # 只取最近 N 个历史日间变动，None 表示全部
+    SCENARIO_WORKERS: Optional[int] = None  # 重估进程数，None 表示 CPU 核数，1 表示不使用进程池
+    SCENARIO_CHUNK_ELEMENTS: int = 4_000_000  # 每块 情景数 × 现金流矩阵元素数 上限，控制单块内存
+    SCENARIO_OUTPUT_FILE_BASE: str = "bond_scenario_results"
+    
+    # 持有期收益：各持有天数与退出收益率假设下提前卖出的收益
+    HOLDING_HORIZONS_DAYS: List[int] = field(default_factory=lambda: [30, 90, 180, 365, 730, 1095])
+    HOLDING_EXIT_SHIFTS_BP: List[float] = field(default_factory=lambda: [-50, -25, 0, 25, 50])
+    HOLDING_REINVEST_RATE: Optional[float] = None  # 票息再投资年化收益率（%），None 表示按各券到期收益率再投资
+    HOLDING_OUTPUT_FILE_BASE: str = "bond_holding_results"
     
     USER_AGENTS: List[str] = field(default_factory=lambda: [
         "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/121.0.0.0 Safari/537.36",
@@ -45,6 +147,12 @@ class Config:
         "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 Chrome/121.0.0.0 Safari/537.36"
     ])
 
+    # 元数据字段有效期（天），None 表示债券条款不会变化、永不过期
+    METADATA_FIELD_TTL_DAYS: Dict[str, Optional[int]] = field(default_factory=lambda: {
+        'maturity_date': None, 'coupon_rate': None, 'frequency': None,
+        'bond_type': 180, 'coupon_type': 180
+    })
+
     # 列映射配置
     HEADER_MAPPING: Dict[str, str] = field(default_factory=lambda: {
         '债券简称': '债券简称', '债券类型': '债券类型', '剩余天数': '剩余天数',
@@ -52,458 +160,3346 @@ class Config:
         '到期日': '到期日', '票面利率': '票面利率', '付息频率': '付息频率',
         '付息方式': '付息方式', '加权收益率': '加权收益率',
         '最新收益率': '最新收益率', '成交净价': '成交净价',
-        '交易量': '成交额(亿元)', '成交时间': '成交时间'
+        '交易量': '成交额(亿元)', '成交时间': '成交时间',
+        '应计利息': '应计利息', '全价': '全价', '到期收益率': '到期收益率(计算)',
+        '收益率偏差': '收益率偏差(BP)', '麦考利久期': '麦考利久期', '修正久期': '修正久期',
+        '凸性': '凸性', 'DV01': 'DV01', '曲线收益率': '曲线收益率', '曲线利差': '曲线利差(BP)',
+        '估值信号': '估值信号'
     })
 
     COLS_ORDER: List[str] = field(default_factory=lambda: [
         '债券简称', '债券类型', '剩余天数', '剩余期限_格式化', '税后年收益率',
         '到期日', '票面利率', '付息频率', '付息方式', '加权收益率',
-        '最新收益率', '成交净价', '交易量', '成交时间'
+        '最新收益率', '成交净价', '交易量', '成交时间',
+        '应计利息', '全价', '到期收益率', '收益率偏差',
+        '麦考利久期', '修正久期', '凸性', 'DV01', '曲线收益率', '曲线利差', '估值信号'
     ])
 
 
 config = Config()
 
 
-# ==================== 缓存管理模块 ====================
+def normalize_symbol(name: Any) -> str:
+    """规范化债券简称：全角转半角并去除所有空白，作为全局统一的匹配键"""
+    if not isinstance(name, str):
+        return ""
+    return "".join(unicodedata.normalize('NFKC', name).split())
 
-class CacheManager:
-    """缓存管理器 - 负责所有缓存操作"""
+
+# ==================== 存储后端模块 ====================
+
+class StorageBackend(ABC):
+    """缓存存储后端基类 - 路径均不含扩展名，由具体后端决定文件格式"""
     
-    def __init__(self, config: Config):
-        self._config = config
-        self._lock = threading.Lock()
+    EXTENSION = ''
     
-    @property
-    def cache_dir(self) -> str:
-        return self._config.CACHE_DIR
+    def path(self, base_path: str) -> str:
+        return base_path + self.EXTENSION
     
-    @property
-    def cache_file_base(self) -> str:
-        return self._config.CACHE_FILE_BASE
+    def exists(self, base_path: str) -> bool:
+        return os.path.exists(self.path(base_path))
     
-    def is_within_cache_window(self) -> bool:
-        """判断当前时间是否处于交易日的 8:00-20:00 之间"""
-        if not self._config.ONLINE_MODE:
-            return False
-        
-        now = datetime.now()
-        if now.weekday() >= 5:
-            return False
-        
-        current_time = now.time()
-        return dt_time(8, 0) <= current_time <= dt_time(20, 0)
+    @abstractmethod
+    def read(self, base_path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """读取整张表，columns 为空时读取全部列"""
     
-    def get_latest_cache_date(self) -> tuple:
-        """获取最新的缓存日期"""
-        if not os.path.exists(self._config.CACHE_DIR):
-            return None, None
+    @abstractmethod
+    def write(self, df: pd.DataFrame, base_path: str) -> None:
+        """原子写入整张表"""
+    
+    def _prepare_dir(self, base_path: str) -> str:
+        """创建目录并返回写入用的临时路径"""
+        target = self.path(base_path)
+        target_dir = os.path.dirname(target)
+        if target_dir:
+            os.makedirs(target_dir, exist_ok=True)
+        return target + ".tmp"
+
+
+class CsvBackend(StorageBackend):
+    """CSV 存储（utf-8-sig，兼容旧版缓存）"""
+    
+    EXTENSION = '.csv'
+    
+    def read(self, base_path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        return pd.read_csv(self.path(base_path), encoding='utf-8-sig', usecols=columns)
+    
+    def write(self, df: pd.DataFrame, base_path: str) -> None:
+        tmp_path = self._prepare_dir(base_path)
+        df.to_csv(tmp_path, index=False, encoding='utf-8-sig')
+        os.replace(tmp_path, self.path(base_path))
+
+
+class ParquetBackend(StorageBackend):
+    """Parquet 列式存储 - 带类型、zstd 压缩，支持内存映射与按列读取"""
+    
+    EXTENSION = '.parquet'
+    
+    def read(self, base_path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        table = pq.read_table(self.path(base_path), columns=columns, memory_map=True)
+        return table.to_pandas()
+    
+    def write(self, df: pd.DataFrame, base_path: str) -> None:
+        tmp_path = self._prepare_dir(base_path)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        pq.write_table(table, tmp_path, compression='zstd')
+        os.replace(tmp_path, self.path(base_path))
+
+
+class ArrowBackend(StorageBackend):
+    """Arrow IPC 文件存储 - 内存映射零拷贝读取，适合频繁整表加载"""
+    
+    EXTENSION = '.arrow'
+    
+    def read(self, base_path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        with pa.memory_map(self.path(base_path), 'r') as source:
+            table = pa_ipc.open_file(source).read_all()
+            if columns is not None:
+                table = table.select(columns)
+            return table.to_pandas()
+    
+    def write(self, df: pd.DataFrame, base_path: str) -> None:
+        tmp_path = self._prepare_dir(base_path)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with pa_ipc.new_file(tmp_path, table.schema,
+                             options=pa_ipc.IpcWriteOptions(compression='zstd')) as writer:
+            writer.write_table(table)
+        os.replace(tmp_path, self.path(base_path))
+
+
+class CacheStorage:
+    """缓存存储门面 - 按配置格式读写，首选格式不存在时透明回退读取旧版 CSV"""
+    
+    BACKENDS = {'parquet': ParquetBackend, 'arrow': ArrowBackend, 'csv': CsvBackend}
+    
+    def __init__(self, fmt: str = 'parquet'):
+        fmt = fmt.lower()
+        if fmt not in self.BACKENDS:
+            raise ValueError(f"不支持的缓存格式: {fmt}")
+        if fmt != 'csv' and pa is None:
+            warnings.warn(f"未安装 pyarrow，缓存格式由 {fmt} 回退为 csv")
+            fmt = 'csv'
         
-        date_pattern = re.compile(r"^(\d{4}-\d{2}-\d{2})$")
-        date_dirs = []
+        self.format = fmt
+        self._primary = self.BACKENDS[fmt]()
+        self._legacy = CsvBackend()
+    
+    def path(self, base_path: str) -> str:
+        return self._primary.path(base_path)
+    
+    def exists(self, base_path: str) -> bool:
+        return self._primary.exists(base_path) or self._legacy.exists(base_path)
+    
+    def read(self, base_path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """读取缓存，可只读取指定列"""
+        if self._primary.exists(base_path):
+            return self._primary.read(base_path, columns)
+        return self._legacy.read(base_path, columns)
+    
+    def write(self, df: pd.DataFrame, base_path: str) -> None:
+        self._primary.write(df, base_path)
+    
+    def migrate_csv_tree(self, root_dir: str, keep_csv: bool = False,
+                         skip_names: tuple = ()) -> int:
+        """将目录树中的旧版 CSV 缓存一次性转换为首选格式"""
+        if self.format == 'csv' or not os.path.exists(root_dir):
+            return 0
         
-        print(os.listdir(self._config.CACHE_DIR))
+        migrated = 0
+        for dir_path, _, file_names in os.walk(root_dir):
+            for name in sorted(file_names):
+                if not name.endswith('.csv') or name[:-4] in skip_names:
+                    continue
+                
+                base_path = os.path.join(dir_path, name[:-4])
+                try:
+                    df = self._legacy.read(base_path)
+                    self._primary.write(df, base_path)
+                    if len(self._primary.read(base_path)) != len(df):
+                        raise ValueError("转换后行数不一致")
+                except Exception as e:
+                    print(f"迁移失败 {base_path}.csv: {e}")
+                    continue
+                
+                if not keep_csv:
+                    os.remove(self._legacy.path(base_path))
+                migrated += 1
+                print(f"已迁移: {base_path}.csv -> {self.path(base_path)}")
         
-        for f in os.listdir(self._config.CACHE_DIR):
-            full_path = os.path.join(self._config.CACHE_DIR, f)
-            if os.path.isdir(full_path):
-                if date_pattern.match(f):
-                    deal_cache = os.path.join(full_path, "bond_deal_cache.csv")
-                    if os.path.exists(deal_cache):
-                        date_dirs.append(f)
+        return migrated
+
+
+class DealHistoryStore:
+    """历史成交时间序列库 - 按日期分区存储成交快照，以 (symbol, date) 索引裁剪分区，增量维护滚动统计"""
+    
+    DATE_COL = '日期'
+    SYMBOL_COL = '债券简称'
+    
+    def __init__(self, root_dir: str, storage: CacheStorage, window: int = 20):
+        self._root = root_dir
+        self._storage = storage
+        self._window = window
+        self._index_path = os.path.join(root_dir, "index.db")
+        self._initialized = False
+    
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(self._root, exist_ok=True)
+        conn = sqlite3.connect(self._index_path, timeout=30)
+        if not self._initialized:
+            with conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS partitions (date TEXT PRIMARY KEY, rows INTEGER)")
+                conn.execute("CREATE TABLE IF NOT EXISTS symbol_dates (symbol TEXT, date TEXT, PRIMARY KEY (symbol, date))")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_symbol_dates_date ON symbol_dates(date)")
+                conn.execute("CREATE TABLE IF NOT EXISTS rolling_window (symbol TEXT PRIMARY KEY, last_date TEXT, window TEXT)")
+                conn.execute("""CREATE TABLE IF NOT EXISTS rolling_stats (
+                    symbol TEXT, date TEXT, avg_volume REAL, yield_vol_bp REAL, observations INTEGER,
+                    PRIMARY KEY (symbol, date))""")
+            self._initialized = True
+        return conn
+    
+    def _partition_path(self, date_str: str) -> str:
+        return os.path.join(self._root, f"date={date_str}", "part")
+    
+    def ingested_dates(self) -> List[str]:
+        with closing(self._connect()) as conn:
+            return [r[0] for r in conn.execute("SELECT date FROM partitions ORDER BY date")]
+    
+    def ingest(self, date_str: str, deal_df: pd.DataFrame, update_stats: bool = True) -> None:
+        """写入单日快照（重复写入同一日期会覆盖）；update_stats 为 False 时只写分区，由调用方批量更新滚动统计"""
+        df = deal_df.dropna(subset=[self.SYMBOL_COL]).drop_duplicates(subset=[self.SYMBOL_COL], keep='last')
+        df = df.sort_values(self.SYMBOL_COL, kind='stable').reset_index(drop=True)
+        self._storage.write(df, self._partition_path(date_str))
         
-        if not date_dirs:
-            return None, None
+        with closing(self._connect()) as conn:
+            with conn:
+                last = conn.execute("SELECT MAX(date) FROM partitions").fetchone()[0]
+                conn.execute("DELETE FROM symbol_dates WHERE date = ?", (date_str,))
+                conn.executemany("INSERT INTO symbol_dates VALUES (?, ?)",
+                                 ((sym, date_str) for sym in df[self.SYMBOL_COL]))
+                conn.execute("INSERT OR REPLACE INTO partitions VALUES (?, ?)", (date_str, len(df)))
         
-        date_dirs.sort(reverse=True)
-        return date_dirs[0], date_dirs[0]
+        if update_stats:
+            self.update_rolling_stats([date_str], last, {date_str: df})
     
-    def save_metadata_cache(self, cache_dict: Dict, settlement_dt_str: str) -> None:
-        """安全保存元数据缓存"""
-        if not cache_dict:
+    def update_rolling_stats(self, dates: List[str], previous_last: Optional[str],
+                             frames: Optional[Dict[str, pd.DataFrame]] = None) -> None:
+        """
+        按新写入的日期更新滚动统计，previous_last 为写入前已入库的最新日期
+        全部晚于它时逐日推进；含它本身时先回退该日再推进；含更早日期时会改变其后所有窗口，全量重算一次
+        """
+        dates = sorted(set(dates))
+        if not dates:
+            return
+        if previous_last is not None and dates[0] < previous_last:
+            self.rebuild_rolling_stats()
             return
         
-        date_cache_dir = os.path.join(self._config.CACHE_DIR, settlement_dt_str)
-        os.makedirs(date_cache_dir, exist_ok=True)
-        cache_file = os.path.join(date_cache_dir, f"{self._config.CACHE_FILE_BASE}.csv")
+        frames = frames or {}
+        with closing(self._connect()) as conn:
+            if dates[0] == previous_last:
+                self._rollback_rolling(conn, previous_last)
+            for date_str in dates:
+                df = frames[date_str] if date_str in frames else self._storage.read(self._partition_path(date_str))
+                self._update_rolling(conn, date_str, df)
+    
+    def _rollback_rolling(self, conn: sqlite3.Connection, date_str: str) -> None:
+        """
+        撤销最新交易日对滚动窗口的推进：该日推进过的债券按已存分区中该日之前最近的若干交易日重建窗口，
+        并删除该日的统计行（窗口满时最早一项已被挤出，只去掉末项无法恢复）
+        """
+        symbols = [r[0] for r in conn.execute("SELECT symbol FROM rolling_window WHERE last_date = ?", (date_str,))]
+        wanted: Dict[str, set] = {}
+        for i in range(0, len(symbols), 500):
+            chunk = symbols[i:i + 500]
+            rows = conn.execute(
+                "SELECT symbol, date FROM (SELECT symbol, date, ROW_NUMBER() OVER "
+                "(PARTITION BY symbol ORDER BY date DESC) AS rn FROM symbol_dates "
+                f"WHERE date < ? AND symbol IN ({','.join('?' * len(chunk))})) WHERE rn <= ?",
+                [date_str] + chunk + [self._window])
+            for sym, d in rows:
+                wanted.setdefault(d, set()).add(sym)
         
-        with self._lock:
-            try:
-                data_list = []
-                for symbol, meta in cache_dict.items():
-                    if 'symbol' not in meta:
-                        meta['symbol'] = symbol
-                    data_list.append(meta)
-                
-                df = pd.DataFrame(data_list)
-                if not df.empty:
-                    df.to_csv(cache_file, index=False, encoding='utf-8-sig')
-            except Exception as e:
-                print(f"保存缓存失败: {e}")
+        windows: Dict[str, deque] = {}
+        last_dates: Dict[str, str] = {}
+        for d in sorted(wanted):
+            df = self._storage.read(self._partition_path(d))
+            df = df[df[self.SYMBOL_COL].isin(wanted[d])]
+            for sym, vol, yld in self._observations(df):
+                window = windows.setdefault(sym, deque(maxlen=self._window))
+                window.append((None if np.isnan(vol) else vol, None if np.isnan(yld) else yld))
+                last_dates[sym] = d
+        
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO rolling_window VALUES (?, ?, ?)",
+                             [(sym, last_dates[sym], json.dumps(list(w))) for sym, w in windows.items()])
+            conn.executemany("DELETE FROM rolling_window WHERE symbol = ?",
+                             [(sym,) for sym in symbols if sym not in windows])
+            conn.execute("DELETE FROM rolling_stats WHERE date = ?", (date_str,))
     
-    def load_metadata_cache(self, settlement_dt_str: str) -> Dict:
-        """加载元数据缓存"""
-        cache = {}
-        date_cache_dir = os.path.join(self._config.CACHE_DIR, settlement_dt_str)
-        metadata_cache_file = os.path.join(date_cache_dir, f"{self._config.CACHE_FILE_BASE}.csv")
+    def _observations(self, df: pd.DataFrame) -> Iterable[tuple]:
+        """提取 (symbol, 交易量, 收益率)；收益率优先取加权收益率"""
+        volume = df['交易量'] if '交易量' in df.columns else pd.Series(np.nan, index=df.index)
+        yld = df['加权收益率'].fillna(df['最新收益率']) if '加权收益率' in df.columns else df['最新收益率']
+        return zip(df[self.SYMBOL_COL], volume.astype(float), yld.astype(float))
+    
+    def _window_stats(self, window: deque) -> tuple:
+        volumes = np.array([v for v, _ in window], dtype=float)
+        yields = np.array([y for _, y in window], dtype=float)
+        avg_volume = float(np.nanmean(volumes)) if np.isfinite(volumes).any() else None
+        changes = np.diff(yields) * 100
+        changes = changes[np.isfinite(changes)]
+        yield_vol = float(np.std(changes, ddof=1)) if len(changes) >= 2 else None
+        return avg_volume, yield_vol
+    
+    def _update_rolling(self, conn: sqlite3.Connection, date_str: str, df: pd.DataFrame) -> None:
+        """按新交易日逐券推进窗口，只触及当日有成交的债券"""
+        obs = list(self._observations(df))
+        symbols = [o[0] for o in obs]
+        windows = {}
+        for i in range(0, len(symbols), 500):
+            chunk = symbols[i:i + 500]
+            rows = conn.execute(
+                f"SELECT symbol, window FROM rolling_window WHERE symbol IN ({','.join('?' * len(chunk))})", chunk)
+            windows.update({sym: json.loads(w) for sym, w in rows})
         
-        if os.path.exists(metadata_cache_file):
-            try:
-                cache_df = pd.read_csv(metadata_cache_file, encoding='utf-8-sig')
-                if not cache_df.empty and 'symbol' in cache_df.columns:
-                    cache_df = cache_df.dropna(subset=['symbol'])
-                    cache_df = cache_df.drop_duplicates(subset=['symbol'], keep='last')
-                    cache = cache_df.set_index('symbol', drop=False).to_dict('index')
-            except Exception as e:
-                print(f"加载缓存失败 ({e})")
+        window_rows, stats_rows = [], []
+        for sym, vol, yld in obs:
+            window = deque(windows.get(sym, []), maxlen=self._window)
+            window.append((None if np.isnan(vol) else vol, None if np.isnan(yld) else yld))
+            avg_volume, yield_vol = self._window_stats(window)
+            window_rows.append((sym, date_str, json.dumps(list(window))))
+            stats_rows.append((sym, date_str, avg_volume, yield_vol, len(window)))
         
-        return cache
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO rolling_window VALUES (?, ?, ?)", window_rows)
+            conn.executemany("INSERT OR REPLACE INTO rolling_stats VALUES (?, ?, ?, ?, ?)", stats_rows)
     
-    def get_deal_cache_path(self, date_str: str) -> str:
-        """获取成交缓存文件路径"""
-        return os.path.join(self._config.CACHE_DIR, date_str, "bond_deal_cache.csv")
+    def rebuild_rolling_stats(self) -> None:
+        """按日期顺序全量重算滚动统计"""
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.execute("DELETE FROM rolling_window")
+                conn.execute("DELETE FROM rolling_stats")
+            for date_str in self.ingested_dates():
+                df = self._storage.read(self._partition_path(date_str))
+                self._update_rolling(conn, date_str, df)
+    
+    def query_symbol(self, symbol: str, start: Optional[str] = None, end: Optional[str] = None,
+                     columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """查询单券在 [start, end] 区间内的成交序列，仅读取该券有成交的分区"""
+        with closing(self._connect()) as conn:
+            dates = [r[0] for r in conn.execute(
+                "SELECT date FROM symbol_dates WHERE symbol = ? AND date >= ? AND date <= ? ORDER BY date",
+                (symbol, start or '0000-00-00', end or '9999-99-99'))]
+        return self._read_partitions(dates, columns, lambda df: df[df[self.SYMBOL_COL] == symbol])
+    
+    def query_dates(self, dates: List[str], name_contains: Optional[str] = None,
+                    columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """查询指定日期的全部成交，可按简称关键字（如“国债”）过滤"""
+        available = set(self.ingested_dates())
+        selected = sorted(d for d in dates if d in available)
+        row_filter = None
+        if name_contains:
+            row_filter = lambda df: df[df[self.SYMBOL_COL].str.contains(name_contains, regex=False)]
+        return self._read_partitions(selected, columns, row_filter)
+    
+    def get_rolling_stats(self, symbol: Optional[str] = None, date: Optional[str] = None) -> pd.DataFrame:
+        """读取滚动统计（平均交易量、收益率日变动标准差 bp）"""
+        conditions, args = [], []
+        if symbol is not None:
+            conditions.append("symbol = ?")
+            args.append(symbol)
+        if date is not None:
+            conditions.append("date = ?")
+            args.append(date)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query(f"SELECT * FROM rolling_stats {where} ORDER BY symbol, date", conn, params=args)
+    
+    def _read_partitions(self, dates: List[str], columns: Optional[List[str]], row_filter) -> pd.DataFrame:
+        if columns is not None and self.SYMBOL_COL not in columns:
+            columns = [self.SYMBOL_COL] + list(columns)
+        
+        frames = []
+        for d in dates:
+            df = self._storage.read(self._partition_path(d), columns)
+            if row_filter is not None:
+                df = row_filter(df)
+            frames.append(df.assign(**{self.DATE_COL: d}))
+        
+        if not frames:
+            return pd.DataFrame(columns=[self.DATE_COL] + (columns or []))
+        return pd.concat(frames, ignore_index=True)
 
 
-# ==================== 数据获取模块 ====================
+# ==================== 缓存管理模块 ====================
 
-class BondDataFetcher:
-    """债券数据获取器 - 负责所有API调用"""
+class MetadataStore:
+    """全局元数据存储 - 以 symbol / bondDefinedCode 为键的 SQLite 单文件库，按字段记录更新时间"""
     
-    def __init__(self, config: Config):
-        self._config = config
-        self._session: Optional[requests.Session] = None
+    FIELDS = ('maturity_date', 'coupon_rate', 'frequency', 'bond_type', 'coupon_type')
+    TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
     
-    def _create_session(self) -> requests.Session:
-        """创建并配置请求会话"""
-        if self._session is None:
-            self._session = requests.Session()
-            try:
-                self._session.get("https://www.chinamoney.com.cn/chinese/zqjc/", timeout=15)
-            except:
-                pass
-        return self._session
+    def __init__(self, db_path: str, field_ttl_days: Optional[Dict[str, Optional[int]]] = None):
+        self._db_path = db_path
+        self._field_ttl_days = field_ttl_days or {}
+        self._initialized = False
     
-    def fetch_deal_data(self, settlement_dt_str: str, cache_manager: CacheManager) -> Optional[pd.DataFrame]:
-        """获取成交数据 - 优先使用缓存"""
-        deal_cache_file = cache_manager.get_deal_cache_path(settlement_dt_str)
+    @property
+    def db_path(self) -> str:
+        return self._db_path
+    
+    def _connect(self) -> sqlite3.Connection:
+        """打开数据库连接，首次连接时建表"""
+        db_dir = os.path.dirname(self._db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
         
-        if os.path.exists(deal_cache_file):
-            try:
-                deal_df = pd.read_csv(deal_cache_file, encoding='utf-8-sig')
-                print(f"从缓存加载 {len(deal_df)} 条成交记录。")
-                return deal_df
-            except Exception as e:
-                print(f"加载成交行情缓存失败: {e}")
+        conn = sqlite3.connect(self._db_path, timeout=30)
+        if not self._initialized:
+            self._create_schema(conn)
+            self._initialized = True
+        return conn
+    
+    def _create_schema(self, conn: sqlite3.Connection) -> None:
+        """建表及索引"""
+        field_cols = ",\n".join(f"{f}, {f}_updated TEXT" for f in self.FIELDS)
+        with conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS bond_metadata (
+                    symbol TEXT PRIMARY KEY,
+                    norm_symbol TEXT NOT NULL,
+                    bond_code TEXT,
+                    {field_cols}
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_metadata_norm ON bond_metadata(norm_symbol)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_metadata_code ON bond_metadata(bond_code)")
+            conn.execute("CREATE TABLE IF NOT EXISTS imported_files (path TEXT PRIMARY KEY, imported_at TEXT)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS symbol_index (
+                    key TEXT PRIMARY KEY,
+                    bond_code TEXT NOT NULL,
+                    bond_name TEXT,
+                    kind TEXT,
+                    match TEXT,
+                    updated_at TEXT
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_symbol_index_code ON symbol_index(bond_code)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS resolution_audit (
+                    symbol TEXT,
+                    bond_code TEXT,
+                    match TEXT,
+                    candidates TEXT,
+                    created_at TEXT
+                )""")
+            conn.execute("CREATE TABLE IF NOT EXISTS store_info (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS failed_symbols (
+                    norm_symbol TEXT PRIMARY KEY,
+                    symbol TEXT,
+                    fail_count INTEGER,
+                    last_failed TEXT,
+                    retry_after TEXT
+                )""")
+    
+    def upsert_many(self, records: List[Dict], updated_at: Optional[datetime] = None) -> int:
+        """批量写入元数据，仅覆盖非空字段；记录中出现的字段即使取值为空也刷新其更新时间"""
+        if not records:
+            return 0
         
-        if self._config.ONLINE_MODE:
-            try:
-                deal_df = ak.bond_spot_deal()
-                print(f"获取 {len(deal_df)} 条成交记录。")
-                
-                date_cache_dir = os.path.join(self._config.CACHE_DIR, settlement_dt_str)
-                os.makedirs(date_cache_dir, exist_ok=True)
-                deal_df.to_csv(deal_cache_file, index=False, encoding='utf-8-sig')
-                return deal_df
-            except Exception as e:
-                print(f"获取行情失败: {e}")
+        ts = (updated_at or datetime.now()).strftime(self.TIME_FORMAT)
+        cols = ['symbol', 'norm_symbol', 'bond_code']
+        for f in self.FIELDS:
+            cols += [f, f"{f}_updated"]
         
-        return None
+        updates = ["norm_symbol = excluded.norm_symbol",
+                   "bond_code = COALESCE(excluded.bond_code, bond_code)"]
+        for f in self.FIELDS:
+            updates.append(f"{f} = COALESCE(excluded.{f}, {f})")
+            updates.append(f"{f}_updated = COALESCE(excluded.{f}_updated, {f}_updated)")
+        
+        sql = (f"INSERT INTO bond_metadata ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))}) "
+               f"ON CONFLICT(symbol) DO UPDATE SET {', '.join(updates)}")
+        
+        rows = []
+        for meta in records:
+            symbol = meta.get('symbol')
+            if not symbol:
+                continue
+            row = [symbol, normalize_symbol(symbol), self._clean(meta.get('bond_code'))]
+            # 接口确实返回空值的字段同样记录抓取时间，避免每次运行都被判为过期
+            for f in self.FIELDS:
+                row += [self._clean(meta.get(f)), ts if f in meta else None]
+            rows.append(row)
+        
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(sql, rows)
+            # 成功获取元数据的债券移出负缓存
+            conn.executemany("DELETE FROM failed_symbols WHERE norm_symbol = ?", [(r[1],) for r in rows])
+        return len(rows)
     
-    def fetch_metadata(self, symbol: str, session: Optional[requests.Session] = None) -> Optional[Dict]:
-        """获取单个债券元数据"""
-        for attempt in range(self._config.RETRY_COUNT):
-            try:
-                metadata = self._fetch_metadata_impl(symbol, attempt, session)
-                if metadata:
-                    return metadata
-            except Exception as e:
-                tqdm.write(f"异常: {symbol} 抓取错误: {e}")
-                time.sleep(5)
+    def load(self) -> 'MetadataTable':
+        """加载全部元数据为内存元数据表"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT symbol, norm_symbol, bond_code, maturity_date, coupon_rate, frequency, bond_type, coupon_type "
+                "FROM bond_metadata WHERE maturity_date IS NOT NULL"
+            ).fetchall()
+        return MetadataTable.from_rows(rows)
+    
+    def stale_symbols(self, as_of: Optional[datetime] = None) -> set:
+        """返回存在过期字段（距上次抓取超过有效期）的债券"""
+        now = as_of or datetime.now()
+        conditions, args = [], []
+        for f, ttl in self._field_ttl_days.items():
+            if ttl is None or f not in self.FIELDS:
+                continue
+            conditions.append(f"{f}_updated < ?")
+            args.append((now - pd.Timedelta(days=ttl)).strftime(self.TIME_FORMAT))
         
-        return None
+        if not conditions:
+            return set()
+        
+        with closing(self._connect()) as conn:
+            rows = conn.execute(f"SELECT symbol FROM bond_metadata WHERE {' OR '.join(conditions)}", args)
+            return {r[0] for r in rows}
     
-    def _fetch_metadata_impl(self, symbol: str, attempt: int, session: Optional[requests.Session] = None) -> Optional[Dict]:
-        """获取债券元数据实现"""
-        search_symbol = symbol.replace(" ", "")
-        caller = session if session else requests
+    def find(self, symbol: str = None, bond_code: str = None) -> Optional[Dict]:
+        """按 symbol（忽略空格）或 bondDefinedCode 查询单条记录"""
+        if symbol is not None:
+            where, arg = "norm_symbol = ?", normalize_symbol(symbol)
+        elif bond_code is not None:
+            where, arg = "bond_code = ?", bond_code
+        else:
+            return None
         
-        # 搜索接口
-        search_url = "https://www.chinamoney.com.cn/ags/ms/cm-u-bond-md/BondMarketInfoList2"
-        search_payload = {
-            "pageNo": "1", "pageSize": "15", "bondName": search_symbol,
-            "bondCode": "", "issueEnty": "", "bondType": "", "bondSpclPrjctVrty": "",
-            "couponType": "", "issueYear": "", "entyDefinedCode": "", "rtngShrt": ""
-        }
+        with closing(self._connect()) as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute(f"SELECT * FROM bond_metadata WHERE {where} LIMIT 1", (arg,)).fetchone()
         
-        headers = self._build_headers()
-        time.sleep(self._config.DELAY_BETWEEN_REQUESTS + random.uniform(2.0, 5.0) * (attempt + 1))
+        return self._row_to_meta(row) if row is not None else None
+    
+    def upsert_index_entries(self, entries: List[tuple]) -> None:
+        """写入解析索引条目 (key, bond_code, bond_name, kind, match)"""
+        ts = datetime.now().strftime(self.TIME_FORMAT)
+        with closing(self._connect()) as conn, conn:
+            conn.executemany("INSERT OR REPLACE INTO symbol_index VALUES (?, ?, ?, ?, ?, ?)",
+                             [tuple(e) + (ts,) for e in entries])
+    
+    def load_index(self) -> Dict[str, tuple]:
+        """加载解析索引：key -> (bond_code, match)"""
+        with closing(self._connect()) as conn:
+            return {k: (code, match) for k, code, match in
+                    conn.execute("SELECT key, bond_code, match FROM symbol_index")}
+    
+    def add_audit(self, symbol: str, bond_code: str, match: str, candidates: List[Dict]) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute("INSERT INTO resolution_audit VALUES (?, ?, ?, ?, ?)", (
+                symbol, bond_code, match, json.dumps(candidates, ensure_ascii=False),
+                datetime.now().strftime(self.TIME_FORMAT)))
+    
+    def load_audit(self) -> pd.DataFrame:
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query("SELECT * FROM resolution_audit ORDER BY created_at", conn)
+    
+    def record_failure(self, symbol: str, base_ttl_hours: float, max_ttl_days: float) -> datetime:
+        """记录一次抓取失败，冷却时间随连续失败次数指数增长，返回下次允许重试的时间"""
+        key = normalize_symbol(symbol)
+        now = datetime.now()
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT fail_count FROM failed_symbols WHERE norm_symbol = ?", (key,)).fetchone()
+            fail_count = (row[0] if row else 0) + 1
+            ttl_hours = min(base_ttl_hours * 2 ** (fail_count - 1), max_ttl_days * 24)
+            retry_after = now + pd.Timedelta(hours=ttl_hours)
+            conn.execute("INSERT OR REPLACE INTO failed_symbols VALUES (?, ?, ?, ?, ?)", (
+                key, symbol, fail_count, now.strftime(self.TIME_FORMAT), retry_after.strftime(self.TIME_FORMAT)))
+        return retry_after
+    
+    def blocked_symbols(self, as_of: Optional[datetime] = None) -> set:
+        """返回仍处于冷却期的债券（规范化简称）"""
+        now = (as_of or datetime.now()).strftime(self.TIME_FORMAT)
+        with closing(self._connect()) as conn:
+            return {r[0] for r in conn.execute("SELECT norm_symbol FROM failed_symbols WHERE retry_after > ?", (now,))}
+    
+    def get_info(self, key: str) -> Optional[str]:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT value FROM store_info WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+    
+    def set_info(self, key: str, value: str) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO store_info VALUES (?, ?)", (key, value))
+    
+    def import_legacy_csv(self, cache_dir: str, file_base: str) -> int:
+        """将旧版按日期存放的元数据 CSV 一次性导入全局存储"""
+        if not os.path.exists(cache_dir):
+            return 0
         
-        r_search = caller.post(search_url, data=search_payload, headers=headers, timeout=20)
+        date_pattern = re.compile(r"^(\d{4}-\d{2}-\d{2})$")
+        with closing(self._connect()) as conn:
+            imported = {r[0] for r in conn.execute("SELECT path FROM imported_files")}
         
-        if r_search.status_code in [403, 421]:
-            wait_time = 30 * (attempt + 1)
-            tqdm.write(f"警告: {symbol} 触发访问限制 ({r_search.status_code})，等待 {wait_time} 秒...")
-            time.sleep(wait_time)
-            return None
+        total = 0
+        for d in sorted(os.listdir(cache_dir)):
+            csv_path = os.path.join(cache_dir, d, f"{file_base}.csv")
+            if not date_pattern.match(d) or csv_path in imported or not os.path.exists(csv_path):
+                continue
+            
+            df = pd.read_csv(csv_path, encoding='utf-8-sig')
+            if 'symbol' in df.columns:
+                df = df.dropna(subset=['symbol']).drop_duplicates(subset=['symbol'], keep='last')
+                # 以缓存所属日期作为字段更新时间
+                total += self.upsert_many(df.to_dict('records'), datetime.strptime(d, '%Y-%m-%d'))
+            
+            with closing(self._connect()) as conn, conn:
+                conn.execute("INSERT OR REPLACE INTO imported_files VALUES (?, ?)",
+                             (csv_path, datetime.now().strftime(self.TIME_FORMAT)))
         
-        if r_search.status_code != 200:
+        if total:
+            print(f"已从旧版缓存导入 {total} 条元数据至 {self._db_path}")
+        return total
+    
+    def _row_to_meta(self, row: sqlite3.Row) -> Dict:
+        """数据库行转换为元数据字典"""
+        meta = {'symbol': row['symbol'], 'bond_code': row['bond_code']}
+        meta.update({f: row[f] for f in self.FIELDS})
+        return meta
+    
+    @staticmethod
+    def _clean(value: Any) -> Any:
+        """将 NaN 等空值统一为 None，numpy 标量转为 Python 原生类型"""
+        if value is None:
+            return None
+        if isinstance(value, float) and np.isnan(value):
+            return None
+        if isinstance(value, np.generic):
+            return value.item()
+        return value
+
+
+class MetadataTable:
+    """
+    内存元数据表 - 列式存储（struct-of-arrays），全部阶段共享同一实例
+    债券类型、付息频率、付息方式以整数编码存储并驻留取值；以规范化简称建立唯一索引，查询不复制数据
+    """
+    
+    CATEGORICAL = ('frequency', 'bond_type', 'coupon_type')
+    
+    def __init__(self, capacity: int = 1024):
+        self._size = 0
+        self._index: Dict[str, int] = {}  # 规范化简称 -> 行号
+        self._symbols = np.empty(capacity, dtype=object)
+        self._bond_codes = np.empty(capacity, dtype=object)
+        self._maturity = np.empty(capacity, dtype=object)
+        self._coupon_rate = np.full(capacity, np.nan)
+        self._codes = {f: np.full(capacity, -1, dtype=np.int16) for f in self.CATEGORICAL}
+        self._categories: Dict[str, List[Any]] = {f: [] for f in self.CATEGORICAL}
+        self._category_index: Dict[str, Dict[Any, int]] = {f: {} for f in self.CATEGORICAL}
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def from_rows(cls, rows: List[tuple]) -> 'MetadataTable':
+        """由 (symbol, norm_symbol, bond_code, maturity_date, coupon_rate, frequency, bond_type, coupon_type) 行构建"""
+        table = cls(capacity=max(len(rows), 1024))
+        for row in rows:
+            table._set_row(*row)
+        return table
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    def __contains__(self, symbol: str) -> bool:
+        return normalize_symbol(symbol) in self._index
+    
+    def position(self, symbol: str) -> int:
+        """返回债券所在行号，不存在时返回 -1"""
+        return self._index.get(normalize_symbol(symbol), -1)
+    
+    def positions(self, symbols: Iterable[str]) -> np.ndarray:
+        index = self._index
+        return np.array([index.get(normalize_symbol(s), -1) for s in symbols], dtype=np.int64)
+    
+    def add(self, meta: Dict) -> None:
+        """写入或覆盖一条抓取结果"""
+        symbol = meta.get('symbol')
+        if not symbol:
+            return
+        with self._lock:
+            self._set_row(symbol, normalize_symbol(symbol), meta.get('bond_code'), meta.get('maturity_date'),
+                          meta.get('coupon_rate'), meta.get('frequency'), meta.get('bond_type'),
+                          meta.get('coupon_type'))
+    
+    def get(self, symbol: str) -> Optional[Dict]:
+        """按简称（忽略空格与全半角）取出一条记录，返回新建的字典"""
+        pos = self.position(symbol)
+        if pos < 0:
             return None
+        rate = float(self._coupon_rate[pos])
+        meta = {'symbol': self._symbols[pos], 'bond_code': self._bond_codes[pos],
+                'maturity_date': self._maturity[pos], 'coupon_rate': None if np.isnan(rate) else rate}
+        meta.update({f: self._decode(f, self._codes[f][pos]) for f in self.CATEGORICAL})
+        return meta
+    
+    def column(self, name: str, positions: np.ndarray) -> np.ndarray:
+        """按行号取出一列（object 数组），行号为 -1 或取值为空时为 None"""
+        valid = positions >= 0
+        safe = np.where(valid, positions, 0)
+        if name in self.CATEGORICAL:
+            lookup = np.array(self._categories[name] + [None], dtype=object)
+            values = lookup[self._codes[name][:max(self._size, 1)][safe]]
+        elif name == 'coupon_rate':
+            rates = self._coupon_rate[safe]
+            values = np.where(np.isnan(rates), None, rates.astype(object))
+        else:
+            values = {'symbol': self._symbols, 'bond_code': self._bond_codes,
+                      'maturity_date': self._maturity}[name][safe]
+        return np.where(valid, values, None)
+    
+    def _set_row(self, symbol, norm_symbol, bond_code, maturity_date, coupon_rate,
+                 frequency, bond_type, coupon_type) -> None:
+        pos = self._index.get(norm_symbol)
+        if pos is None:
+            pos = self._size
+            if pos == len(self._symbols):
+                self._grow()
+            self._index[norm_symbol] = pos
+            self._size += 1
         
-        search_json = r_search.json()
-        result_list = search_json.get('data', {}).get('resultList', [])
+        self._symbols[pos] = symbol
+        self._bond_codes[pos] = bond_code
+        self._maturity[pos] = maturity_date
+        self._coupon_rate[pos] = np.nan if coupon_rate is None or pd.isna(coupon_rate) else coupon_rate
+        for f, value in zip(self.CATEGORICAL, (frequency, bond_type, coupon_type)):
+            self._codes[f][pos] = self._intern(f, value)
+    
+    def _intern(self, field_name: str, value: Any) -> int:
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            return -1
+        index = self._category_index[field_name]
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(self._categories[field_name])
+            self._categories[field_name].append(value)
+        return code
+    
+    def _decode(self, field_name: str, code: int) -> Any:
+        return self._categories[field_name][code] if code >= 0 else None
+    
+    def _grow(self) -> None:
+        capacity = len(self._symbols) * 2
+        for attr in ('_symbols', '_bond_codes', '_maturity'):
+            old = getattr(self, attr)
+            new = np.empty(capacity, dtype=object)
+            new[:len(old)] = old
+            setattr(self, attr, new)
+        self._coupon_rate = np.concatenate([self._coupon_rate, np.full(capacity - len(self._coupon_rate), np.nan)])
+        for f in self.CATEGORICAL:
+            self._codes[f] = np.concatenate([self._codes[f], np.full(capacity - len(self._codes[f]), -1, dtype=np.int16)])
+
+
+class SymbolResolver:
+    """债券代码解析索引 - 规范化简称、别名与债券代码均映射到 bondDefinedCode，内存 O(1) 查询并持久化"""
+    
+    # 匹配方式：exact 为规范化简称完全一致；ambiguous 为多个候选一致；fallback 为无一致候选时取首条
+    UNCERTAIN_MATCHES = ('ambiguous', 'fallback')
+    
+    def __init__(self, store: MetadataStore, trust_fallback: bool = False):
+        self._store = store
+        self._trust_fallback = trust_fallback
+        self._index: Optional[Dict[str, tuple]] = None
+        self._lock = threading.Lock()
+    
+    def _ensure_loaded(self) -> Dict[str, tuple]:
+        if self._index is None:
+            self._index = self._store.load_index()
+        return self._index
+    
+    def __contains__(self, symbol: str) -> bool:
+        return self.resolve(symbol) is not None
+    
+    def __len__(self) -> int:
+        return len(self._ensure_loaded())
+    
+    def resolve(self, symbol: str) -> Optional[str]:
+        """查询 bondDefinedCode；未信任的 fallback 匹配视为未知"""
+        entry = self._ensure_loaded().get(normalize_symbol(symbol))
+        if entry is None:
+            return None
+        code, match = entry
+        if match == 'fallback' and not self._trust_fallback:
+            return None
+        return code
+    
+    def _learn(self, entries: List[tuple]) -> None:
+        index = self._ensure_loaded()
+        with self._lock:
+            self._store.upsert_index_entries(entries)
+            for key, code, _, _, match in entries:
+                index[key] = (code, match)
+    
+    def learn_listing(self, listings: List[Dict]) -> int:
+        """从列表接口结果学习：简称与债券代码（bondCode）均作为键"""
+        entries = []
+        for item in listings:
+            code, name = item.get('bondDefinedCode'), item.get('bondName')
+            if not code or not name:
+                continue
+            entries.append((normalize_symbol(name), code, name, 'name', 'exact'))
+            if item.get('bondCode'):
+                entries.append((normalize_symbol(item['bondCode']), code, name, 'code', 'exact'))
+        self._learn(entries)
+        return len(entries)
+    
+    def learn_search(self, symbol: str, result_list: List[Dict]) -> Optional[str]:
+        """从单次搜索结果中选出 bondDefinedCode 并学习；歧义或回退匹配写入审计表"""
         if not result_list:
             return None
         
-        query_code = None
-        for res in result_list:
-            if res.get('bondName').replace(" ", "") == search_symbol:
-                query_code = res.get('bondDefinedCode')
-                break
+        key = normalize_symbol(symbol)
+        exact = {res.get('bondDefinedCode') for res in result_list
+                 if normalize_symbol(res.get('bondName')) == key and res.get('bondDefinedCode')}
         
-        if not query_code:
-            query_code = result_list[0].get('bondDefinedCode')
+        if len(exact) == 1:
+            code, match = exact.pop(), 'exact'
+        else:
+            match = 'ambiguous' if exact else 'fallback'
+            code = next((res.get('bondDefinedCode') for res in result_list
+                         if normalize_symbol(res.get('bondName')) == key), result_list[0].get('bondDefinedCode'))
         
-        # 详情接口
-        time.sleep(random.uniform(1.5, 3.0))
-        detail_url = "https://www.chinamoney.com.cn/ags/ms/cm-u-bond-md/BondDetailInfo"
-        detail_headers = headers.copy()
-        detail_headers["Referer"] = f"https://www.chinamoney.com.cn/chinese/zqjc/?bondDefinedCode={query_code}"
+        if not code:
+            return None
         
-        r_detail = caller.post(detail_url, data={"bondDefinedCode": query_code}, headers=detail_headers, timeout=20)
+        # 同时学习本次返回的全部候选，后续查询这些债券可直接命中
+        self.learn_listing(result_list)
+        if match != 'exact' or key not in self._ensure_loaded():
+            self._learn([(key, code, symbol, 'alias', match)])
+        if match in self.UNCERTAIN_MATCHES:
+            candidates = [{'bondName': r.get('bondName'), 'bondDefinedCode': r.get('bondDefinedCode')}
+                          for r in result_list]
+            self._store.add_audit(symbol, code, match, candidates)
+        return code
+    
+    def add_alias(self, alias: str, bond_code: str) -> None:
+        """手动添加别名"""
+        self._learn([(normalize_symbol(alias), bond_code, alias, 'alias', 'manual')])
+    
+    def audit_entries(self) -> pd.DataFrame:
+        """返回歧义与回退匹配的审计记录"""
+        return self._store.load_audit()
+
+
+class MetadataJournal:
+    """元数据追加日志 - 每条抓取结果落盘即持久化，定期合并到元数据库，支持断点续抓"""
+    
+    def __init__(self, journal_path: str):
+        self._path = journal_path
+        self._lock = threading.Lock()
+        self._pending_count = 0
+    
+    @property
+    def pending_count(self) -> int:
+        """自上次合并以来写入的记录数"""
+        return self._pending_count
+    
+    def _append(self, entry: Dict) -> None:
+        """追加一行并 fsync，保证进程崩溃后记录不丢失"""
+        journal_dir = os.path.dirname(self._path)
+        if journal_dir:
+            os.makedirs(journal_dir, exist_ok=True)
         
-        if r_detail.status_code != 200:
-            return None
+        line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            with open(self._path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+    
+    def begin_run(self, symbols: List[str]) -> None:
+        """记录本次抓取任务的完整待抓列表"""
+        self._append({'type': 'run', 'symbols': list(symbols)})
+    
+    def append_record(self, meta: Dict) -> None:
+        self._append({'type': 'record', 'meta': meta})
+        self._pending_count += 1
+    
+    def end_run(self) -> None:
+        self._append({'type': 'done'})
+    
+    def replay(self) -> tuple:
+        """读取日志，返回 (已抓取记录列表, 未完成任务的剩余待抓列表)"""
+        records, run_symbols = [], None
+        if not os.path.exists(self._path):
+            return records, []
         
-        res_json = r_detail.json()
-        if 'data' not in res_json or 'bondBaseInfo' not in res_json['data']:
-            return None
+        with self._lock, open(self._path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # 崩溃时可能留下不完整的最后一行
+                    continue
+                
+                kind = entry.get('type')
+                if kind == 'record':
+                    records.append(entry['meta'])
+                elif kind == 'run':
+                    run_symbols = entry.get('symbols', [])
+                elif kind == 'done':
+                    run_symbols = None
         
-        data = res_json['data']['bondBaseInfo']
-        coupon_rate = data.get('parCouponRate')
+        if not run_symbols:
+            return records, []
         
-        return {
-            'symbol': symbol,
-            'maturity_date': data.get('mrtyDate'),
-            'coupon_rate': float(coupon_rate) / 100 if coupon_rate and coupon_rate != '---' else 0,
-            'frequency': data.get('couponFrqncy', '年'),
-            'bond_type': data.get('bondType'),
-            'coupon_type': data.get('intrstPayMeth')
-        }
+        done = {m.get('symbol') for m in records}
+        return records, [s for s in run_symbols if s not in done]
     
-    def _build_headers(self) -> Dict[str, str]:
-        """构建请求头"""
-        return {
-            "User-Agent": random.choice(self._config.USER_AGENTS),
-            "Accept": "application/json, text/javascript, */*; q=0.01",
-            "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-            "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-            "X-Requested-With": "XMLHttpRequest",
-            "Origin": "https://www.chinamoney.com.cn",
-            "Referer": "https://www.chinamoney.com.cn/chinese/zqjc/",
-            "Connection": "keep-alive",
-            "Sec-Fetch-Dest": "empty",
-            "Sec-Fetch-Mode": "cors",
-            "Sec-Fetch-Site": "same-origin",
+    def compact(self, store: 'MetadataStore') -> int:
+        """将日志中的记录合并入元数据库，并以仅含剩余待抓列表的新日志原子替换旧日志"""
+        records, remaining = self.replay()
+        if records:
+            store.upsert_many(records)
+        
+        with self._lock:
+            if remaining:
+                tmp_path = self._path + ".tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(json.dumps({'type': 'run', 'symbols': remaining}, ensure_ascii=False) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self._path)
+            elif os.path.exists(self._path):
+                os.remove(self._path)
+            self._pending_count = 0
+        
+        return len(records)
+
+
+class CacheManifest:
+    """缓存清单 - 记录每个日期分区的行数、完整性与校验和，O(1) 定位最新可用日期"""
+    
+    VERSION = 1
+    DATE_PATTERN = re.compile(r"^(\d{4}-\d{2}-\d{2})$")
+    
+    def __init__(self, manifest_path: str):
+        self._path = manifest_path
+        self._lock = threading.Lock()
+        self._data: Optional[Dict] = None
+    
+    @property
+    def partitions(self) -> Dict[str, Dict]:
+        return self._load()['partitions']
+    
+    def _load(self) -> Dict:
+        if self._data is None:
+            self._data = {'version': self.VERSION, 'partitions': {}}
+            if os.path.exists(self._path):
+                try:
+                    with open(self._path, 'r', encoding='utf-8') as f:
+                        self._data = json.load(f)
+                except (OSError, json.JSONDecodeError) as e:
+                    print(f"缓存清单损坏，将重建 ({e})")
+        return self._data
+    
+    def exists(self) -> bool:
+        return os.path.exists(self._path)
+    
+    def save(self) -> None:
+        """原子写入清单"""
+        data = self._load()
+        manifest_dir = os.path.dirname(self._path)
+        if manifest_dir:
+            os.makedirs(manifest_dir, exist_ok=True)
+        
+        complete = [d for d, p in data['partitions'].items() if p.get('complete')]
+        data['latest_complete'] = max(complete) if complete else None
+        
+        tmp_path = self._path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp_path, self._path)
+    
+    def latest_complete(self) -> Optional[str]:
+        return self._load().get('latest_complete')
+    
+    def register(self, date_str: str, file_path: str, rows: int, save: bool = True) -> None:
+        """登记分区文件（写入成交缓存后调用）"""
+        with self._lock:
+            self.partitions[date_str] = {
+                'rows': int(rows),
+                'complete': rows > 0,
+                'file': os.path.basename(file_path),
+                'size': os.path.getsize(file_path),
+                'sha256': self.file_checksum(file_path),
+                'updated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+            if save:
+                self.save()
+    
+    def remove(self, date_str: str, save: bool = True) -> None:
+        with self._lock:
+            self.partitions.pop(date_str, None)
+            if save:
+                self.save()
+    
+    def verify(self, date_str: str, file_path: str) -> bool:
+        """校验分区文件与清单记录一致"""
+        entry = self.partitions.get(date_str)
+        return (entry is not None and os.path.exists(file_path)
+                and os.path.basename(file_path) == entry.get('file')
+                and self.file_checksum(file_path) == entry.get('sha256'))
+    
+    @staticmethod
+    def file_checksum(file_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+
+class CacheManager:
+    """缓存管理器 - 负责所有缓存操作"""
+    
+    def __init__(self, config: Config):
+        self._config = config
+        self._lock = threading.Lock()
+        self._storage = CacheStorage(config.CACHE_FORMAT)
+        self._metadata_store = MetadataStore(
+            os.path.join(config.CACHE_DIR, config.METADATA_DB_FILE),
+            config.METADATA_FIELD_TTL_DAYS
+        )
+        self._resolver = SymbolResolver(self._metadata_store, config.RESOLVER_TRUST_FALLBACK)
+        self._journal = MetadataJournal(os.path.join(config.CACHE_DIR, config.METADATA_JOURNAL_FILE))
+        self._manifest = CacheManifest(os.path.join(config.CACHE_DIR, config.MANIFEST_FILE))
+        self._deal_history = DealHistoryStore(
+            os.path.join(config.CACHE_DIR, config.DEAL_HISTORY_DIR), self._storage, config.ROLLING_WINDOW_DAYS
+        )
+    
+    @property
+    def cache_dir(self) -> str:
+        return self._config.CACHE_DIR
+    
+    @property
+    def cache_file_base(self) -> str:
+        return self._config.CACHE_FILE_BASE
+    
+    def is_within_cache_window(self) -> bool:
+        """判断当前时间是否处于交易日的 8:00-20:00 之间"""
+        if not self._config.ONLINE_MODE:
+            return False
+        
+        now = datetime.now()
+        if now.weekday() >= 5:
+            return False
+        
+        current_time = now.time()
+        return dt_time(8, 0) <= current_time <= dt_time(20, 0)
+    
+    def get_latest_cache_date(self) -> tuple:
+        """获取最新的缓存日期（读取缓存清单，清单缺失或失效时扫描目录重建）"""
+        if not os.path.exists(self._config.CACHE_DIR):
+            return None, None
+        
+        latest = self._manifest.latest_complete()
+        if latest is None or not self.has_deal_cache(latest):
+            self.rebuild_manifest()
+            latest = self._manifest.latest_complete()
+        
+        return latest, latest
+    
+    def rebuild_manifest(self) -> None:
+        """扫描日期分区目录重建缓存清单"""
+        print("正在扫描缓存目录重建缓存清单...")
+        partitions = self._manifest.partitions
+        partitions.clear()
+        
+        for d in os.listdir(self._config.CACHE_DIR):
+            if not CacheManifest.DATE_PATTERN.match(d) or not self.has_deal_cache(d):
+                continue
+            try:
+                rows = len(self.load_deal_cache(d, columns=['债券简称']))
+                self._manifest.register(d, self._resolve_deal_cache_file(d), rows, save=False)
+            except Exception as e:
+                print(f"分区 {d} 读取失败，标记为不完整 ({e})")
+                partitions[d] = {'rows': 0, 'complete': False}
+        
+        self._manifest.save()
+    
+    def apply_retention(self) -> None:
+        """按保留策略清理过旧分区，并压缩较旧分区（转换为当前缓存格式、移除已由全局存储接管的旧版文件）"""
+        # 清理前确保快照已进入历史成交库
+        self.sync_deal_history()
+        dates = sorted(self._manifest.partitions, reverse=True)
+        if not dates:
+            return
+        
+        latest_dt = datetime.strptime(dates[0], '%Y-%m-%d')
+        max_parts = self._config.CACHE_MAX_PARTITIONS
+        retention = self._config.CACHE_RETENTION_DAYS
+        evicted, compacted = 0, 0
+        
+        for idx, d in enumerate(dates):
+            age_days = (latest_dt - datetime.strptime(d, '%Y-%m-%d')).days
+            partition_dir = os.path.join(self._config.CACHE_DIR, d)
+            
+            if idx > 0 and ((max_parts is not None and idx >= max_parts)
+                            or (retention is not None and age_days > retention)):
+                shutil.rmtree(partition_dir, ignore_errors=True)
+                self._manifest.remove(d, save=False)
+                evicted += 1
+            elif (self._config.CACHE_COMPACT_AFTER_DAYS is not None
+                  and age_days > self._config.CACHE_COMPACT_AFTER_DAYS and self._compact_partition(d)):
+                compacted += 1
+        
+        if evicted or compacted:
+            self._manifest.save()
+            print(f"缓存保留策略：清理 {evicted} 个分区，压缩 {compacted} 个分区。")
+    
+    def _compact_partition(self, date_str: str) -> bool:
+        """压缩单个分区，返回是否有改动"""
+        partition_dir = os.path.join(self._config.CACHE_DIR, date_str)
+        changed = False
+        
+        legacy_meta = os.path.join(partition_dir, f"{self._config.CACHE_FILE_BASE}.csv")
+        if os.path.exists(legacy_meta):
+            self._metadata_store.import_legacy_csv(self._config.CACHE_DIR, self._config.CACHE_FILE_BASE)
+            os.remove(legacy_meta)
+            changed = True
+        
+        deal_base = self.get_deal_cache_path(date_str)
+        if self._storage.format != 'csv' and not os.path.exists(self._storage.path(deal_base)):
+            if self._storage.migrate_csv_tree(partition_dir):
+                self._manifest.register(date_str, self._storage.path(deal_base),
+                                        self._manifest.partitions.get(date_str, {}).get('rows', 0),
+                                        save=False)
+                changed = True
+        
+        return changed
+    
+    def record_metadata(self, meta: Dict) -> None:
+        """写入单条抓取结果：立即追加到日志，累计一定条数后合并入元数据库"""
+        try:
+            self._journal.append_record(meta)
+            if self._journal.pending_count >= self._config.JOURNAL_COMPACT_INTERVAL:
+                self.compact_metadata_journal()
+        except Exception as e:
+            print(f"保存缓存失败: {e}")
+    
+    def compact_metadata_journal(self) -> None:
+        """将追加日志合并入元数据库"""
+        with self._lock:
+            try:
+                self._journal.compact(self._metadata_store)
+            except Exception as e:
+                print(f"合并元数据日志失败: {e}")
+    
+    def begin_fetch_run(self, symbols: List[str]) -> List[str]:
+        """开始抓取任务：若上次任务中断，优先续抓其剩余债券，返回本次完整待抓列表"""
+        _, remaining = self._journal.replay()
+        if remaining:
+            print(f"检测到上次未完成的抓取任务，从断点继续：剩余 {len(remaining)} 个债券。")
+        
+        seen = set(remaining)
+        ordered = remaining + [s for s in symbols if s not in seen]
+        self._journal.begin_run(ordered)
+        return ordered
+    
+    def end_fetch_run(self) -> None:
+        """结束抓取任务并合并日志"""
+        self._journal.end_run()
+        self.compact_metadata_journal()
+    
+    def load_metadata_cache(self) -> MetadataTable:
+        """加载元数据缓存（跨日期全局共享），先合并上次运行残留的日志"""
+        self.compact_metadata_journal()
+        try:
+            self._metadata_store.import_legacy_csv(self._config.CACHE_DIR, self._config.CACHE_FILE_BASE)
+            return self._metadata_store.load()
+        except Exception as e:
+            print(f"加载缓存失败 ({e})")
+            return MetadataTable()
+    
+    @property
+    def symbol_resolver(self) -> SymbolResolver:
+        return self._resolver
+    
+    def save_universe_listing(self, listings: List[Dict], complete: bool = True) -> None:
+        """将批量列表结果写入解析索引；只有全部分页成功时才记录列表时间，部分结果不推迟下次重新列表"""
+        self._resolver.learn_listing(listings)
+        if complete:
+            self._metadata_store.set_info('universe_listed_at', datetime.now().strftime(MetadataStore.TIME_FORMAT))
+    
+    def universe_listing_age_hours(self) -> Optional[float]:
+        """距上次批量列表的小时数，从未列表时返回 None"""
+        listed_at = self._metadata_store.get_info('universe_listed_at')
+        if listed_at is None:
+            return None
+        return (datetime.now() - datetime.strptime(listed_at, MetadataStore.TIME_FORMAT)).total_seconds() / 3600
+    
+    def record_fetch_failure(self, symbol: str) -> None:
+        """将抓取失败的债券加入负缓存"""
+        try:
+            self._metadata_store.record_failure(
+                symbol, self._config.NEGATIVE_CACHE_TTL_HOURS, self._config.NEGATIVE_CACHE_MAX_TTL_DAYS
+            )
+        except Exception as e:
+            print(f"记录抓取失败出错: {e}")
+    
+    def get_blocked_symbols(self) -> set:
+        """获取负缓存中仍在冷却期的债券（规范化简称）"""
+        try:
+            return self._metadata_store.blocked_symbols()
+        except Exception as e:
+            print(f"读取负缓存失败 ({e})")
+            return set()
+    
+    def get_stale_symbols(self) -> set:
+        """获取字段已过期、需要重新抓取的债券"""
+        try:
+            return self._metadata_store.stale_symbols()
+        except Exception as e:
+            print(f"检查缓存有效期失败 ({e})")
+            return set()
+    
+    @property
+    def storage(self) -> CacheStorage:
+        return self._storage
+    
+    def get_deal_cache_path(self, date_str: str) -> str:
+        """获取成交缓存路径（不含扩展名）"""
+        return os.path.join(self._config.CACHE_DIR, date_str, self._config.DEAL_CACHE_BASE)
+    
+    def has_deal_cache(self, date_str: str) -> bool:
+        return self._storage.exists(self.get_deal_cache_path(date_str))
+    
+    def load_deal_cache(self, date_str: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """读取成交缓存，可只读取指定列"""
+        return self._storage.read(self.get_deal_cache_path(date_str), columns)
+    
+    def save_deal_cache(self, deal_df: pd.DataFrame, date_str: str) -> None:
+        self._storage.write(deal_df, self.get_deal_cache_path(date_str))
+        self._manifest.register(date_str, self._resolve_deal_cache_file(date_str), len(deal_df))
+        self._deal_history.ingest(date_str, deal_df)
+    
+    @property
+    def deal_history(self) -> DealHistoryStore:
+        return self._deal_history
+    
+    def sync_deal_history(self) -> int:
+        """将尚未入库的日期分区按日期顺序补录进历史成交库"""
+        ingested = self._deal_history.ingested_dates()
+        pending = sorted(set(self._manifest.partitions) - set(ingested))
+        pending = [d for d in pending if self.has_deal_cache(d)]
+        # 先写入全部分区，最后统一更新一次滚动统计，避免逐日补录时反复全量重算
+        for d in pending:
+            self._deal_history.ingest(d, self.load_deal_cache(d), update_stats=False)
+        self._deal_history.update_rolling_stats(pending, ingested[-1] if ingested else None)
+        if pending:
+            print(f"历史成交库已补录 {len(pending)} 个交易日。")
+        return len(pending)
+    
+    def _resolve_deal_cache_file(self, date_str: str) -> str:
+        """返回分区中实际存在的成交缓存文件（首选格式优先）"""
+        primary = self._storage.path(self.get_deal_cache_path(date_str))
+        return primary if os.path.exists(primary) else self.get_deal_cache_path(date_str) + CsvBackend.EXTENSION
+    
+    def migrate_legacy_csv(self, keep_csv: bool = False) -> int:
+        """将缓存目录中的 CSV 一次性迁移为当前缓存格式（元数据已由全局存储接管，不参与迁移）"""
+        count = 0
+        for root_dir in (self._config.CACHE_DIR, self._config.CURVE_CACHE_DIR):
+            count += self._storage.migrate_csv_tree(
+                root_dir, keep_csv, skip_names=(self._config.CACHE_FILE_BASE,)
+            )
+        if count and os.path.exists(self._config.CACHE_DIR):
+            self.rebuild_manifest()
+        print(f"缓存迁移完成，共转换 {count} 个文件。")
+        return count
+
+
+# ==================== 数据获取模块 ====================
+
+class RecordingSession(requests.Session):
+    """录制会话 - 将每次请求与响应追加写入 JSON Lines 文件，供 tools/replay_server.py 离线回放"""
+    
+    def __init__(self, record_file: str):
+        super().__init__()
+        self._record_file = record_file
+        self._record_lock = threading.Lock()
+    
+    def request(self, method, url, *args, **kwargs):
+        response = super().request(method, url, *args, **kwargs)
+        data = kwargs.get('data')
+        entry = {
+            'method': method.upper(),
+            'path': urlsplit(url).path,
+            'data': data if isinstance(data, dict) else None,
+            'status': response.status_code,
+            'body': response.text,
+            'elapsed': response.elapsed.total_seconds()
         }
+        with self._record_lock, open(self._record_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return response
+
+
+class FetchAborted(Exception):
+    """抓取被熔断器或运行预算中止"""
+
+
+class CircuitBreaker:
+    """熔断器 - 连续触发访问限制达到阈值后暂停全部请求，冷却后放行一次试探请求"""
+    
+    def __init__(self, threshold: int, cooldown: float):
+        self._threshold = threshold
+        self._cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+    
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        return 'half_open' if self._probing else 'open'
+    
+    def blocked(self) -> bool:
+        """不占用试探名额地查看是否拦截请求：熔断冷却中，或冷却结束后已有试探请求在途"""
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            return self._probing or time.monotonic() - self._opened_at < self._cooldown
+    
+    def allow(self) -> bool:
+        """是否放行请求；冷却结束后仅放行一次试探请求"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if not self._probing and time.monotonic() - self._opened_at >= self._cooldown:
+                self._probing = True
+                return True
+            return False
+    
+    def on_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+    
+    def on_throttle(self) -> bool:
+        """记录一次访问限制，返回是否因此进入熔断"""
+        with self._lock:
+            self._failures += 1
+            if self._probing or (self._opened_at is None and self._failures >= self._threshold):
+                self._opened_at = time.monotonic()
+                self._probing = False
+                return True
+            return False
+
+
+class RunBudget:
+    """单次运行预算 - 限制抓取的总耗时与总请求数"""
+    
+    def __init__(self, max_seconds: Optional[float], max_requests: Optional[int]):
+        self._max_seconds = max_seconds
+        self._max_requests = max_requests
+        self.reset()
+    
+    def reset(self) -> None:
+        self._started = time.monotonic()
+        self.requests = 0
+    
+    def consume(self) -> None:
+        self.requests += 1
+    
+    def exhausted(self) -> Optional[str]:
+        """预算耗尽时返回原因"""
+        if self._max_seconds is not None and time.monotonic() - self._started >= self._max_seconds:
+            return f"已达单次运行耗时上限 {self._max_seconds:.0f} 秒"
+        if self._max_requests is not None and self.requests >= self._max_requests:
+            return f"已达单次运行请求上限 {self._max_requests} 次"
+        return None
+
+
+class FetchGuard:
+    """请求守卫 - 组合熔断器与运行预算，每次请求前检查，并记录被中止的债券"""
+    
+    def __init__(self, config: Config):
+        self._breaker = CircuitBreaker(config.CIRCUIT_BREAKER_THRESHOLD, config.CIRCUIT_BREAKER_COOLDOWN)
+        self._cooldown = config.CIRCUIT_BREAKER_COOLDOWN
+        self._budget = RunBudget(config.RUN_TIME_BUDGET_SECONDS, config.RUN_REQUEST_BUDGET)
+        self._lock = threading.Lock()
+        self._reported = False
+        self.aborted: set = set()
+    
+    @property
+    def breaker(self) -> CircuitBreaker:
+        return self._breaker
+    
+    @property
+    def budget(self) -> RunBudget:
+        return self._budget
+    
+    def start_run(self) -> None:
+        """开始新一次运行：重置预算与中止记录（熔断状态跨运行保留）"""
+        with self._lock:
+            self._budget.reset()
+            self.aborted.clear()
+            self._reported = False
+    
+    def before_request(self, symbol: str, consume: bool = True) -> None:
+        """请求前检查，不允许时抛出 FetchAborted"""
+        with self._lock:
+            reason = self._budget.exhausted()
+            if reason is None and consume and not self._breaker.allow():
+                reason = "连续触发访问限制，熔断中"
+            if reason is None and not consume and self._breaker.blocked():
+                reason = "连续触发访问限制，熔断中"
+            
+            if reason is not None:
+                self.aborted.add(symbol)
+                if not self._reported:
+                    tqdm.write(f"警告: {reason}，本次运行停止抓取剩余债券。")
+                    self._reported = True
+                raise FetchAborted(reason)
+            
+            if consume:
+                self._budget.consume()
+    
+    def after_response(self, status_code: int) -> None:
+        if status_code in BondDataFetcher.THROTTLE_STATUS:
+            if self._breaker.on_throttle():
+                tqdm.write(f"警告: 持续触发访问限制，熔断 {self._cooldown:.0f} 秒。")
+        else:
+            self._breaker.on_success()
+
+
+class AdaptiveTokenBucket:
+    """自适应令牌桶 - 请求成功时加性提速，触发 403/421 时乘性降速（AIMD），仅在单个事件循环内使用"""
+    
+    def __init__(self, rate: float, min_rate: float, max_rate: float,
+                 increase: float, decrease: float, burst: float = 1.0):
+        self._rate = rate
+        self._min_rate = min_rate
+        self._max_rate = max_rate
+        self._increase = increase
+        self._decrease = decrease
+        self._burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._last_decrease = 0.0
+    
+    @property
+    def rate(self) -> float:
+        return self._rate
+    
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+    
+    async def acquire(self) -> None:
+        """等待并取走一个令牌"""
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self._rate)
+    
+    def on_success(self) -> None:
+        self._rate = min(self._max_rate, self._rate + self._increase)
+    
+    def on_throttle(self) -> bool:
+        """触发访问限制：降速并清空令牌。同一轮拥塞（一个请求间隔内）只降速一次，返回是否降速"""
+        now = time.monotonic()
+        if now - self._last_decrease < 1 / self._rate:
+            return False
+        
+        self._refill()
+        self._rate = max(self._min_rate, self._rate * self._decrease)
+        self._tokens = min(self._tokens, 0.0)
+        self._last_decrease = now
+        return True
+
+
+class AsyncMetadataFetcher:
+    """异步元数据抓取引擎 - 多个协程共享一个自适应令牌桶，在站点容忍范围内尽量提速"""
+    
+    def __init__(self, fetcher: 'BondDataFetcher', config: Config):
+        self._fetcher = fetcher
+        self._config = config
+        self._bucket = AdaptiveTokenBucket(
+            config.RATE_INITIAL, config.RATE_MIN, config.RATE_MAX,
+            config.RATE_ADDITIVE_INCREASE, config.RATE_MULTIPLICATIVE_DECREASE
+        )
+    
+    @property
+    def bucket(self) -> AdaptiveTokenBucket:
+        return self._bucket
+    
+    async def _request(self, symbol: str, func, *args) -> Optional[requests.Response]:
+        """取令牌后在线程中发起同步请求，返回 None 表示触发访问限制"""
+        guard = self._fetcher.guard
+        guard.before_request(symbol, consume=False)
+        await self._bucket.acquire()
+        guard.before_request(symbol)
+        response = await asyncio.to_thread(func, *args)
+        guard.after_response(response.status_code)
+        
+        if response.status_code in self._fetcher.THROTTLE_STATUS:
+            if self._bucket.on_throttle():
+                tqdm.write(f"警告: 触发访问限制 ({response.status_code})，请求速率降至 {self._bucket.rate:.3f} 次/秒")
+            return None
+        
+        self._bucket.on_success()
+        return response
+    
+    async def fetch_one(self, symbol: str, session: Optional[requests.Session] = None) -> Optional[Dict]:
+        """获取单个债券元数据"""
+        caller = session if session else requests
+        known_code = self._fetcher.lookup_code(symbol)
+        
+        for _ in range(self._config.RETRY_COUNT):
+            try:
+                headers = self._fetcher._build_headers()
+                # 已知代码只用于首次尝试，失败后回退到搜索接口
+                query_code, known_code = known_code, None
+                if not query_code:
+                    r_search = await self._request(symbol, self._fetcher._post_search, caller, symbol, headers)
+                    if r_search is None:
+                        continue
+                    
+                    query_code = self._fetcher._parse_search(symbol, r_search)
+                    if not query_code:
+                        continue
+                
+                r_detail = await self._request(symbol, self._fetcher._post_detail, caller, query_code, headers)
+                if r_detail is None:
+                    continue
+                
+                metadata = self._fetcher._parse_detail(symbol, query_code, r_detail)
+                if metadata:
+                    return metadata
+            except FetchAborted:
+                return None
+            except Exception as e:
+                tqdm.write(f"异常: {symbol} 抓取错误: {e}")
+        
+        return None
+    
+    async def fetch_listing_page(self, caller, query: Dict[str, str], page_no: int,
+                                 page_size: int) -> Optional[Dict]:
+        """获取列表接口单页数据，带重试，与元数据请求共用熔断器、运行预算与令牌桶"""
+        label = f"批量列表 {query} 第 {page_no} 页"
+        for _ in range(self._config.RETRY_COUNT):
+            try:
+                r = await self._request(label, self._fetcher._post_listing, caller,
+                                        self._fetcher._build_headers(), query, page_no, page_size)
+            except FetchAborted:
+                return None
+            except Exception as e:
+                tqdm.write(f"批量列表请求异常: {e}")
+                continue
+            
+            if r is not None and r.status_code == 200:
+                return r.json().get('data', {})
+        return None
+    
+    async def fetch_many(self, symbols: List[str], session: Optional[requests.Session] = None,
+                         on_result=None) -> Dict[str, Optional[Dict]]:
+        """并发抓取多个债券，每完成一个即回调 on_result(symbol, metadata)"""
+        semaphore = asyncio.Semaphore(self._config.ASYNC_CONCURRENCY)
+        
+        async def worker(symbol: str) -> tuple:
+            async with semaphore:
+                return symbol, await self.fetch_one(symbol, session)
+        
+        results = {}
+        tasks = [asyncio.ensure_future(worker(s)) for s in symbols]
+        for next_done in asyncio.as_completed(tasks):
+            symbol, metadata = await next_done
+            results[symbol] = metadata
+            if on_result is not None:
+                on_result(symbol, metadata)
+        return results
+
+
+class BondDataFetcher:
+    """债券数据获取器 - 负责所有API调用"""
+    
+    SEARCH_PATH = "/ags/ms/cm-u-bond-md/BondMarketInfoList2"
+    DETAIL_PATH = "/ags/ms/cm-u-bond-md/BondDetailInfo"
+    THROTTLE_STATUS = (403, 421)
+    
+    def __init__(self, config: Config):
+        self._config = config
+        self._session: Optional[requests.Session] = None
+        self._guard = FetchGuard(config)
+        self._async_engine = AsyncMetadataFetcher(self, config)
+        self._resolver: Optional[SymbolResolver] = None
+    
+    @property
+    def guard(self) -> FetchGuard:
+        return self._guard
+    
+    def _create_session(self) -> requests.Session:
+        """创建并配置请求会话"""
+        if self._session is None:
+            if self._config.HTTP_RECORD_FILE:
+                self._session = RecordingSession(self._config.HTTP_RECORD_FILE)
+            else:
+                self._session = requests.Session()
+            try:
+                self._session.get(f"{self._config.CHINAMONEY_BASE_URL}/chinese/zqjc/", timeout=15)
+            except:
+                pass
+        return self._session
+    
+    def fetch_deal_data(self, settlement_dt_str: str, cache_manager: CacheManager) -> Optional[pd.DataFrame]:
+        """获取成交数据 - 优先使用缓存"""
+        if cache_manager.has_deal_cache(settlement_dt_str):
+            try:
+                deal_df = cache_manager.load_deal_cache(settlement_dt_str)
+                print(f"从缓存加载 {len(deal_df)} 条成交记录。")
+                return deal_df
+            except Exception as e:
+                print(f"加载成交行情缓存失败: {e}")
+        
+        if self._config.ONLINE_MODE:
+            deal_df = self.fetch_deal_snapshot()
+            if deal_df is not None:
+                print(f"获取 {len(deal_df)} 条成交记录。")
+                cache_manager.save_deal_cache(deal_df, settlement_dt_str)
+                return deal_df
+        
+        return None
+    
+    def fetch_deal_snapshot(self) -> Optional[pd.DataFrame]:
+        """拉取实时成交快照（不读写缓存）"""
+        try:
+            return ak.bond_spot_deal()
+        except Exception as e:
+            print(f"获取行情失败: {e}")
+            return None
+    
+    def fetch_metadata(self, symbol: str, session: Optional[requests.Session] = None) -> Optional[Dict]:
+        """获取单个债券元数据"""
+        if self._config.FETCH_ENGINE == 'async':
+            return asyncio.run(self._async_engine.fetch_one(symbol, session))
+        
+        for attempt in range(self._config.RETRY_COUNT):
+            try:
+                metadata = self._fetch_metadata_impl(symbol, attempt, session)
+                if metadata:
+                    return metadata
+            except FetchAborted:
+                return None
+            except Exception as e:
+                tqdm.write(f"异常: {symbol} 抓取错误: {e}")
+                time.sleep(5)
+        
+        return None
+    
+    def fetch_metadata_many(self, symbols: List[str], session: Optional[requests.Session] = None,
+                            on_result=None) -> None:
+        """批量获取元数据 - async 引擎在同一个事件循环内并发抓取，每完成一个即回调 on_result(symbol, metadata)"""
+        if self._config.FETCH_ENGINE == 'async':
+            asyncio.run(self._async_engine.fetch_many(symbols, session, on_result))
+            return
+        
+        with ThreadPoolExecutor(max_workers=self._config.CONCURRENT_THREADS) as executor:
+            future_to_symbol = {
+                executor.submit(self.fetch_metadata, s, session): s 
+                for s in symbols
+            }
+            
+            for future in as_completed(future_to_symbol):
+                try:
+                    on_result(future_to_symbol[future], future.result())
+                except:
+                    pass
+    
+    def _fetch_metadata_impl(self, symbol: str, attempt: int, session: Optional[requests.Session] = None) -> Optional[Dict]:
+        """获取债券元数据实现（固定延迟节流）"""
+        caller = session if session else requests
+        headers = self._build_headers()
+        # 首次尝试优先使用已知代码，失败后回退到搜索接口
+        query_code = self.lookup_code(symbol) if attempt == 0 else None
+        
+        if not query_code:
+            time.sleep(self._config.DELAY_BETWEEN_REQUESTS + random.uniform(2.0, 5.0) * (attempt + 1))
+            self._guard.before_request(symbol)
+            r_search = self._post_search(caller, symbol, headers)
+            self._guard.after_response(r_search.status_code)
+            
+            if r_search.status_code in self.THROTTLE_STATUS:
+                if self._guard.breaker.state != 'closed':
+                    return None
+                wait_time = 30 * (attempt + 1)
+                tqdm.write(f"警告: {symbol} 触发访问限制 ({r_search.status_code})，等待 {wait_time} 秒...")
+                time.sleep(wait_time)
+                return None
+            
+            query_code = self._parse_search(symbol, r_search)
+            if not query_code:
+                return None
+        
+        # 详情接口
+        time.sleep(random.uniform(1.5, 3.0))
+        self._guard.before_request(symbol)
+        r_detail = self._post_detail(caller, query_code, headers)
+        self._guard.after_response(r_detail.status_code)
+        return self._parse_detail(symbol, query_code, r_detail)
+    
+    def _post_search(self, caller, symbol: str, headers: Dict[str, str]) -> requests.Response:
+        """调用搜索接口"""
+        return self._post_listing(caller, headers, {"bondName": normalize_symbol(symbol)}, 1, 15)
+    
+    def _post_listing(self, caller, headers: Dict[str, str], query: Dict[str, str],
+                      page_no: int, page_size: int) -> requests.Response:
+        """调用列表接口（搜索与批量分页共用）"""
+        payload = {
+            "pageNo": str(page_no), "pageSize": str(page_size), "bondName": "",
+            "bondCode": "", "issueEnty": "", "bondType": "", "bondSpclPrjctVrty": "",
+            "couponType": "", "issueYear": "", "entyDefinedCode": "", "rtngShrt": ""
+        }
+        payload.update(query)
+        return caller.post(self._config.CHINAMONEY_BASE_URL + self.SEARCH_PATH, data=payload, headers=headers, timeout=20)
+    
+    def fetch_universe(self, session: Optional[requests.Session] = None) -> tuple:
+        """按 UNIVERSE_QUERIES 分页拉取列表接口，返回 (全部 (bondName, bondDefinedCode) 记录, 是否全部分页成功)"""
+        caller = session if session else requests
+        page_size = self._config.UNIVERSE_PAGE_SIZE
+        listings, complete = [], True
+        
+        async def fetch_pages() -> None:
+            nonlocal complete
+            for query in self._config.UNIVERSE_QUERIES:
+                page_no, page_total = 1, None
+                while page_total is None or page_no <= page_total:
+                    page = await self._async_engine.fetch_listing_page(caller, query, page_no, page_size)
+                    if page is None:
+                        print(f"批量列表 {query} 第 {page_no} 页获取失败，已获取部分保留。")
+                        complete = False
+                        break
+                    
+                    result_list = page.get('resultList') or []
+                    listings.extend(result_list)
+                    page_total = page.get('pageTotal') or (page_no + 1 if len(result_list) >= page_size else page_no)
+                    page_no += 1
+        
+        asyncio.run(fetch_pages())
+        print(f"批量列表完成，共获取 {len(listings)} 条债券代码。")
+        return listings, complete
+    
+    def prepare_resolver(self, symbols: List[str], cache_manager: 'CacheManager',
+                         session: Optional[requests.Session] = None) -> None:
+        """绑定代码解析索引：存在未知债券且列表已过期时批量列表一次"""
+        self.bind_resolver(cache_manager.symbol_resolver)
+        if not self._config.UNIVERSE_BULK_DISCOVERY:
+            return
+        
+        unknown = [s for s in symbols if s not in self._resolver]
+        age = cache_manager.universe_listing_age_hours()
+        if not unknown or (age is not None and age < self._config.UNIVERSE_REFRESH_HOURS):
+            return
+        
+        print(f"{len(unknown)} 个债券无已知代码，正在批量列表债券池...")
+        listings, complete = self.fetch_universe(session)
+        if listings:
+            cache_manager.save_universe_listing(listings, complete)
+    
+    def bind_resolver(self, resolver: SymbolResolver) -> None:
+        """绑定代码解析索引，搜索结果将持续写入该索引"""
+        self._resolver = resolver
+    
+    def lookup_code(self, symbol: str) -> Optional[str]:
+        """查询已知的 bondDefinedCode，命中时可跳过搜索接口"""
+        return self._resolver.resolve(symbol) if self._resolver is not None else None
+    
+    def _parse_search(self, symbol: str, r_search: requests.Response) -> Optional[str]:
+        """从搜索结果中解析 bondDefinedCode"""
+        if r_search.status_code != 200:
+            return None
+        
+        search_json = r_search.json()
+        result_list = search_json.get('data', {}).get('resultList', [])
+        if not result_list:
+            return None
+        
+        if self._resolver is not None:
+            return self._resolver.learn_search(symbol, result_list)
+        
+        search_symbol = normalize_symbol(symbol)
+        for res in result_list:
+            if normalize_symbol(res.get('bondName')) == search_symbol:
+                return res.get('bondDefinedCode')
+        return result_list[0].get('bondDefinedCode')
+    
+    def _post_detail(self, caller, query_code: str, headers: Dict[str, str]) -> requests.Response:
+        """调用详情接口"""
+        detail_headers = headers.copy()
+        detail_headers["Referer"] = f"https://www.chinamoney.com.cn/chinese/zqjc/?bondDefinedCode={query_code}"
+        return caller.post(self._config.CHINAMONEY_BASE_URL + self.DETAIL_PATH, data={"bondDefinedCode": query_code}, headers=detail_headers, timeout=20)
+    
+    def _parse_detail(self, symbol: str, query_code: str, r_detail: requests.Response) -> Optional[Dict]:
+        """解析详情接口返回的元数据"""
+        if r_detail.status_code != 200:
+            return None
+        
+        res_json = r_detail.json()
+        if 'data' not in res_json or 'bondBaseInfo' not in res_json['data']:
+            return None
+        
+        data = res_json['data']['bondBaseInfo']
+        coupon_rate = data.get('parCouponRate')
+        
+        return {
+            'symbol': symbol,
+            'bond_code': query_code,
+            'maturity_date': data.get('mrtyDate'),
+            'coupon_rate': float(coupon_rate) / 100 if coupon_rate and coupon_rate != '---' else 0,
+            'frequency': data.get('couponFrqncy', '年'),
+            'bond_type': data.get('bondType'),
+            'coupon_type': data.get('intrstPayMeth')
+        }
+    
+    def _build_headers(self) -> Dict[str, str]:
+        """构建请求头"""
+        return {
+            "User-Agent": random.choice(self._config.USER_AGENTS),
+            "Accept": "application/json, text/javascript, */*; q=0.01",
+            "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+            "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
+            "X-Requested-With": "XMLHttpRequest",
+            "Origin": "https://www.chinamoney.com.cn",
+            "Referer": "https://www.chinamoney.com.cn/chinese/zqjc/",
+            "Connection": "keep-alive",
+            "Sec-Fetch-Dest": "empty",
+            "Sec-Fetch-Mode": "cors",
+            "Sec-Fetch-Site": "same-origin",
+        }
+    
+    def batch_fetch_metadata(self, symbols: List[str], cache: MetadataTable,
+                            cache_manager: CacheManager) -> int:
+        """批量获取元数据 - 每条结果立即写入日志，中断后可从断点续抓"""
+        if not symbols:
+            return 0
+        
+        symbols = cache_manager.begin_fetch_run(symbols)
+        session = self._create_session()
+        self.prepare_resolver(symbols, cache_manager, session)
+        success_count = 0
+        progress = tqdm(total=len(symbols), desc="抓取进度")
+        
+        def on_result(symbol: str, data: Optional[Dict]) -> None:
+            nonlocal success_count
+            progress.update(1)
+            if data:
+                cache.add(data)
+                cache_manager.record_metadata(data)
+                success_count += 1
+            elif symbol not in self._guard.aborted:
+                cache_manager.record_fetch_failure(symbol)
+        
+        self.fetch_metadata_many(symbols, session, on_result)
+        if self._config.FETCH_ENGINE == 'async':
+            tqdm.write(f"当前自适应请求速率: {self._async_engine.bucket.rate:.3f} 次/秒")
+        progress.close()
+        cache_manager.end_fetch_run()
+        return success_count
+
+
+# ==================== 债券计算模块 ====================
+
+class CouponScheduleCache:
+    """付息日表 LRU 缓存 - 容量有上限，超出时淘汰最久未使用的条目"""
+    
+    def __init__(self, maxsize: int):
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get(self, key) -> Optional[tuple]:
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+    
+    def get_many(self, keys: Iterable) -> Dict:
+        """批量查询，只加一次锁；未命中的键对应 None"""
+        entries = self._entries
+        with self._lock:
+            found = {key: entries.get(key) for key in keys}
+            hits = [key for key, value in found.items() if value is not None]
+            for key in hits:
+                entries.move_to_end(key)
+            self.hits += len(hits)
+            self.misses += len(found) - len(hits)
+        return found
+    
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+
+class BondCalculator:
+    """债券计算器 - 负责所有债券相关计算"""
+    
+    # 付息频率 -> 每年付息次数，未识别的按年付息处理
+    FREQUENCY_MAP = {'年': 1, '半年': 2, '季': 4, '按年付息': 1, '半年付息': 2, '按季付息': 4}
+    _schedule_cache = CouponScheduleCache(config.COUPON_SCHEDULE_CACHE_SIZE)
+    
+    @staticmethod
+    def calculate_remaining_days(maturity_date: Any, settlement_date: Any = None) -> Optional[int]:
+        """计算债券剩余天数"""
+        try:
+            settlement_dt = (datetime.now() if settlement_date is None 
+                           else datetime.strptime(settlement_date, '%Y-%m-%d') 
+                           if isinstance(settlement_date, str) else settlement_date)
+            
+            if hasattr(settlement_dt, 'replace'):
+                settlement_dt = settlement_dt.replace(hour=0, minute=0, second=0, microsecond=0)
+            
+            if not maturity_date or maturity_date == '---':
+                return None
+            
+            maturity_dt = (datetime.strptime(maturity_date, '%Y-%m-%d') 
+                         if isinstance(maturity_date, str) else maturity_date)
+            
+            if hasattr(maturity_dt, 'replace'):
+                maturity_dt = maturity_dt.replace(hour=0, minute=0, second=0, microsecond=0)
+            
+            days = (maturity_dt - settlement_dt).days
+            return max(0, days) if days > 0 else 0
+        except:
+            return None
+    
+    @staticmethod
+    def format_tenor(days: Optional[int]) -> str:
+        """格式化剩余期限显示"""
+        if days is None or days <= 0:
+            return ""
+        
+        years_part = days // 365
+        days_part = days % 365
+        
+        if years_part > 0:
+            return f"{years_part}年{days_part}天" if days_part > 0 else f"{years_part}年"
+        return f"{days_part}天"
+    
+    @staticmethod
+    def calculate_after_tax_yield(yield_val: Optional[float], bond_type: str) -> Optional[float]:
+        """计算税后收益率"""
+        if yield_val is None or pd.isna(yield_val):
+            return None
+        
+        is_tax_exempt = (bond_type == '国债' or '地方政府债' in bond_type)
+        return yield_val if is_tax_exempt else yield_val * 0.8
+    
+    @staticmethod
+    def remaining_days_array(maturity_dates: pd.Series, settlement_date: Any = None) -> np.ndarray:
+        """按列计算剩余天数，返回浮点数组，无法解析的到期日为 NaN"""
+        settlement_dt = pd.Timestamp(datetime.now() if settlement_date is None else settlement_date).normalize()
+        maturity_dt = pd.to_datetime(maturity_dates, format='%Y-%m-%d', errors='coerce').dt.normalize()
+        days = (maturity_dt - settlement_dt).dt.days.to_numpy(dtype=float, na_value=np.nan)
+        return np.where(np.isnan(days), np.nan, np.maximum(days, 0))
+    
+    @staticmethod
+    def format_tenor_array(days: np.ndarray) -> np.ndarray:
+        """按列格式化剩余期限：只对去重后的天数调用 format_tenor，再按索引展开"""
+        whole = np.where(np.isnan(days), 0, days).astype(np.int64)
+        unique_days, inverse = np.unique(whole, return_inverse=True)
+        labels = np.array([BondCalculator.format_tenor(int(d)) for d in unique_days], dtype=object)
+        return labels[inverse.reshape(-1)]
+    
+    @staticmethod
+    def after_tax_yield_array(yields: pd.Series, bond_types: pd.Series) -> np.ndarray:
+        """按列计算税后收益率：国债与地方政府债免税，其余按 80% 计"""
+        values = yields.to_numpy(dtype=float, na_value=np.nan)
+        return np.where(BondCalculator.tax_exempt_array(bond_types), values, values * 0.8)
+    
+    @staticmethod
+    def tax_exempt_array(bond_types: pd.Series) -> np.ndarray:
+        """按列判断利息是否免税，规则同 calculate_after_tax_yield"""
+        types = pd.Series(bond_types).fillna('').astype(str)
+        return ((types == '国债') | types.str.contains('地方政府债', regex=False)).to_numpy()
+    
+    @staticmethod
+    def day_count_fraction(date1: datetime, date2: datetime, convention: str = 'Act/365') -> float:
+        """计算天数分数（单对日期，委托给 day_count_fraction_array）"""
+        return float(BondCalculator.day_count_fraction_array([date1], [date2], convention)[0])
+    
+    @staticmethod
+    def day_count_fraction_array(start_dates: Any, end_dates: Any, convention: str = 'Act/365',
+                                 frequency: Any = 1, reference_start: Any = None,
+                                 reference_end: Any = None) -> np.ndarray:
+        """
+        按列计算天数分数，支持 Act/365、Act/Act（ICMA）与 30/360
+        Act/Act 给定参考付息期时按 天数 / (年付息次数 × 参考期天数) 计算；
+        未给定时以结束日为锚、按年付息次数划分名义付息期，整期计 1/频率，不足一期的部分按所在期的实际天数精确计算
+        """
+        start, end = BondCalculator._to_days(start_dates), BondCalculator._to_days(end_dates)
+        days = (end - start).astype(np.int64)
+        
+        if convention == 'Act/Act':
+            frequency = np.broadcast_to(np.asarray(frequency, dtype=np.int64), days.shape)
+            if reference_start is not None and reference_end is not None:
+                ref_start = np.asarray(reference_start, dtype='datetime64[D]')
+                ref_end = np.asarray(reference_end, dtype='datetime64[D]')
+                return days / (frequency * (ref_end - ref_start).astype(np.int64))
+            
+            # 起止日颠倒时按绝对值计算后取负
+            sign = np.where(days < 0, -1.0, 1.0)
+            lo, hi = np.minimum(start, end), np.maximum(start, end)
+            step = 12 // frequency
+            months = (hi.astype('datetime64[M]') - lo.astype('datetime64[M]')).astype(np.int64)
+            k = months // step
+            k = np.where(BondCalculator.coupon_dates_array(hi, step, k) < lo, k - 1, k)
+            period_end = BondCalculator.coupon_dates_array(hi, step, k)
+            period_start = BondCalculator.coupon_dates_array(hi, step, k + 1)
+            stub = (period_end - lo).astype(np.int64) / (period_end - period_start).astype(np.int64)
+            return sign * (k + stub) / frequency
+        
+        if convention == '30/360':
+            start_ts, end_ts = pd.DatetimeIndex(start), pd.DatetimeIndex(end)
+            d1 = np.minimum(30, start_ts.day.to_numpy())
+            d2 = end_ts.day.to_numpy()
+            d2 = np.where((d1 == 30) & (d2 == 31), 30, d2)
+            return (360 * (end_ts.year.to_numpy() - start_ts.year.to_numpy())
+                    + 30 * (end_ts.month.to_numpy() - start_ts.month.to_numpy()) + (d2 - d1)) / 360
+        
+        return days / 365
+    
+    @staticmethod
+    def _to_days(dates: Any) -> np.ndarray:
+        """将日期序列转为 datetime64[D] 数组，已是 datetime64 的数组不做额外转换"""
+        values = np.asarray(dates)
+        if np.issubdtype(values.dtype, np.datetime64):
+            return values.astype('datetime64[D]')
+        return pd.to_datetime(pd.Series(values.ravel())).to_numpy().astype('datetime64[D]')
+    
+    @staticmethod
+    def coupon_dates_array(maturities: np.ndarray, months_step: np.ndarray, k: np.ndarray) -> np.ndarray:
+        """
+        到期日往前第 k 期的付息日（k=0 为到期日本身），支持广播
+        以到期日为锚按月回推，不会逐期漂移；各期取到期日的同日，超出当月天数时取当月最后一天
+        """
+        maturities = np.asarray(maturities, dtype='datetime64[D]')
+        maturity_month = maturities.astype('datetime64[M]')
+        maturity_day = (maturities - maturity_month.astype('datetime64[D]')).astype(np.int64) + 1
+        
+        month = maturity_month - np.asarray(k) * np.asarray(months_step)
+        month_start = month.astype('datetime64[D]')
+        month_days = ((month + 1).astype('datetime64[D]') - month_start).astype(np.int64)
+        return month_start + np.minimum(maturity_day, month_days) - 1
+    
+    @staticmethod
+    def coupon_schedule(maturities: np.ndarray, months_step: np.ndarray, settlement: np.datetime64) -> tuple:
+        """按到期日回推，返回 (上一付息日, 下一付息日, 剩余付息次数)"""
+        maturities = np.asarray(maturities, dtype='datetime64[D]')
+        settlement = np.datetime64(settlement, 'D')
+        months_left = (maturities.astype('datetime64[M]') - settlement.astype('datetime64[M]')).astype(np.int64)
+        k = np.maximum(months_left // months_step, 0)
+        # 回推得到的付息日不晚于结算日时退后一期
+        k = np.where(BondCalculator.coupon_dates_array(maturities, months_step, k) <= settlement, k - 1, k)
+        k = np.maximum(k, 0)
+        return (BondCalculator.coupon_dates_array(maturities, months_step, k + 1),
+                BondCalculator.coupon_dates_array(maturities, months_step, k), k + 1)
+    
+    @staticmethod
+    def get_coupon_schedules(settlement_date: Any, maturities: Iterable, frequencies: Iterable) -> List[tuple]:
+        """
+        批量生成付息日表，返回与输入一一对应的 (结算日后各付息日 datetime64[D] 数组, 上一付息日)
+        到期日为空时返回 (空数组, NaT)，已到期时返回 (空数组, 到期日)
+        """
+        settlement = np.datetime64(pd.Timestamp(settlement_date).normalize().date(), 'D')
+        mats = pd.to_datetime(pd.Series(list(maturities), dtype=object), errors='coerce').to_numpy()
+        mats = mats.astype('datetime64[D]')
+        freqs = pd.Series(list(frequencies), dtype=object).map(BondCalculator.FREQUENCY_MAP).fillna(1)
+        freqs = freqs.to_numpy(dtype=np.int64)
+        
+        schedules = [(np.zeros(0, dtype='datetime64[D]'), mat) for mat in mats]
+        live = np.flatnonzero(~np.isnat(mats) & (mats > settlement))
+        for i, schedule in zip(live, BondCalculator._cached_schedules(settlement, mats[live], freqs[live])):
+            schedules[i] = schedule
+        return schedules
+    
+    @staticmethod
+    def coupon_schedule_matrix(settlement: np.datetime64, maturities: np.ndarray, frequencies: np.ndarray) -> tuple:
+        """
+        经缓存的批量付息日表（到期日须晚于结算日），返回 (付息日矩阵, 上一付息日, 剩余付息次数)
+        矩阵每行一只债券、第 c 列为结算日后第 c+1 次付息，不足最大期数的部分重复到期日
+        """
+        maturities = np.asarray(maturities, dtype='datetime64[D]')
+        schedules = BondCalculator._cached_schedules(np.datetime64(settlement, 'D'), maturities,
+                                                     np.asarray(frequencies, dtype=np.int64))
+        dates, prev_dates = zip(*schedules) if schedules else ((), ())
+        periods = np.fromiter(map(len, dates), dtype=np.int64, count=len(dates))
+        prev_dates = np.array(prev_dates, dtype='datetime64[D]')
+        n_cols = int(periods.max()) if len(periods) else 0
+        grid = np.repeat(maturities[:, None], n_cols, axis=1)
+        if len(dates):
+            grid[np.arange(n_cols)[None, :] < periods[:, None]] = np.concatenate(dates)
+        return grid, prev_dates, periods
+    
+    @staticmethod
+    def _cached_schedules(settlement: np.datetime64, maturities: np.ndarray, frequencies: np.ndarray) -> List[tuple]:
+        """按 (到期日, 年付息次数, 结算日) 经 LRU 缓存取付息日表，未命中的债券一次性向量化生成"""
+        settle_day = int(settlement.astype(np.int64))
+        keys = [(mat, freq, settle_day) for mat, freq in zip(maturities.astype(np.int64).tolist(), frequencies.tolist())]
+        schedules = BondCalculator._schedule_cache.get_many(dict.fromkeys(keys))
+        
+        missing = [key for key, value in schedules.items() if value is None]
+        if missing:
+            mats = np.array([key[0] for key in missing], dtype=np.int64).astype('datetime64[D]')
+            steps = np.array([12 // key[1] for key in missing], dtype=np.int64)
+            prev_dates, _, periods = BondCalculator.coupon_schedule(mats, steps, settlement)
+            grid = BondCalculator.coupon_dates_array(
+                mats[:, None], steps[:, None], np.arange(int(periods.max()))[None, :]
+            )
+            for i, key in enumerate(missing):
+                dates = grid[i, :periods[i]][::-1].copy()
+                dates.flags.writeable = False
+                schedules[key] = (dates, prev_dates[i])
+                BondCalculator._schedule_cache.put(key, schedules[key])
+        
+        return [schedules[key] for key in keys]
+    
+    @staticmethod
+    def get_coupon_dates(settlement_date: Any, maturity_date: Any, frequency_str: str) -> tuple:
+        """生成单只债券的付息日表，返回 (结算日后各付息日数组, 上一付息日)"""
+        return BondCalculator.get_coupon_schedules(settlement_date, [maturity_date], [frequency_str])[0]
+
+
+# ==================== 债券定价模块 ====================
+
+@dataclass
+class PricingReport:
+    """批量求解收益率的收敛情况"""
+    total: int = 0  # 参与求解的债券数
+    converged: int = 0
+    closed_form: int = 0  # 剩余一个付息周期、按单利公式直接求解的债券数
+    max_iterations: int = 0
+    mean_iterations: float = 0.0
+    max_residual: float = 0.0  # 收敛债券的最大全价残差
+    failed_symbols: List[str] = field(default_factory=list)
+    
+    def summary(self) -> str:
+        text = (f"收益率求解：{self.converged}/{self.total} 只收敛（其中单利公式 {self.closed_form} 只），"
+                f"最大迭代 {self.max_iterations} 次，平均 {self.mean_iterations:.1f} 次，"
+                f"最大残差 {self.max_residual:.2e}")
+        if self.failed_symbols:
+            text += f"；未收敛: {', '.join(self.failed_symbols[:10])}"
+            if len(self.failed_symbols) > 10:
+                text += f" 等 {len(self.failed_symbols)} 只"
+        return text
+
+
+@dataclass
+class BondCashflows:
+    """一批债券的剩余现金流，各数组按 index 所指的原始行排列"""
+    index: np.ndarray  # 参与计算的原始行号
+    frequency: np.ndarray  # 每年付息次数
+    coupon: np.ndarray  # 每期票息（元/百元面值）
+    periods: np.ndarray  # 剩余付息期数
+    cashflows: np.ndarray  # (债券数, 最大期数)，最后一期含本金
+    exponents: np.ndarray  # 各期贴现期数
+    accrued: np.ndarray  # 应计利息
+    days_to_next: np.ndarray  # 距下一付息日天数
+    
+    @property
+    def last(self) -> np.ndarray:
+        """仅剩最后一个付息周期、按单利定价的债券"""
+        return self.periods == 1
+    
+    def dirty_prices(self, y: np.ndarray) -> np.ndarray:
+        """
+        按收益率（小数）计算全价；y 形状为 (..., 债券数)，可一次传入多组情景
+        """
+        y = np.asarray(y, dtype=float)
+        base = 1 + y / self.frequency
+        with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+            discount = np.exp(-np.log(base)[..., None] * self.exponents)
+            prices = np.einsum('...bc,bc->...b', discount, self.cashflows)
+            simple = (100 + self.coupon) / (1 + y * self.days_to_next / 365)
+        return np.where(self.last, simple, prices)
+
+
+class BondPricer:
+    """
+    批量定价引擎 - 由成交净价一次性求解所有债券的到期收益率、应计利息、全价及久期凸性
+    
+    付息日取自 BondCalculator.coupon_schedule_matrix（以到期日为锚回推并经 LRU 缓存，情景与持有期模块复用同一缓存）；应计利息与贴现期数按 Act/Act（ICMA）以当期付息期为参考计算。
+    剩余多个付息周期时按复利贴现求解，剩余最后一个周期时按单利公式（年天数 365）直接计算。
+    久期以年为单位，凸性以年的平方为单位，DV01 为收益率变动 1BP 时每百元面值全价的变动。
+    """
+    
+    YIELD_BOUNDS = (-0.5, 1.0)  # 收益率求解区间（小数）
+    
+    def __init__(self, config: Config):
+        self._config = config
+    
+    def price(self, clean_prices: Any, coupon_rates: Any, frequencies: Any, maturities: Any,
+              settlement_date: Any, symbols: Optional[List[str]] = None) -> tuple:
+        """
+        批量求解，返回 (结果 DataFrame, PricingReport)
+        结果列：应计利息、全价、到期收益率（%）、麦考利久期、修正久期、凸性、DV01；
+        缺少条款或无法求解的债券为 NaN
+        """
+        clean = pd.to_numeric(pd.Series(clean_prices), errors='coerce').to_numpy(dtype=float)
+        flows = self.prepare(coupon_rates, frequencies, maturities, settlement_date, valid=~np.isnan(clean))
+        symbols = list(symbols) if symbols is not None else [str(i) for i in range(len(clean))]
+        
+        n = len(clean)
+        accrued = np.full(n, np.nan)
+        yields = np.full(n, np.nan)
+        risk = np.full((4, n), np.nan)
+        report = PricingReport()
+        
+        idx = flows.index
+        if len(idx):
+            m, cpn, last = flows.frequency, flows.coupon, flows.last
+            accrued[idx] = flows.accrued
+            dirty = clean[idx] + flows.accrued
+            y, iterations, residual, ok = self._solve(dirty, cpn, flows.cashflows, flows.exponents, m, flows.periods)
+            
+            # 最后一个付息周期：y = (到期兑付额 / 全价 - 1) × 365 / 剩余天数
+            y[last] = ((100 + cpn[last]) / dirty[last] - 1) * 365 / flows.days_to_next[last]
+            iterations[last], residual[last], ok[last] = 0, 0.0, True
+            
+            yields[idx] = np.where(ok, y * 100, np.nan)
+            risk[:, idx] = np.where(ok, self._risk(y, dirty, flows.cashflows, flows.exponents, m, last,
+                                                   flows.days_to_next), np.nan)
+            report.total = len(idx)
+            report.converged = int(ok.sum())
+            report.closed_form = int(last.sum())
+            report.max_iterations = int(iterations.max())
+            report.mean_iterations = float(iterations[~last].mean()) if (~last).any() else 0.0
+            report.max_residual = float(residual[ok].max()) if ok.any() else 0.0
+            report.failed_symbols = [symbols[i] for i in idx[~ok]]
+        
+        result = pd.DataFrame({
+            '应计利息': accrued, '全价': clean + accrued, '到期收益率': yields,
+            '麦考利久期': risk[0], '修正久期': risk[1], '凸性': risk[2], 'DV01': risk[3]
+        })
+        return result, report
+    
+    def prepare(self, coupon_rates: Any, frequencies: Any, maturities: Any, settlement_date: Any,
+                valid: Optional[np.ndarray] = None) -> BondCashflows:
+        """解析条款并生成剩余现金流，valid 可进一步限定参与计算的行"""
+        coupon = pd.to_numeric(pd.Series(coupon_rates), errors='coerce').to_numpy(dtype=float)
+        freq = pd.Series(frequencies).map(BondCalculator.FREQUENCY_MAP).fillna(1).to_numpy(dtype=np.int64)
+        maturity = pd.to_datetime(pd.Series(maturities), format='%Y-%m-%d', errors='coerce').to_numpy()
+        settlement = np.datetime64(pd.Timestamp(settlement_date).normalize().date(), 'D')
+        
+        usable = ~np.isnan(coupon) & ~np.isnat(maturity)
+        if valid is not None:
+            usable &= np.asarray(valid, dtype=bool)
+        usable[usable] = maturity[usable].astype('datetime64[D]') > settlement
+        idx = np.flatnonzero(usable)
+        if not len(idx):
+            empty = np.zeros(0)
+            return BondCashflows(idx, empty.astype(np.int64), empty, empty.astype(np.int64), np.zeros((0, 0)),
+                                 np.zeros((0, 0)), empty, empty)
+        
+        mat = maturity[idx].astype('datetime64[D]')
+        m = freq[idx]
+        schedule, prev_date, periods = BondCalculator.coupon_schedule_matrix(settlement, mat, m)
+        next_date = schedule[:, 0]
+        settle = np.full(len(idx), settlement)
+        accrual = BondCalculator.day_count_fraction_array(prev_date, settle, 'Act/Act', m, prev_date, next_date)
+        to_next = BondCalculator.day_count_fraction_array(settle, next_date, 'Act/Act', m, prev_date, next_date)
+        days_to_next = BondCalculator.day_count_fraction_array(settle, next_date, 'Act/365') * 365
+        
+        cpn = coupon[idx] * 100 / m
+        cashflows, exponents = self._cashflows(cpn, periods, to_next * m)
+        return BondCashflows(idx, m, cpn, periods, cashflows, exponents, coupon[idx] * 100 * accrual, days_to_next)
+    
+    @staticmethod
+    def _cashflows(cpn: np.ndarray, periods: np.ndarray, first_fraction: np.ndarray) -> tuple:
+        """现金流矩阵：每行一只债券，列为剩余各期，最后一期含本金；返回 (现金流, 贴现期数)"""
+        col = np.arange(int(periods.max()))
+        mask = col[None, :] < periods[:, None]
+        cashflows = np.where(mask, cpn[:, None], 0.0)
+        cashflows[np.arange(len(periods)), periods - 1] += 100
+        exponents = first_fraction[:, None] + col[None, :]
+        return cashflows, exponents
+    
+    @staticmethod
+    def _risk(y: np.ndarray, dirty: np.ndarray, cashflows: np.ndarray, exponents: np.ndarray,
+              m: np.ndarray, last: np.ndarray, days_to_next: np.ndarray) -> np.ndarray:
+        """一次矩阵运算求麦考利久期、修正久期、凸性与 DV01，返回形状 (4, 债券数)"""
+        base = 1 + y / m
+        with np.errstate(over='ignore', invalid='ignore'):
+            discounted = cashflows * base[:, None] ** -exponents
+            pv = discounted.sum(axis=1)
+            macaulay = (discounted * exponents).sum(axis=1) / (pv * m)
+            convexity = (discounted * exponents * (exponents + 1)).sum(axis=1) / (pv * (m * base) ** 2)
+        modified = macaulay / base
+        
+        # 最后一个付息周期按单利定价：P = FV / (1 + y·t)
+        t = days_to_next / 365
+        simple = 1 + y * t
+        macaulay = np.where(last, t, macaulay)
+        modified = np.where(last, t / simple, modified)
+        convexity = np.where(last, 2 * (t / simple) ** 2, convexity)
+        return np.vstack([macaulay, modified, convexity, modified * dirty * 1e-4])
+    
+    def _solve(self, dirty: np.ndarray, cpn: np.ndarray, cashflows: np.ndarray,
+               exponents: np.ndarray, m: np.ndarray, periods: np.ndarray) -> tuple:
+        """带区间保护的向量化牛顿法：牛顿步越出当前区间时改用二分"""
+        def pv_and_slope(y, rows):
+            base = 1 + y[:, None] / m[rows, None]
+            discounted = cashflows[rows] * base ** -exponents[rows]
+            pv = discounted.sum(axis=1)
+            slope = -(discounted * exponents[rows]).sum(axis=1) / (base[:, 0] * m[rows])
+            return pv, slope
+        
+        all_rows = np.arange(len(dirty))
+        lo = np.full(len(dirty), self.YIELD_BOUNDS[0])
+        hi = np.full(len(dirty), self.YIELD_BOUNDS[1])
+        pv_lo, _ = pv_and_slope(lo, all_rows)
+        pv_hi, _ = pv_and_slope(hi, all_rows)
+        bracketed = (pv_lo >= dirty) & (pv_hi <= dirty)
+        
+        # 初值：近似收益率 =（票息 + 折溢价摊销）/ 平均价格
+        years = np.maximum(exponents[all_rows, periods - 1] / m, 1e-6)
+        y = (cpn * m + (100 - dirty) / years) / ((100 + dirty) / 2)
+        y = np.clip(np.nan_to_num(y), lo + 1e-6, hi - 1e-6)
+        
+        iterations = np.zeros(len(dirty), dtype=np.int64)
+        residual = np.full(len(dirty), np.inf)
+        active = bracketed.copy()
+        tolerance = self._config.PRICING_TOLERANCE
+        
+        for _ in range(self._config.PRICING_MAX_ITER):
+            rows = np.flatnonzero(active)
+            if not len(rows):
+                break
+            pv, slope = pv_and_slope(y[rows], rows)
+            diff = pv - dirty[rows]
+            residual[rows] = np.abs(diff)
+            done = np.abs(diff) < tolerance
+            
+            # 收益率越高现值越低：据此收窄区间
+            y_act, lo_act, hi_act = y[rows], lo[rows], hi[rows]
+            lo_act = np.where(diff > 0, y_act, lo_act)
+            hi_act = np.where(diff < 0, y_act, hi_act)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                newton = y_act - diff / slope
+            outside = ~np.isfinite(newton) | (newton <= lo_act) | (newton >= hi_act)
+            step = np.where(outside, (lo_act + hi_act) / 2, newton)
+            
+            lo[rows], hi[rows] = lo_act, hi_act
+            y[rows] = np.where(done, y_act, step)
+            iterations[rows] += ~done
+            active[rows[done]] = False
+        
+        converged = bracketed & (residual < tolerance)
+        return y, iterations, np.where(np.isfinite(residual), residual, np.nan), converged
+    
+    def price_frame(self, df: pd.DataFrame, settlement_date: Any, verbose: bool = True) -> pd.DataFrame:
+        """对分析结果逐列求解并追加应计利息、全价、到期收益率、收益率偏差（BP）及久期凸性列；verbose 控制是否打印求解汇总"""
+        if df.empty or '成交净价' not in df.columns:
+            return df
+        
+        result, report = self.price(df['成交净价'], df['票面利率'], df['付息频率'], df['到期日'],
+                                    settlement_date, df['债券简称'].tolist())
+        if verbose:
+            print(report.summary())
+        
+        df = df.copy()
+        for col in result.columns:
+            df[col] = result[col].to_numpy()
+        reported = df['加权收益率'].where(df['加权收益率'].notna(), df['最新收益率'])
+        df['收益率偏差'] = (df['到期收益率'] - reported) * 100
+        return df
+
+
+# ==================== 收益率曲线模块 ====================
+
+class NSSCurveFitter:
+    """
+    Nelson-Siegel-Svensson 曲线批量拟合
+    固定 tau1、tau2 时 beta 为加权线性最小二乘闭式解（变量投影），只需对 log(tau) 做两维 Levenberg-Marquardt 迭代；
+    所有日期堆叠为批次一次迭代，缺失的期限点权重为 0
+    """
+    
+    PARAM_COLUMNS = ['beta0', 'beta1', 'beta2', 'beta3', 'tau1', 'tau2']
+    TAU_BOUNDS = (0.05, 30.0)
+    TAU1_GRID = np.geomspace(0.1, 10.0, 15)
+    TAU2_GRID = np.geomspace(0.5, 30.0, 15)
+    
+    @staticmethod
+    def loadings(tenors: np.ndarray, tau1: Any, tau2: Any) -> np.ndarray:
+        """因子载荷矩阵，tau 可为数组：返回形状 (..., 期限数, 4)"""
+        t = np.maximum(np.asarray(tenors, dtype=float), 1e-6)
+        x1 = t / np.asarray(tau1, dtype=float)[..., None]
+        x2 = t / np.asarray(tau2, dtype=float)[..., None]
+        slope1 = (1 - np.exp(-x1)) / x1
+        slope2 = (1 - np.exp(-x2)) / x2
+        return np.stack([np.ones_like(x1), slope1, slope1 - np.exp(-x1), slope2 - np.exp(-x2)], axis=-1)
+    
+    @staticmethod
+    def evaluate(params: np.ndarray, tenors: Any) -> np.ndarray:
+        """按参数计算收益率；params 形状 (..., 6)，tenors 与其前导维度广播"""
+        params = np.asarray(params, dtype=float)
+        t = np.maximum(np.asarray(tenors, dtype=float), 1e-6)
+        b0, b1, b2, b3, tau1, tau2 = np.moveaxis(params, -1, 0)
+        x1, x2 = t / tau1, t / tau2
+        slope1 = (1 - np.exp(-x1)) / x1
+        slope2 = (1 - np.exp(-x2)) / x2
+        return b0 + b1 * slope1 + b2 * (slope1 - np.exp(-x1)) + b3 * (slope2 - np.exp(-x2))
+    
+    def _profile(self, tenors: np.ndarray, yields: np.ndarray, weights: np.ndarray,
+                 log_tau: np.ndarray) -> tuple:
+        """给定每日 tau 求 beta（正规方程加微小岭项防止 tau 接近时奇异），返回 (beta, 残差, 残差平方和)"""
+        tau = np.exp(log_tau)
+        design = self.loadings(tenors, tau[:, 0], tau[:, 1])  # (日期数, 期限数, 4)
+        weighted = design * weights[..., None]
+        gram = np.einsum('nki,nkj->nij', weighted, design) + 1e-10 * np.eye(4)
+        beta = np.linalg.solve(gram, np.einsum('nki,nk->ni', weighted, yields)[..., None])[..., 0]
+        resid = (yields - np.einsum('nkj,nj->nk', design, beta)) * weights
+        return beta, resid, (resid ** 2).sum(axis=1)
+    
+    def grid_start(self, tenors: np.ndarray, yields: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """对全部日期一次性评估 tau 网格上所有组合，返回每日最优 log(tau)，形状 (日期数, 2)"""
+        tau1, tau2 = np.meshgrid(self.TAU1_GRID, self.TAU2_GRID, indexing='ij')
+        grid = np.log(np.column_stack([tau1.ravel(), tau2.ravel()]))
+        best_sse = np.full(len(yields), np.inf)
+        best = np.repeat(grid[:1], len(yields), axis=0)
+        for log_tau in grid:
+            _, _, sse = self._profile(tenors, yields, weights, np.broadcast_to(log_tau, (len(yields), 2)))
+            better = sse < best_sse
+            best_sse[better], best[better] = sse[better], log_tau
+        return best
+    
+    def fit_batch(self, tenors: np.ndarray, yields: np.ndarray, start: Optional[np.ndarray] = None,
+                  max_iter: int = 50, tolerance: float = 1e-6) -> tuple:
+        """
+        批量拟合，yields 形状 (日期数, 期限数)，可含 NaN；start 为每日初始参数（缺失行改用网格初值）
+        返回 (参数 (日期数, 6), 均方根误差, 迭代次数)
+        """
+        yields = np.atleast_2d(np.asarray(yields, dtype=float))
+        weights = (~np.isnan(yields)).astype(float)
+        clean = np.nan_to_num(yields)
+        usable = weights.sum(axis=1) >= 4
+        n = len(yields)
+        
+        log_tau = np.zeros((n, 2))
+        need_grid = np.ones(n, dtype=bool)
+        if start is not None:
+            start = np.asarray(start, dtype=float)
+            need_grid = np.isnan(start[:, 4:6]).any(axis=1)
+            log_tau[~need_grid] = np.log(start[~need_grid, 4:6])
+        if need_grid.any():
+            log_tau[need_grid] = self.grid_start(tenors, clean[need_grid], weights[need_grid])
+        
+        lo, hi = np.log(self.TAU_BOUNDS[0]), np.log(self.TAU_BOUNDS[1])
+        log_tau = np.clip(log_tau, lo, hi)
+        beta, resid, sse = self._profile(tenors, clean, weights, log_tau)
+        damping = np.full(n, 1e-3)
+        iterations = np.zeros(n, dtype=np.int64)
+        active = usable.copy()
+        h = 1e-5
+        
+        for _ in range(max_iter):
+            rows = np.flatnonzero(active)
+            if not len(rows):
+                break
+            y_a, w_a, r_a = clean[rows], weights[rows], resid[rows]
+            jac = np.empty(r_a.shape + (2,))
+            for j in range(2):
+                bumped = log_tau[rows].copy()
+                bumped[:, j] += h
+                jac[..., j] = (self._profile(tenors, y_a, w_a, bumped)[1] - r_a) / h
+            
+            hessian = np.einsum('nki,nkj->nij', jac, jac)
+            gradient = np.einsum('nki,nk->ni', jac, r_a)
+            scaled = hessian + damping[rows, None, None] * (hessian * np.eye(2) + 1e-12 * np.eye(2))
+            step = np.linalg.solve(scaled, -gradient[..., None])[..., 0]
+            candidate = np.clip(log_tau[rows] + step, lo, hi)
+            cand_beta, cand_resid, cand_sse = self._profile(tenors, y_a, w_a, candidate)
+            
+            accepted = cand_sse < sse[rows]
+            gain = np.where(accepted, sse[rows] - cand_sse, 0.0)
+            acc_rows = rows[accepted]
+            log_tau[acc_rows], beta[acc_rows] = candidate[accepted], cand_beta[accepted]
+            resid[acc_rows], sse[acc_rows] = cand_resid[accepted], cand_sse[accepted]
+            damping[rows] = np.where(accepted, np.maximum(damping[rows] / 10, 1e-9), damping[rows] * 10)
+            iterations[rows] += 1
+            
+            # 接受的步长改进不足或阻尼过大时视为收敛
+            done = (accepted & (gain <= tolerance * (sse[rows] + gain))) | (damping[rows] > 1e8)
+            active[rows[done]] = False
+        
+        params = np.column_stack([beta, np.exp(log_tau)])
+        params[~usable] = np.nan
+        rmse = np.where(usable, np.sqrt(sse / np.maximum(weights.sum(axis=1), 1)), np.nan)
+        return params, rmse, iterations
+
+
+class YieldCurveEngine:
+    """
+    收益率曲线引擎 - 对中债国债收益率曲线历史逐日拟合 NSS 参数并与曲线缓存一同存储
+    逐日以前一交易日参数热启动拟合，仅在热启动失败时退回网格初值；参数已存在的日期不再重复拟合，之后每次运行只拟合新增日期
+    """
+    
+    def __init__(self, config: Config, cache_dir: Optional[str] = None):
+        self._config = config
+        self._cache_dir = cache_dir or config.CURVE_CACHE_DIR
+        self._storage = CacheStorage(config.CACHE_FORMAT)
+        self._fitter = NSSCurveFitter()
+        self._params: Optional[pd.DataFrame] = None
+        self._history_mtime: Optional[float] = None
+    
+    @property
+    def history_base(self) -> str:
+        return os.path.join(self._cache_dir, self._config.CURVE_HISTORY_FILE)
+    
+    @property
+    def params_base(self) -> str:
+        return os.path.join(self._cache_dir, self._config.CURVE_PARAMS_FILE)
+    
+    @staticmethod
+    def tenor_years(column: str) -> Optional[float]:
+        """期限列名转为年：3月 -> 0.25，10年 -> 10"""
+        match = re.fullmatch(r"(\d+(?:\.\d+)?)(月|年)", str(column))
+        if not match:
+            return None
+        value = float(match.group(1))
+        return value / 12 if match.group(2) == '月' else value
+    
+    def load_params(self) -> pd.DataFrame:
+        if self._params is None:
+            if self._storage.exists(self.params_base):
+                params = self._storage.read(self.params_base)
+                params['日期'] = pd.to_datetime(params['日期']).dt.strftime('%Y-%m-%d')
+                self._params = params.sort_values('日期').reset_index(drop=True)
+            else:
+                self._params = pd.DataFrame(columns=['日期'] + NSSCurveFitter.PARAM_COLUMNS + ['rmse', 'iterations'])
+        return self._params
+    
+    def update(self, history: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """拟合曲线缓存中尚无参数的日期并保存，返回全部参数"""
+        params = self.load_params()
+        if history is None:
+            if not self._storage.exists(self.history_base):
+                return params
+            history = self._storage.read(self.history_base)
+        if history.empty:
+            return params
+        
+        dates, tenors, yields = self.history_matrix(history)
+        pending = ~pd.Index(dates).isin(params['日期'])
+        if not pending.any():
+            return params
+        
+        print(f"正在拟合 {int(pending.sum())} 个交易日的 NSS 曲线参数...")
+        fitted = self._fit_sequence(dates[pending].tolist(), tenors, yields[pending], params)
+        
+        self._params = (pd.concat([params, fitted], ignore_index=True) if not params.empty else fitted)
+        self._params = self._params.sort_values('日期').reset_index(drop=True)
+        self._storage.write(self._params, self.params_base)
+        rmse = fitted['rmse'] * 100
+        print(f"拟合完成：平均误差 {rmse.mean():.2f} BP，最大误差 {rmse.max():.2f} BP。")
+        return self._params
+    
+    def refresh(self) -> pd.DataFrame:
+        """曲线缓存文件自上次检查后有变化时才读取并增量拟合，否则直接返回已加载的参数"""
+        history_file = self._storage.path(self.history_base)
+        if not os.path.exists(history_file):
+            history_file = self.history_base + CsvBackend.EXTENSION
+        mtime = os.path.getmtime(history_file) if os.path.exists(history_file) else None
+        if mtime is None or mtime != self._history_mtime:
+            self.update()
+            self._history_mtime = mtime
+        return self.load_params()
+    
+    def history_matrix(self, history: Optional[pd.DataFrame] = None) -> tuple:
+        """
+        曲线历史整理为按日期排序的矩阵，返回 (日期数组, 期限（年）, 收益率 (日期数, 期限数))；
+        history 为空时读取曲线缓存，缓存不存在时返回空矩阵
+        """
+        if history is None:
+            history = self._storage.read(self.history_base) if self._storage.exists(self.history_base) else None
+        if history is None or history.empty:
+            return np.array([], dtype=object), np.zeros(0), np.zeros((0, 0))
+        
+        tenor_cols = [c for c in history.columns if self.tenor_years(c) is not None]
+        tenor_cols.sort(key=self.tenor_years)
+        history = history.assign(日期=pd.to_datetime(history['日期']).dt.strftime('%Y-%m-%d'))
+        history = history.drop_duplicates(subset=['日期'], keep='last').sort_values('日期')
+        yields = history[tenor_cols].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        return (history['日期'].to_numpy(dtype=object), np.array([self.tenor_years(c) for c in tenor_cols]),
+                yields)
+    
+    def _fit_sequence(self, dates: List[str], tenors: np.ndarray, yields: np.ndarray,
+                      params: pd.DataFrame) -> pd.DataFrame:
+        """
+        按日期顺序逐日拟合：以前一交易日接受的参数热启动（序列首日或更早的缺口取已存参数中最近的一组），
+        无可用初值、拟合失败或误差超过 CURVE_WARM_START_MAX_RMSE_BP 时改用网格初值重拟合
+        """
+        known = params.dropna(subset=NSSCurveFitter.PARAM_COLUMNS)
+        known_dates = known['日期'].tolist()
+        known_params = known[NSSCurveFitter.PARAM_COLUMNS].to_numpy(dtype=float)
+        max_rmse = self._config.CURVE_WARM_START_MAX_RMSE_BP / 100
+        
+        fitted = np.full((len(dates), 6), np.nan)
+        rmse = np.full(len(dates), np.nan)
+        iterations = np.zeros(len(dates), dtype=np.int64)
+        previous = None
+        for i, date in enumerate(dates):
+            pos = bisect.bisect_left(known_dates, date) - 1
+            if pos >= 0 and (i == 0 or known_dates[pos] > dates[i - 1]):
+                previous = known_params[pos]
+            
+            day = yields[i:i + 1]
+            if previous is not None:
+                day_fit, day_rmse, day_iter = self._fitter.fit_batch(tenors, day, previous[None, :])
+            else:
+                day_fit, day_rmse, day_iter = np.full((1, 6), np.nan), np.full(1, np.nan), np.zeros(1, dtype=np.int64)
+            
+            if not day_rmse[0] <= max_rmse:
+                grid_fit, grid_rmse, grid_iter = self._fitter.fit_batch(tenors, day)
+                day_iter = day_iter + grid_iter
+                if np.isnan(day_rmse[0]) or grid_rmse[0] < day_rmse[0]:
+                    day_fit, day_rmse = grid_fit, grid_rmse
+            
+            fitted[i], rmse[i], iterations[i] = day_fit[0], day_rmse[0], day_iter[0]
+            if not np.isnan(day_rmse[0]):
+                previous = day_fit[0]
+        
+        result = pd.DataFrame(fitted, columns=NSSCurveFitter.PARAM_COLUMNS)
+        result.insert(0, '日期', dates)
+        result['rmse'] = rmse
+        result['iterations'] = iterations
+        return result
+    
+    def params_on(self, date: Any) -> Optional[pd.Series]:
+        """返回不晚于该日期的最近一组有效参数"""
+        params = self.load_params().dropna(subset=NSSCurveFitter.PARAM_COLUMNS)
+        date_str = pd.Timestamp(date).strftime('%Y-%m-%d')
+        earlier = params[params['日期'] <= date_str]
+        return earlier.iloc[-1] if not earlier.empty else None
+    
+    def annotate(self, df: pd.DataFrame, settlement_date: str, verbose: bool = True) -> pd.DataFrame:
+        """追加曲线收益率、曲线利差（BP）与估值信号列：利差为正偏便宜，为负偏贵；verbose 控制是否打印汇总与跳过原因"""
+        if df.empty or '剩余天数' not in df.columns:
+            return df
+        
+        self.refresh()
+        row = self.params_on(settlement_date)
+        if row is None:
+            if verbose:
+                print("未找到可用的收益率曲线参数（可先运行 tools/plot_bond_yield_curve.py 获取曲线），跳过曲线利差计算。")
+            return df
+        age = (pd.Timestamp(settlement_date) - pd.Timestamp(row['日期'])).days
+        if age > self._config.CURVE_MAX_AGE_DAYS:
+            if verbose:
+                print(f"最近的曲线日期 {row['日期']} 距结算日 {age} 天，跳过曲线利差计算。")
+            return df
+        
+        tenors = pd.to_numeric(df['剩余天数'], errors='coerce').to_numpy(dtype=float) / 365
+        curve = NSSCurveFitter.evaluate(row[NSSCurveFitter.PARAM_COLUMNS].to_numpy(dtype=float), tenors)
+        traded = df['到期收益率'] if '到期收益率' in df.columns else pd.Series(np.nan, index=df.index)
+        reported = df['加权收益率'].where(df['加权收益率'].notna(), df['最新收益率'])
+        spread = (traded.fillna(reported).to_numpy(dtype=float) - curve) * 100
+        
+        threshold = self._config.RICH_CHEAP_THRESHOLD_BP
+        df = df.copy()
+        df['曲线收益率'] = curve
+        df['曲线利差'] = spread
+        df['估值信号'] = np.select([spread >= threshold, spread <= -threshold], ['偏便宜', '偏贵'], '')
+        if verbose:
+            print(f"曲线利差基于 {row['日期']} 的 NSS 曲线：偏便宜 {(spread >= threshold).sum()} 只，"
+                  f"偏贵 {(spread <= -threshold).sum()} 只（阈值 {threshold:g} BP）。")
+        return df
+
+
+# ==================== 情景分析模块 ====================
+
+_SCENARIO_FLOWS: Optional[BondCashflows] = None  # 进程池工作进程共享的现金流，由 _init_scenario_worker 设置一次
+
+
+def _init_scenario_worker(flows: BondCashflows) -> None:
+    global _SCENARIO_FLOWS
+    _SCENARIO_FLOWS = flows
+
+
+def _revalue_chunk(yields: np.ndarray) -> np.ndarray:
+    """工作进程：一组情景下的收益率矩阵 (情景数, 债券数) 重估为全价"""
+    return _SCENARIO_FLOWS.dirty_prices(yields)
+
+
+@dataclass
+class ScenarioSet:
+    """一组利率情景：各关键期限的收益率变动（BP）"""
+    names: List[str]
+    kinds: List[str]  # 平移 / 陡峭化 / 平坦化 / 历史
+    tenors: np.ndarray  # 关键期限（年）
+    shifts: np.ndarray  # (情景数, 关键期限数)，单位 BP
+    
+    def __len__(self) -> int:
+        return len(self.names)
+    
+    def bond_shifts(self, bond_tenors: np.ndarray) -> np.ndarray:
+        """按债券剩余期限在关键期限间线性插值（两端水平外推），返回 (情景数, 债券数)，单位 BP"""
+        weights = np.vstack([np.interp(bond_tenors, self.tenors, unit) for unit in np.eye(len(self.tenors))])
+        return self.shifts @ weights
+
+
+class ScenarioEngine:
+    """
+    情景与压力重估引擎 - 在平行移动、陡峭化/平坦化及历史日间曲线变动下重估分析结果中的债券
+    现金流只生成一次，情景按块分发到进程池（工作进程启动时接收一次现金流），每块内对全部情景与债券整体矩阵运算
+    """
+    
+    KEY_TENORS = np.array([0.25, 0.5, 1.0, 3.0, 5.0, 7.0, 10.0, 30.0])  # 无曲线历史时平移与扭曲使用的关键期限
+    TWIST_RANGE = (1.0, 10.0)  # 扭曲情景的短端与长端锚点（年），其间线性变化，两侧水平
+    
+    def __init__(self, config: Config, pricer: BondPricer, curve_engine: Optional[YieldCurveEngine] = None):
+        self._config = config
+        self._pricer = pricer
+        self._curve_engine = curve_engine
+    
+    def build_scenarios(self) -> ScenarioSet:
+        """按配置生成平移、扭曲情景，并加入曲线缓存中的历史日间变动"""
+        names, kinds, rows = [], [], []
+        dates, tenors, yields = (self._curve_engine.history_matrix() if self._curve_engine is not None
+                                 else (np.array([], dtype=object), np.zeros(0), np.zeros((0, 0))))
+        key_tenors = tenors if len(tenors) >= 2 else self.KEY_TENORS
+        
+        for bp in self._config.SCENARIO_PARALLEL_SHIFTS_BP:
+            names.append(f"平移{bp:+g}BP")
+            kinds.append('平移')
+            rows.append(np.full(len(key_tenors), float(bp)))
+        
+        short, long = self.TWIST_RANGE
+        position = (np.clip(key_tenors, short, long) - short) / (long - short) - 0.5
+        for bp in self._config.SCENARIO_TWIST_BP:
+            kind = '陡峭化' if bp > 0 else '平坦化'
+            names.append(f"{kind}{abs(bp):g}BP")
+            kinds.append(kind)
+            rows.append(position * bp)
+        
+        if len(dates) >= 2:
+            moves = self._historical_moves(tenors, yields)
+            keep = ~np.isnan(moves).any(axis=1)
+            limit = self._config.SCENARIO_HISTORY_DAYS
+            dates, moves = dates[1:][keep], moves[keep]
+            if limit is not None:
+                dates, moves = dates[-limit:], moves[-limit:]
+            names.extend(f"历史{d}" for d in dates)
+            kinds.extend(['历史'] * len(dates))
+            rows.extend(moves)
+        
+        shifts = np.vstack(rows) if rows else np.zeros((0, len(key_tenors)))
+        return ScenarioSet(names, kinds, key_tenors, shifts)
+    
+    @staticmethod
+    def _historical_moves(tenors: np.ndarray, yields: np.ndarray) -> np.ndarray:
+        """相邻交易日的曲线变动（BP）；个别期限缺失时先按期限在同日有效点间插值补齐"""
+        filled = pd.DataFrame(yields, columns=tenors).interpolate(method='index', axis=1, limit_direction='both')
+        return np.diff(filled.to_numpy(dtype=float), axis=0) * 100
+    
+    def revalue(self, df: pd.DataFrame, settlement_date: Any, scenarios: Optional[ScenarioSet] = None) -> tuple:
+        """
+        重估分析结果中已求出到期收益率的债券，返回 (情景汇总, 债券汇总, 全价涨跌幅矩阵 %)
+        涨跌幅矩阵形状为 (情景数, 债券数)，行列顺序与两张汇总表一致
+        """
+        scenarios = scenarios if scenarios is not None else self.build_scenarios()
+        empty = (pd.DataFrame(), pd.DataFrame(), np.zeros((0, 0)))
+        if df.empty or '到期收益率' not in df.columns or not len(scenarios):
+            return empty
+        
+        base_yield = pd.to_numeric(df['到期收益率'], errors='coerce').to_numpy(dtype=float) / 100
+        flows = self._pricer.prepare(df['票面利率'], df['付息频率'], df['到期日'], settlement_date,
+                                     valid=~np.isnan(base_yield))
+        if not len(flows.index):
+            return empty
+        
+        bonds = df.iloc[flows.index]
+        y0 = base_yield[flows.index]
+        base_price = flows.dirty_prices(y0)
+        bond_tenors = pd.to_numeric(bonds['剩余天数'], errors='coerce').to_numpy(dtype=float) / 365
+        yields = y0 + scenarios.bond_shifts(bond_tenors) / 1e4
+        
+        start = time.perf_counter()
+        prices = self._revalue_all(flows, yields)
+        changes = (prices / base_price - 1) * 100
+        print(f"情景重估：{len(scenarios)} 个情景 × {len(flows.index)} 只债券，耗时 {time.perf_counter() - start:.2f} 秒。")
+        return self._scenario_summary(scenarios, changes, bonds), self._bond_summary(scenarios, changes, bonds), changes
+    
+    def _revalue_all(self, flows: BondCashflows, yields: np.ndarray) -> np.ndarray:
+        """按块重估全部情景：工作量较小或只配置一个进程时直接在当前进程计算"""
+        per_scenario = max(flows.cashflows.size, 1)
+        chunk = max(1, self._config.SCENARIO_CHUNK_ELEMENTS // per_scenario)
+        blocks = [yields[i:i + chunk] for i in range(0, len(yields), chunk)]
+        workers = min(self._config.SCENARIO_WORKERS or os.cpu_count() or 1, len(blocks))
+        
+        if workers > 1:
+            try:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_scenario_worker,
+                                         initargs=(flows,)) as pool:
+                    return np.vstack(list(pool.map(_revalue_chunk, blocks)))
+            except (OSError, BrokenProcessPool) as e:
+                print(f"进程池不可用（{e}），改为单进程重估。")
+        return np.vstack([flows.dirty_prices(block) for block in blocks])
+    
+    @staticmethod
+    def _scenario_summary(scenarios: ScenarioSet, changes: np.ndarray, bonds: pd.DataFrame) -> pd.DataFrame:
+        """每个情景一行：全部债券的平均、最大跌幅与最大涨幅（全价涨跌幅 %）"""
+        names = bonds['债券简称'].to_numpy(dtype=object)
+        return pd.DataFrame({
+            '情景': scenarios.names,
+            '类型': scenarios.kinds,
+            '平均涨跌幅(%)': changes.mean(axis=1),
+            '最大跌幅(%)': changes.min(axis=1),
+            '最大跌幅债券': names[changes.argmin(axis=1)],
+            '最大涨幅(%)': changes.max(axis=1),
+        })
+    
+    @staticmethod
+    def _bond_summary(scenarios: ScenarioSet, changes: np.ndarray, bonds: pd.DataFrame) -> pd.DataFrame:
+        """每只债券一行：各平移与扭曲情景下的涨跌幅，以及历史情景的 VaR（损失为正）与最差日期"""
+        summary = bonds[['债券简称', '剩余期限_格式化', '到期收益率', '修正久期']].reset_index(drop=True)
+        kinds = np.array(scenarios.kinds)
+        for i in np.flatnonzero(kinds != '历史'):
+            summary[f"{scenarios.names[i]}(%)"] = changes[i]
+        
+        historical = np.flatnonzero(kinds == '历史')
+        if len(historical):
+            hist = changes[historical]
+            summary['历史VaR95(%)'] = -np.percentile(hist, 5, axis=0)
+            summary['历史VaR99(%)'] = -np.percentile(hist, 1, axis=0)
+            summary['历史最大跌幅(%)'] = hist.min(axis=0)
+            summary['历史最差情景'] = np.array(scenarios.names, dtype=object)[historical[hist.argmin(axis=0)]]
+        return summary
+
+
+# ==================== 持有期收益模块 ====================
+
+class HoldingPeriodSimulator:
+    """
+    持有期收益模拟 - 对每只债券在一组持有天数与退出收益率假设下一次性计算提前卖出（或持有到期）的收益
+    买入价为结算日全价；持有期内收到的票息（及到期本金）按再投资收益率年复利滚存至退出日；
+    退出日全价按 到期收益率 + 变动 贴现剩余现金流（Act/Act 期数，最后一个付息周期按单利）；
+    利息收入（票息 + 退出时应计利息 - 买入时应计利息）按 calculate_after_tax_yield 的规则计税，价差不计税；
+    年化收益率按年复利折算，与到期收益率口径一致
+    """
+    
+    def __init__(self, config: Config, pricer: BondPricer):
+        self._config = config
+        self._pricer = pricer
     
-    def batch_fetch_metadata(self, symbols: List[str], cache: Dict, 
-                            normalized_cache: Dict, settlement_dt_str: str,
-                            cache_manager: CacheManager) -> int:
-        """批量获取元数据"""
-        if not symbols:
-            return 0
+    def simulate(self, df: pd.DataFrame, settlement_date: Any, horizons: Optional[List[int]] = None,
+                 shifts_bp: Optional[List[float]] = None) -> pd.DataFrame:
+        """返回长表：每只债券 × 持有天数 × 退出收益率变动 一行"""
+        horizons = np.asarray(horizons if horizons is not None else self._config.HOLDING_HORIZONS_DAYS, dtype=np.int64)
+        shifts = np.asarray(shifts_bp if shifts_bp is not None else self._config.HOLDING_EXIT_SHIFTS_BP, dtype=float)
+        if df.empty or '到期收益率' not in df.columns:
+            return pd.DataFrame()
         
-        session = self._create_session()
-        success_count = 0
+        base_yield = pd.to_numeric(df['到期收益率'], errors='coerce').to_numpy(dtype=float) / 100
+        flows = self._pricer.prepare(df['票面利率'], df['付息频率'], df['到期日'], settlement_date,
+                                     valid=~np.isnan(base_yield))
+        if not len(flows.index):
+            return pd.DataFrame()
         
-        with ThreadPoolExecutor(max_workers=self._config.CONCURRENT_THREADS) as executor:
-            future_to_symbol = {
-                executor.submit(self.fetch_metadata, s, session): s 
-                for s in symbols
-            }
-            
-            for future in tqdm(as_completed(future_to_symbol), total=len(symbols), desc="抓取进度"):
-                symbol = future_to_symbol[future]
-                try:
-                    data = future.result()
-                    if data:
-                        cache[symbol] = data
-                        normalized_cache[symbol.replace(" ", "")] = data
-                        success_count += 1
-                    
-                    if success_count % self._config.SAVE_INTERVAL == 0:
-                        cache_manager.save_metadata_cache(cache, settlement_dt_str)
-                except:
-                    pass
+        bonds = df.iloc[flows.index]
+        y0 = base_yield[flows.index]
+        settlement = np.datetime64(pd.Timestamp(settlement_date).normalize().date(), 'D')
+        maturity = pd.to_datetime(bonds['到期日'], format='%Y-%m-%d').to_numpy().astype('datetime64[D]')
         
-        cache_manager.save_metadata_cache(cache, settlement_dt_str)
-        return success_count
+        # 付息日矩阵 (债券数, 最大期数)：第 c 列为结算日后第 c+1 次付息，prev 为结算日前最近一次付息
+        n_cols = flows.cashflows.shape[1]
+        col = np.arange(n_cols)
+        schedule, prev_date, _ = BondCalculator.coupon_schedule_matrix(settlement, maturity, flows.frequency)
+        pay_days = (schedule - settlement).astype(float)
+        prev_days = (prev_date - settlement).astype(float)
+        scheduled = col[None, :] < flows.periods[:, None]
+        
+        # 持有期内现金流：(持有天数, 债券数, 期数)
+        h = horizons.astype(float)[:, None, None]
+        paid = scheduled[None] & (pay_days[None] <= h)
+        reinvest = (np.full(len(y0), self._config.HOLDING_REINVEST_RATE / 100)
+                    if self._config.HOLDING_REINVEST_RATE is not None else y0)
+        growth = (1 + reinvest[None, :, None]) ** ((h - pay_days[None]) / 365)
+        carried = np.where(paid, flows.cashflows[None] * growth, 0.0).sum(axis=2)
+        coupons = paid.sum(axis=2) * flows.coupon[None, :]
+        
+        # 退出时所处付息期与 Act/Act 剩余期数
+        k = paid.sum(axis=2)
+        matured = k >= flows.periods[None, :]
+        rows = np.arange(len(y0))[None, :]
+        next_pay = pay_days[rows, np.minimum(k, n_cols - 1)]
+        last_pay = np.where(k > 0, pay_days[rows, np.maximum(k - 1, 0)], prev_days[None, :])
+        period_len = np.where(matured, 1.0, next_pay - last_pay)  # 已到期的组合不再定价
+        fraction = (next_pay - horizons[:, None]) / period_len
+        exponents = fraction[..., None] + (col[None, None, :] - k[..., None])
+        accrued_exit = np.where(matured, 0.0, flows.coupon[None, :] * (horizons[:, None] - last_pay) / period_len)
+        
+        # 退出全价：(变动数, 持有天数, 债券数)
+        remaining = np.where(paid, 0.0, flows.cashflows[None])
+        exit_yield = y0[None, None, :] + shifts[:, None, None] / 1e4
+        base = 1 + exit_yield / flows.frequency
+        with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+            compound = (remaining[None] * np.exp(-np.log(base)[..., None] * exponents[None])).sum(axis=3)
+            days_left = next_pay - horizons[:, None]
+            simple = (100 + flows.coupon)[None, None, :] / (1 + exit_yield * days_left[None] / 365)
+        last_period = (flows.periods[None, :] - k) == 1
+        exit_price = np.where(matured[None], 0.0, np.where(last_period[None], simple, compound))
+        
+        entry = flows.dirty_prices(y0)
+        value = carried[None] + exit_price
+        interest = coupons + accrued_exit - flows.accrued[None, :]
+        tax = np.where(BondCalculator.tax_exempt_array(bonds['债券类型']), 0.0, 0.2)[None, :] * np.maximum(interest, 0)
+        hpr = value / entry - 1
+        hpr_after_tax = (value - tax[None]) / entry - 1
+        years = horizons[None, :, None] / 365
+        
+        n_shift, n_horizon, n_bond = hpr.shape
+        # 行序：债券 -> 持有天数 -> 退出收益率变动
+        order = lambda a: np.transpose(np.broadcast_to(a, hpr.shape), (2, 1, 0)).ravel()
+        take = lambda values: np.repeat(np.asarray(values), n_horizon * n_shift)
+        return pd.DataFrame({
+            '债券简称': take(bonds['债券简称'].to_numpy(dtype=object)),
+            '债券类型': take(bonds['债券类型'].to_numpy(dtype=object)),
+            '剩余天数': take(bonds['剩余天数'].to_numpy()),
+            '到期收益率': take(y0 * 100),
+            '持有天数': order(horizons[None, :, None]),
+            '退出收益率变动(BP)': order(shifts[:, None, None]),
+            '持有到期': order(matured[None]),
+            '退出全价': order(np.where(matured[None], np.nan, exit_price)),
+            '持有期收益率(%)': order(hpr * 100),
+            '年化收益率(%)': order(((1 + hpr) ** (1 / years) - 1) * 100),
+            '税后年化收益率(%)': order(((1 + hpr_after_tax) ** (1 / years) - 1) * 100),
+        })
+    
+    @staticmethod
+    def best(table: pd.DataFrame, horizon_days: int, shift_bp: float = 0, top_n: int = 10,
+             column: str = '税后年化收益率(%)') -> pd.DataFrame:
+        """在 simulate 的结果中查找指定持有天数与退出收益率变动下收益最高的债券"""
+        if table.empty:
+            return table
+        hit = table[(table['持有天数'] == horizon_days) & (table['退出收益率变动(BP)'] == shift_bp)]
+        return hit.nlargest(top_n, column)
+    
+    @staticmethod
+    def pivot(table: pd.DataFrame, shift_bp: float = 0, column: str = '税后年化收益率(%)') -> pd.DataFrame:
+        """债券 × 持有天数 的收益矩阵"""
+        if table.empty:
+            return table
+        hit = table[table['退出收益率变动(BP)'] == shift_bp]
+        return hit.pivot_table(index='债券简称', columns='持有天数', values=column, sort=False)
 
 
-# ==================== 债券计算模块 ====================
+# ==================== Excel报表模块 ====================
 
-class BondCalculator:
-    """债券计算器 - 负责所有债券相关计算"""
+def column_letter(index: int) -> str:
+    """列序号（从 1 开始）转为 Excel 列字母：1 -> A，27 -> AA"""
+    letters = ''
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+@dataclass(frozen=True)
+class CellStyle:
+    """单元格命名样式，颜色为 RRGGBB"""
+    bold: bool = False
+    font_color: Optional[str] = None
+    font_size: float = 11
+    fill: Optional[str] = None
+    border: bool = False  # 四边细线
+    horizontal: Optional[str] = None
+    vertical: Optional[str] = None
+    wrap: bool = False
+
+
+class StreamingSheet:
+    """
+    只写工作表 - 按行追加，行 XML 直接写入压缩流，内存占用与行数无关
+    合并区域与自动筛选在关闭时写入 sheetData 之后
+    """
     
-    @staticmethod
-    def calculate_remaining_days(maturity_date: Any, settlement_date: Any = None) -> Optional[int]:
-        """计算债券剩余天数"""
-        try:
-            settlement_dt = (datetime.now() if settlement_date is None 
-                           else datetime.strptime(settlement_date, '%Y-%m-%d') 
-                           if isinstance(settlement_date, str) else settlement_date)
-            
-            if hasattr(settlement_dt, 'replace'):
-                settlement_dt = settlement_dt.replace(hour=0, minute=0, second=0, microsecond=0)
-            
-            if not maturity_date or maturity_date == '---':
-                return None
-            
-            maturity_dt = (datetime.strptime(maturity_date, '%Y-%m-%d') 
-                         if isinstance(maturity_date, str) else maturity_date)
-            
-            if hasattr(maturity_dt, 'replace'):
-                maturity_dt = maturity_dt.replace(hour=0, minute=0, second=0, microsecond=0)
-            
-            days = (maturity_dt - settlement_dt).days
-            return max(0, days) if days > 0 else 0
-        except:
-            return None
+    def __init__(self, stream, style_ids: Dict[str, int], column_widths: Optional[List[float]],
+                 row_height: Optional[float], freeze_header: bool):
+        self._stream = stream
+        self._style_ids = style_ids
+        self._row_attr = f' ht="{row_height:g}" customHeight="1"' if row_height else ''
+        self._merges: List[str] = []
+        self._auto_filter: Optional[str] = None
+        self.row_count = 0
+        
+        parts = ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                 f'<worksheet xmlns="{StreamingXlsxWriter.MAIN_NS}" xmlns:r="{StreamingXlsxWriter.REL_NS}">']
+        if freeze_header:
+            parts.append('<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" '
+                         'activePane="bottomLeft" state="frozen"/></sheetView></sheetViews>')
+        parts.append('<sheetFormatPr defaultRowHeight="15"/>')
+        if column_widths:
+            parts.append('<cols>' + ''.join(f'<col min="{i}" max="{i}" width="{w:g}" customWidth="1"/>'
+                                             for i, w in enumerate(column_widths, 1)) + '</cols>')
+        parts.append('<sheetData>')
+        self._write(''.join(parts))
     
-    @staticmethod
-    def format_tenor(days: Optional[int]) -> str:
-        """格式化剩余期限显示"""
-        if days is None or days <= 0:
-            return ""
+    def _write(self, text: str) -> None:
+        self._stream.write(text.encode('utf-8'))
+    
+    def append(self, values: List[Any], styles: Any = None, start_col: int = 1) -> int:
+        """追加一行，styles 为单个样式名或与 values 等长的样式名列表；返回行号"""
+        self.row_count += 1
+        row = self.row_count
+        if not isinstance(styles, (list, tuple)):
+            styles = [styles] * len(values)
+        cells = [self._cell(f"{column_letter(start_col + i)}{row}", value, self._style_ids.get(style, 0))
+                 for i, (value, style) in enumerate(zip(values, styles))]
+        self._write(f'<row r="{row}"{self._row_attr}>{"".join(cells)}</row>')
+        return row
+    
+    def append_frame(self, df: pd.DataFrame, styles: Any = None, chunk_rows: int = 5000) -> None:
+        """
+        按块批量写入 DataFrame 的全部行：每块内按列生成单元格 XML 再按行拼接，缺失值写为空单元格
+        """
+        if not isinstance(styles, (list, tuple)):
+            styles = [styles] * df.shape[1]
+        letters = [column_letter(i + 1) for i in range(df.shape[1])]
+        style_ids = [self._style_ids.get(style, 0) for style in styles]
         
-        years_part = days // 365
-        days_part = days % 365
+        for start in range(0, len(df), chunk_rows):
+            chunk = df.iloc[start:start + chunk_rows]
+            rows = [str(self.row_count + 1 + i) for i in range(len(chunk))]
+            columns = [self._column_cells(chunk.iloc[:, j], letters[j], rows, style_ids[j])
+                       for j in range(chunk.shape[1])]
+            self._write(''.join(f'<row r="{r}"{self._row_attr}>{"".join(cells)}</row>'
+                                for r, *cells in zip(rows, *columns)))
+            self.row_count += len(chunk)
+    
+    def merge(self, first_row: int, first_col: int, last_row: int, last_col: int) -> None:
+        self._merges.append(f"{column_letter(first_col)}{first_row}:{column_letter(last_col)}{last_row}")
+    
+    def auto_filter(self, first_row: int, last_col: int) -> None:
+        """为表头行到当前末行设置自动筛选"""
+        self._auto_filter = f"A{first_row}:{column_letter(last_col)}{max(self.row_count, first_row)}"
+    
+    def close(self) -> None:
+        parts = ['</sheetData>']
+        if self._auto_filter:
+            parts.append(f'<autoFilter ref="{self._auto_filter}"/>')
+        if self._merges:
+            parts.append(f'<mergeCells count="{len(self._merges)}">'
+                         + ''.join(f'<mergeCell ref="{ref}"/>' for ref in self._merges) + '</mergeCells>')
+        parts.append('</worksheet>')
+        self._write(''.join(parts))
+        self._stream.close()
+    
+    @classmethod
+    def _column_cells(cls, column: pd.Series, letter: str, rows: List[str], style_id: int) -> List[str]:
+        """
+        一列单元格的 XML：数值列直接格式化，其余列先去重、每个取值只生成一次 XML 片段
+        """
+        style = f' s="{style_id}"' if style_id else ''
+        empty = f'{style}/>' if style_id else None
         
-        if years_part > 0:
-            return f"{years_part}年{days_part}天" if days_part > 0 else f"{years_part}年"
-        return f"{days_part}天"
+        if pd.api.types.is_numeric_dtype(column.dtype) and not pd.api.types.is_bool_dtype(column.dtype):
+            finite = np.isfinite(column.to_numpy(dtype=float, na_value=np.nan))
+            values = column.to_numpy() if pd.api.types.is_integer_dtype(column.dtype) else column.to_numpy(dtype=float)
+            return [f'<c r="{letter}{r}"{style}><v>{v!r}</v></c>' if ok
+                    else (f'<c r="{letter}{r}"{empty}' if empty else '')
+                    for r, v, ok in zip(rows, values.tolist(), finite.tolist())]
+        
+        codes, uniques = pd.factorize(column)
+        bodies = [cls._cell_body(v) for v in uniques.tolist()]
+        bodies = [f'{style}{body}' if body else empty for body in bodies] + [empty]  # 末位对应缺失值（代码 -1）
+        return [f'<c r="{letter}{r}"{bodies[code]}' if bodies[code] else ''
+                for r, code in zip(rows, codes.tolist())]
+    
+    @classmethod
+    def _cell(cls, ref: str, value: Any, style_id: int) -> str:
+        style = f' s="{style_id}"' if style_id else ''
+        body = cls._cell_body(value)
+        if body is None:
+            return f'<c r="{ref}"{style}/>' if style_id else ''
+        return f'<c r="{ref}"{style}{body}'
     
     @staticmethod
-    def calculate_after_tax_yield(yield_val: Optional[float], bond_type: str) -> Optional[float]:
-        """计算税后收益率"""
-        if yield_val is None or pd.isna(yield_val):
+    def _cell_body(value: Any) -> Optional[str]:
+        """单元格引用与样式之后的 XML 片段，缺失值返回 None"""
+        if value is None or value is pd.NA or value is pd.NaT:
             return None
-        
-        is_tax_exempt = (bond_type == '国债' or '地方政府债' in bond_type)
-        return yield_val if is_tax_exempt else yield_val * 0.8
+        if isinstance(value, (bool, np.bool_)):
+            return f' t="b"><v>{int(value)}</v></c>'
+        # NumPy 标量先转为 Python 数值，repr 才是纯数字
+        if isinstance(value, (int, np.integer)):
+            return f'><v>{int(value)}</v></c>'
+        if isinstance(value, (float, np.floating)):
+            value = float(value)
+            return f'><v>{value!r}</v></c>' if np.isfinite(value) else None
+        text = escape(str(value))
+        space = ' xml:space="preserve"' if text != text.strip() or '\n' in text else ''
+        return f' t="inlineStr"><is><t{space}>{text}</t></is></c>'
+
+
+class StreamingXlsxWriter:
+    """
+    流式 xlsx 写入器 - 工作表逐行写入 zip 条目，字符串内联存储（无需共享字符串表），样式以命名样式共享
+    """
     
-    @staticmethod
-    def day_count_fraction(date1: datetime, date2: datetime, convention: str = 'Act/365') -> float:
-        """计算天数分数"""
-        days = (date2 - date1).days
+    MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+    REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+    PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+    
+    def __init__(self, path: str, styles: Optional[Dict[str, CellStyle]] = None):
+        self._zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED, compresslevel=1)
+        self._styles = dict(styles or {})
+        self._style_ids = {name: i + 1 for i, name in enumerate(self._styles)}  # 0 为默认样式
+        self._sheet_names: List[str] = []
+        self._open_sheet: Optional[StreamingSheet] = None
+    
+    def __enter__(self) -> 'StreamingXlsxWriter':
+        return self
+    
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+    
+    def sheet(self, name: str, column_widths: Optional[List[float]] = None, row_height: Optional[float] = None,
+              freeze_header: bool = False) -> StreamingSheet:
+        """新建工作表（上一张工作表随之关闭），同一时间只有一张工作表处于写入状态"""
+        self._close_sheet()
+        self._sheet_names.append(name[:31])
+        stream = self._zip.open(f"xl/worksheets/sheet{len(self._sheet_names)}.xml", 'w', force_zip64=True)
+        self._open_sheet = StreamingSheet(stream, self._style_ids, column_widths, row_height, freeze_header)
+        return self._open_sheet
+    
+    def _close_sheet(self) -> None:
+        if self._open_sheet is not None:
+            self._open_sheet.close()
+            self._open_sheet = None
+    
+    def close(self) -> None:
+        if self._zip.fp is None:
+            return
+        self._close_sheet()
+        if not self._sheet_names:
+            self.sheet("Sheet1")
+            self._close_sheet()
         
-        if convention == 'Act/Act':
-            year1, year2 = date1.year, date2.year
-            if year1 == year2:
-                days_in_year = 366 if (year1 % 4 == 0 and (year1 % 100 != 0 or year1 % 400 == 0)) else 365
-                return days / days_in_year
-            return days / 365.25
-        elif convention == '30/360':
-            d1, d2 = min(30, date1.day), date2.day
-            if d1 == 30 and d2 == 31:
-                d2 = 30
-            return (360 * (date2.year - date1.year) + 30 * (date2.month - date1.month) + (d2 - d1)) / 360
-        return days / 365
+        n = len(self._sheet_names)
+        header = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        sheet_ct = "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"
+        self._zip.writestr('[Content_Types].xml', header + (
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/styles.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            + ''.join(f'<Override PartName="/xl/worksheets/sheet{i}.xml" ContentType="{sheet_ct}"/>'
+                      for i in range(1, n + 1)) + '</Types>'))
+        self._zip.writestr('_rels/.rels', header + (
+            f'<Relationships xmlns="{self.PKG_REL_NS}"><Relationship Id="rId1" '
+            f'Type="{self.REL_NS}/officeDocument" Target="xl/workbook.xml"/></Relationships>'))
+        self._zip.writestr('xl/workbook.xml', header + (
+            f'<workbook xmlns="{self.MAIN_NS}" xmlns:r="{self.REL_NS}"><sheets>'
+            + ''.join(f'<sheet name="{escape(name, {chr(34): "&quot;"})}" sheetId="{i}" r:id="rId{i}"/>'
+                      for i, name in enumerate(self._sheet_names, 1)) + '</sheets></workbook>'))
+        self._zip.writestr('xl/_rels/workbook.xml.rels', header + (
+            f'<Relationships xmlns="{self.PKG_REL_NS}">'
+            + ''.join(f'<Relationship Id="rId{i}" Type="{self.REL_NS}/worksheet" Target="worksheets/sheet{i}.xml"/>'
+                      for i in range(1, n + 1))
+            + f'<Relationship Id="rId{n + 1}" Type="{self.REL_NS}/styles" Target="styles.xml"/></Relationships>'))
+        self._zip.writestr('xl/styles.xml', header + self._styles_xml())
+        self._zip.close()
     
-    @staticmethod
-    def get_coupon_dates(settlement_date: datetime, maturity_date: datetime, frequency_str: str) -> tuple:
-        """生成付息日列表"""
-        freq_map = {'年': 1, '半年': 2, '季': 4, '按年付息': 1, '半年付息': 2, '按季付息': 4}
-        m = freq_map.get(frequency_str, 1)
-        months_step = 12 // m
+    def _styles_xml(self) -> str:
+        """字体、填充、边框去重后生成 styles.xml，每个命名样式对应一条 cellStyleXfs 与 cellXfs"""
+        fonts = ['<font><sz val="11"/><name val="Calibri"/><family val="2"/></font>']
+        fills = ['<fill><patternFill patternType="none"/></fill>', '<fill><patternFill patternType="gray125"/></fill>']
+        borders = ['<border><left/><right/><top/><bottom/><diagonal/></border>']
         
-        coupon_dates = []
-        current_date = maturity_date
+        def index_of(items: List[str], xml: str) -> int:
+            if xml not in items:
+                items.append(xml)
+            return items.index(xml)
         
-        while current_date > settlement_date:
-            coupon_dates.append(current_date)
-            current_date = current_date - pd.DateOffset(months=months_step)
+        style_xfs, cell_xfs, cell_styles = [], [], []
+        for i, (name, style) in enumerate(self._styles.items(), 1):
+            font_id = index_of(fonts, '<font>' + ('<b/>' if style.bold else '') + f'<sz val="{style.font_size:g}"/>'
+                               + (f'<color rgb="00{style.font_color}"/>' if style.font_color else '')
+                               + '<name val="Calibri"/><family val="2"/></font>')
+            fill_id = (index_of(fills, f'<fill><patternFill patternType="solid"><fgColor rgb="00{style.fill}"/>'
+                                       f'<bgColor rgb="00{style.fill}"/></patternFill></fill>') if style.fill else 0)
+            side = '<color auto="1"/>'
+            border_id = (index_of(borders, f'<border><left style="thin">{side}</left><right style="thin">{side}</right>'
+                                           f'<top style="thin">{side}</top><bottom style="thin">{side}</bottom>'
+                                           '<diagonal/></border>') if style.border else 0)
+            alignment = ''.join([f' horizontal="{style.horizontal}"' if style.horizontal else '',
+                                 f' vertical="{style.vertical}"' if style.vertical else '',
+                                 ' wrapText="1"' if style.wrap else ''])
+            align_xml = f'<alignment{alignment}/>' if alignment else ''
+            ids = f'numFmtId="0" fontId="{font_id}" fillId="{fill_id}" borderId="{border_id}"'
+            applied = ' applyFont="1" applyFill="1" applyBorder="1" applyAlignment="1"'
+            style_xfs.append(f'<xf {ids}{applied}>{align_xml}</xf>')
+            cell_xfs.append(f'<xf {ids} xfId="{i}"{applied}>{align_xml}</xf>')
+            cell_styles.append(f'<cellStyle name="{escape(name)}" xfId="{i}"/>')
         
-        coupon_dates.sort()
-        return coupon_dates, current_date
+        default_xf = '<xf numFmtId="0" fontId="0" fillId="0" borderId="0"/>'
+        return (f'<styleSheet xmlns="{self.MAIN_NS}">'
+                f'<fonts count="{len(fonts)}">{"".join(fonts)}</fonts>'
+                f'<fills count="{len(fills)}">{"".join(fills)}</fills>'
+                f'<borders count="{len(borders)}">{"".join(borders)}</borders>'
+                f'<cellStyleXfs count="{len(style_xfs) + 1}">{default_xf}{"".join(style_xfs)}</cellStyleXfs>'
+                f'<cellXfs count="{len(cell_xfs) + 1}"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+                f'{"".join(cell_xfs)}</cellXfs>'
+                f'<cellStyles count="{len(cell_styles) + 1}"><cellStyle name="Normal" xfId="0" builtinId="0"/>'
+                f'{"".join(cell_styles)}</cellStyles></styleSheet>')
 
 
-# ==================== Excel报表模块 ====================
+class BucketRanker:
+    """
+    期限分组排名 - 全体债券按剩余天数只排序一次，每个分组即排序后的一段下标区间
+    各分组边界把排序结果切成互不重叠的基本段，段内最高收益率一次 reduceat 求出、候选按成交量预排；
+    分组只合并其覆盖的基本段，细分组再多也几乎不增加开销
+    """
+    
+    def __init__(self, buckets: List[tuple], yield_cutoff: float, top_n: int):
+        self._buckets = list(buckets)
+        self._yield_cutoff = yield_cutoff
+        self._top_n = top_n
+    
+    def rank(self, df: pd.DataFrame) -> List[tuple]:
+        """
+        返回 [(标题, 入选债券)]：收益率不低于组内最高值的 yield_cutoff，按成交量取前 top_n（同量按原顺序）；
+        组内收益率全为空时返回组内全部债券，无成交量列时返回全部达标债券
+        """
+        days = pd.to_numeric(df['剩余天数'], errors='coerce').to_numpy(dtype=float)
+        order = np.flatnonzero(~np.isnan(days))
+        order = order[np.argsort(days[order], kind='stable')]
+        sorted_days = days[order]
+        yields = pd.to_numeric(df['税后年收益率'], errors='coerce').to_numpy(dtype=float)[order]
+        has_volume = '交易量' in df.columns
+        volume = pd.to_numeric(df['交易量'], errors='coerce').to_numpy(dtype=float)[order] if has_volume else None
+        
+        # 分组 -> 排序后的下标区间 [lo, hi)；全部区间端点切出基本段
+        lows = np.searchsorted(sorted_days, [b[1] for b in self._buckets], 'left')
+        highs = np.searchsorted(sorted_days, [b[2] for b in self._buckets], 'right')
+        cuts = np.unique(np.concatenate([[0, len(order)], lows, highs]))
+        segment_max = np.fmax.reduceat(yields, cuts[:-1]) if len(order) else np.zeros(0)
+        
+        # 每段的候选按 (段, 成交量降序, 原顺序) 排好，分组内取各段前 top_n 合并即可
+        if has_volume:
+            segment = np.searchsorted(cuts, np.arange(len(order)), 'right') - 1
+            candidates = np.flatnonzero(~np.isnan(volume) & ~np.isnan(yields))
+            candidates = candidates[np.lexsort((order[candidates], -volume[candidates], segment[candidates]))]
+            bounds = np.searchsorted(segment[candidates], np.arange(len(cuts)), 'left')
+        
+        results = []
+        for (title, _, _), lo, hi in zip(self._buckets, lows, highs):
+            first, last = np.searchsorted(cuts, [lo, hi])
+            if hi <= lo or np.isnan(segment_max[first:last]).all():
+                results.append((title, df.iloc[np.sort(order[lo:max(lo, hi)])]))
+                continue
+            
+            threshold = np.nanmax(segment_max[first:last]) * self._yield_cutoff
+            if has_volume:
+                picked = np.concatenate([
+                    rows[yields[rows] >= threshold][:self._top_n]
+                    for rows in (candidates[bounds[seg]:bounds[seg + 1]] for seg in range(first, last))
+                ])
+                picked = order[picked[np.lexsort((order[picked], -volume[picked]))][:self._top_n]]
+            else:
+                picked = np.sort(order[lo:hi][yields[lo:hi] >= threshold])
+            results.append((title, df.iloc[picked]))
+        return results
+
 
 class ExcelReporter:
-    """Excel报表生成器"""
+    """Excel报表生成器 - 通过 StreamingXlsxWriter 流式写入，主页为分期限推荐表，另附全部债券明细"""
+    
+    DISPLAY_COLS = ['债券简称', '税后年收益率', '剩余期限', '到期日', '修正久期', 'DV01']
+    COLUMN_WIDTHS = [20, 12, 15, 12, 10, 10]
+    ROW_HEIGHT = 20
+    FULL_SHEET_NAME = "全部债券"
+    
+    # 命名样式：所有单元格共享，按名称引用
+    STYLES = {
+        '标题': CellStyle(bold=True, font_color="FFFFFF", fill="366092", horizontal='center', vertical='center'),
+        '表头': CellStyle(bold=True, font_color="FFFFFF", fill="366092", border=True,
+                        horizontal='center', vertical='center'),
+        '居中': CellStyle(border=True, horizontal='center', vertical='center'),
+        '居左': CellStyle(border=True, horizontal='left', vertical='center'),
+        '收益率': CellStyle(border=True, fill="FFE699", horizontal='center', vertical='center'),
+        '提示': CellStyle(horizontal='center', vertical='center'),
+        '备注': CellStyle(font_size=10, horizontal='left', vertical='top', wrap=True),
+        '明细': CellStyle(border=True),
+    }
     
     def __init__(self, config: Config):
         self._config = config
+        self._ranker = BucketRanker(config.REPORT_BUCKETS, config.REPORT_YIELD_CUTOFF, config.REPORT_TOP_N)
     
     def generate_report(self, output_file: str, final_df: pd.DataFrame, 
                        header_mapping: Dict, cols_order: List[str]) -> None:
         """生成Excel报表"""
-        with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+        with StreamingXlsxWriter(output_file, self.STYLES) as writer:
             self._create_combined_sheet(writer, "主页", final_df, header_mapping, cols_order)
-            
-            # 移除默认的 "Sheet"
-            if "Sheet" in writer.book.sheetnames:
-                del writer.book["Sheet"]
+            self._create_full_sheet(writer, self.FULL_SHEET_NAME, final_df, header_mapping, cols_order)
+    
+    def write_tables(self, output_file: str, sheets: Dict[str, pd.DataFrame]) -> None:
+        """将若干 DataFrame 分别写为带表头的明细工作表"""
+        with StreamingXlsxWriter(output_file, self.STYLES) as writer:
+            for sheet_name, sheet_df in sheets.items():
+                self._write_frame_sheet(writer, sheet_name, sheet_df)
 
-    def _create_combined_sheet(self, writer, sheet_name: str, bonds_df: pd.DataFrame,
+    def _create_combined_sheet(self, writer: StreamingXlsxWriter, sheet_name: str, bonds_df: pd.DataFrame,
                                header_mapping: Dict, cols_order: List[str]) -> None:
-        """在同一个sheet中创建三张表格"""
-        from openpyxl.utils import get_column_letter
-        
-        ws = writer.book.create_sheet(sheet_name, 0)
-        styles = self._get_styles()
-        display_cols = ['债券简称', '税后年收益率', '剩余期限', '到期日']
+        """在同一个sheet中依次创建各期限分组的表格"""
+        ws = writer.sheet(sheet_name, self.COLUMN_WIDTHS, self.ROW_HEIGHT)
         
-        current_row = 1
-        
-        # 定义过滤配置
-        filters = [
-            ("小于6个月到期债券", 0, 180),
-            ("小于1年到期债券", 0, 365),
-            ("小于3年到期债券", 0, 1095)
-        ]
-        
-        for title, min_days, max_days in filters:
-            df = self._filter_bonds(bonds_df, min_days, max_days)
-            df = self._apply_filters(df)
-            df = self._prepare_df(df, header_mapping, cols_order)
-            current_row = self._write_bond_table(ws, current_row, 1, title, df, display_cols, styles)
+        for title, df in self._ranker.rank(bonds_df):
+            df = self.prepare_df(df, header_mapping, cols_order)
+            self._write_bond_table(ws, title, df, self.DISPLAY_COLS)
         
         # 备注
-        self._write_notes(ws, current_row, display_cols)
-        
-        # 列宽设置
-        for idx, width in enumerate([20, 12, 15, 12]):
-            ws.column_dimensions[get_column_letter(idx + 1)].width = width
-        
-        # 行高设置
-        for row in range(1, ws.max_row + 1):
-            ws.row_dimensions[row].height = 20
-        
-    def _filter_bonds(self, df: pd.DataFrame, min_days: int, max_days: int) -> pd.DataFrame:
-        """筛选债券"""
-        return df[(df['剩余天数'] >= min_days) & (df['剩余天数'] <= max_days)].copy()
+        self._write_notes(ws, self.DISPLAY_COLS)
     
-    def _apply_filters(self, df: pd.DataFrame) -> pd.DataFrame:
-        """应用收益率过滤和成交量筛选"""
-        if df.empty:
-            return df
-        
-        max_yield = df['税后年收益率'].max()
-        if max_yield is None or pd.isna(max_yield):
-            return df
-        
-        df = df[df['税后年收益率'] >= max_yield * 0.67]
-        
-        if not df.empty and '交易量' in df.columns:
-            df = df.dropna(subset=['交易量'])
-            df = df.nlargest(10, '交易量')
-        
-        return df
+    def _create_full_sheet(self, writer: StreamingXlsxWriter, sheet_name: str, bonds_df: pd.DataFrame,
+                           header_mapping: Dict, cols_order: List[str]) -> None:
+        """全部已分析债券及全部计算列，按税后收益率降序"""
+        self._write_frame_sheet(writer, sheet_name, self.prepare_df(bonds_df, header_mapping, cols_order))
     
-    def _prepare_df(self, df: pd.DataFrame, header_mapping: Dict, cols_order: List[str]) -> pd.DataFrame:
-        """准备DataFrame"""
+    def _write_frame_sheet(self, writer: StreamingXlsxWriter, sheet_name: str, df: pd.DataFrame) -> None:
+        """表头 + 批量数据行，冻结表头并加自动筛选"""
+        widths = [max(10, 2 * len(str(c)) + 2) for c in df.columns]
+        ws = writer.sheet(sheet_name, widths, freeze_header=True)
+        ws.append(list(df.columns), '表头')
+        ws.append_frame(df, '明细')
+        ws.auto_filter(1, max(df.shape[1], 1))
+    
+    @staticmethod
+    def prepare_df(df: pd.DataFrame, header_mapping: Dict, cols_order: List[str]) -> pd.DataFrame:
+        """按输出列顺序取列、按税后收益率降序并换成中文表头"""
         if df.empty:
             return df
         
@@ -513,97 +3509,340 @@ class ExcelReporter:
         df_prepared.rename(columns=header_mapping, inplace=True)
         return df_prepared
     
-    def _get_styles(self) -> Dict:
-        """获取样式定义"""
-        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+    def _write_bond_table(self, ws: StreamingSheet, title: str, bonds_df: pd.DataFrame,
+                          display_cols: List[str]) -> None:
+        """写入债券表格：标题行、表头行与数据行（每行一次批量写入，行末空一行）"""
+        width = len(display_cols)
         
-        return {
-            'header_fill': PatternFill(start_color="366092", end_color="366092", fill_type="solid"),
-            'header_font': Font(bold=True, color="FFFFFF", size=11),
-            'title_font': Font(bold=True, size=12),
-            'border': Border(
-                left=Side(style='thin'), right=Side(style='thin'),
-                top=Side(style='thin'), bottom=Side(style='thin')
-            ),
-            'center': Alignment(horizontal='center', vertical='center'),
-            'left': Alignment(horizontal='left', vertical='center'),
-            'yield_fill': PatternFill(start_color="FFE699", end_color="FFE699", fill_type="solid")
-        }
-    
-    def _write_bond_table(self, ws, start_row: int, start_col: int, title: str,
-                          bonds_df: pd.DataFrame, display_cols: List[str], 
-                          styles: Dict) -> int:
-        """写入债券表格"""
         # 标题
-        ws.merge_cells(start_row=start_row, start_column=start_col,
-                       end_row=start_row, end_column=start_col + len(display_cols) - 1)
-        cell = ws.cell(row=start_row, column=start_col)
-        cell.value = title
-        cell.font = styles['title_font']
-        cell.alignment = styles['center']
-        cell.fill = styles['header_fill']
-        cell.font = styles['header_font']
+        title_row = ws.append([title] + [None] * (width - 1), '标题')
+        ws.merge(title_row, 1, title_row, width)
         
         # 表头
-        header_row = start_row + 1
-        for idx, col_name in enumerate(display_cols):
-            cell = ws.cell(row=header_row, column=start_col + idx)
-            cell.value = col_name
-            cell.font = styles['header_font']
-            cell.fill = styles['header_fill']
-            cell.alignment = styles['center']
-            cell.border = styles['border']
+        ws.append(display_cols, '表头')
         
         # 数据
         if bonds_df.empty:
-            ws.merge_cells(start_row=header_row + 1, start_column=start_col,
-                          end_row=header_row + 1, end_column=start_col + len(display_cols) - 1)
-            cell = ws.cell(row=header_row + 1, column=start_col)
-            cell.value = "暂无符合条件的债券"
-            cell.alignment = styles['center']
-            return header_row + 2
-        
-        for row_idx in range(min(len(bonds_df), 20)):
-            excel_row = header_row + 1 + row_idx
-            for col_idx, col_name in enumerate(display_cols):
-                cell = ws.cell(row=excel_row, column=start_col + col_idx)
-                
-                if col_name in bonds_df.columns:
-                    value = bonds_df.iloc[row_idx][col_name]
-                    cell.value = self._format_cell_value(value, col_name)
-                else:
-                    cell.value = '---'
-                
-                cell.border = styles['border']
-                cell.alignment = styles['center'] if col_idx < 2 else styles['left']
-                
-                if col_name == '税后年收益率':
-                    cell.fill = styles['yield_fill']
+            row = ws.append(["暂无符合条件的债券"], '提示')
+            ws.merge(row, 1, row, width)
+            return
         
-        return header_row + min(len(bonds_df), 20) + 2
+        cell_styles = ['收益率' if c == '税后年收益率' else '居中' if i < 2 else '居左'
+                       for i, c in enumerate(display_cols)]
+        present = [c for c in display_cols if c in bonds_df.columns]
+        for record in bonds_df[present].head(20).to_dict('records'):
+            ws.append([self._format_cell_value(record[c], c) if c in record else '---' for c in display_cols],
+                      cell_styles)
+        ws.append([])
     
     def _format_cell_value(self, value, col_name: str) -> Any:
         """格式化单元格值"""
         if pd.isna(value):
             return '---'
         if isinstance(value, (int, float)):
-            if col_name in ['税后年收益率', '票面利率']:
+            if col_name in ['税后年收益率', '票面利率', '修正久期', 'DV01']:
                 return round(value, 4)
             if col_name == '成交额(亿元)' and isinstance(value, float) and value.is_integer():
                 return int(value)
             return value
         return str(value)
     
-    def _write_notes(self, ws, start_row: int, display_cols: List[str]) -> None:
+    def _write_notes(self, ws: StreamingSheet, display_cols: List[str]) -> None:
         """写入备注"""
-        from openpyxl.styles import Font, Alignment
+        note = ("备注：\n1. 优先按照投资天数需求选择，再根据税后收益率排名获得购买结果。\n"
+                "2. 所列债券日成交额均大于10亿，流动性有保证。\n3. 推荐购买6个月内的债券，属于无风险的现金等价物。")
+        start = ws.append([note], '备注')
+        ws.append([])
+        ws.append([])
+        ws.merge(start, 1, start + 2, len(display_cols))
+
+
+# ==================== 结果输出模块 ====================
+
+class ResultSink(ABC):
+    """结果输出基类 - 先写入临时文件，close 时原子替换，下游读取方不会看到写了一半的文件"""
+    
+    EXTENSION = ''
+    
+    def __init__(self, base_path: str):
+        self.path = base_path + self.EXTENSION
+        self._tmp_path = self.path + ".tmp"
+    
+    @abstractmethod
+    def open(self, source: pd.DataFrame, frame: pd.DataFrame) -> None:
+        """source 为原始分析结果，frame 为整理后的输出全表（分块写入前调用一次）"""
+    
+    def write(self, chunk: pd.DataFrame) -> None:
+        pass
+    
+    def close(self) -> None:
+        os.replace(self._tmp_path, self.path)
+    
+    def abort(self) -> None:
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+class ExcelSink(ResultSink):
+    """Excel 报表：主页需要全表分组排名，在 open 时由 ExcelReporter 整体流式写出"""
+    
+    EXTENSION = '.xlsx'
+    
+    def __init__(self, base_path: str, reporter: ExcelReporter, config: Config):
+        super().__init__(base_path)
+        self._reporter = reporter
+        self._config = config
+    
+    def open(self, source: pd.DataFrame, frame: pd.DataFrame) -> None:
+        self._reporter.generate_report(self._tmp_path, source, self._config.HEADER_MAPPING, self._config.COLS_ORDER)
+
+
+class ParquetSink(ResultSink):
+    """Parquet：按全表推断一次 schema，之后逐块写为行组"""
+    
+    EXTENSION = '.parquet'
+    
+    def open(self, source: pd.DataFrame, frame: pd.DataFrame) -> None:
+        self._schema = pa.Schema.from_pandas(frame, preserve_index=False)
+        self._writer = pq.ParquetWriter(self._tmp_path, self._schema, compression='zstd')
+    
+    def write(self, chunk: pd.DataFrame) -> None:
+        self._writer.write_table(pa.Table.from_pandas(chunk, schema=self._schema, preserve_index=False))
+    
+    def close(self) -> None:
+        self._writer.close()
+        self._writer = None
+        super().close()
+    
+    def abort(self) -> None:
+        if getattr(self, '_writer', None) is not None:
+            self._writer.close()
+        super().abort()
+
+
+class TextSink(ResultSink):
+    """UTF-8 文本输出基类"""
+    
+    def open(self, source: pd.DataFrame, frame: pd.DataFrame) -> None:
+        self._file = open(self._tmp_path, 'w', encoding='utf-8')
+    
+    def close(self) -> None:
+        self._file.close()
+        super().close()
+    
+    def abort(self) -> None:
+        if getattr(self, '_file', None) is not None:
+            self._file.close()
+        super().abort()
+
+
+class JsonLinesSink(TextSink):
+    """JSON Lines：每只债券一行 JSON，空值为 null，便于告警脚本逐行消费"""
+    
+    EXTENSION = '.jsonl'
+    
+    def write(self, chunk: pd.DataFrame) -> None:
+        if not chunk.empty:
+            self._file.write(chunk.to_json(orient='records', lines=True, force_ascii=False, date_format='iso'))
+
+
+class HtmlSink(TextSink):
+    """静态 HTML：无外部依赖的单页表格，表头固定，数值保留 4 位小数，逐块追加表格行"""
+    
+    EXTENSION = '.html'
+    PAGE_STYLE = ("body{font-family:sans-serif;margin:16px}table{border-collapse:collapse;font-size:13px}"
+                  "th,td{border:1px solid #ccc;padding:2px 6px;white-space:nowrap}"
+                  "th{background:#366092;color:#fff;position:sticky;top:0}td.n{text-align:right}")
+    
+    def __init__(self, base_path: str, title: str):
+        super().__init__(base_path)
+        self._title = escape(title)
+    
+    def open(self, source: pd.DataFrame, frame: pd.DataFrame) -> None:
+        super().open(source, frame)
+        header = "".join(f"<th>{escape(str(c))}</th>" for c in frame.columns)
+        self._file.write(f'<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>{self._title}</title>'
+                         f'<style>{self.PAGE_STYLE}</style></head><body>\n<h3>{self._title}（{len(frame)} 只）</h3>\n'
+                         f'<table><thead><tr>{header}</tr></thead><tbody>\n')
+    
+    def write(self, chunk: pd.DataFrame) -> None:
+        columns = [self._cells(chunk[c]) for c in chunk.columns]
+        self._file.write("".join(f"<tr>{''.join(row)}</tr>\n" for row in zip(*columns)))
+    
+    def close(self) -> None:
+        self._file.write("</tbody></table></body></html>\n")
+        super().close()
+    
+    @staticmethod
+    def _cells(column: pd.Series) -> np.ndarray:
+        """整列格式化为 <td>：只格式化去重后的取值再按编码取回，空值编码 -1 对应末尾的空单元格"""
+        codes, uniques = pd.factorize(column, use_na_sentinel=True)
+        if pd.api.types.is_integer_dtype(column):
+            texts = [f'<td class="n">{v}</td>' for v in uniques]
+        elif pd.api.types.is_float_dtype(column):
+            texts = [f'<td class="n">{v:.4f}</td>' for v in uniques]
+        else:
+            texts = [f"<td>{escape(str(v))}</td>" for v in uniques]
+        return np.array(texts + ["<td></td>"], dtype=object)[codes]
+
+
+class ResultWriter:
+    """结果输出 - 整理一次输出全表，按配置同时写出多种格式，非 Excel 格式按块流式写入"""
+    
+    FORMATS = ('xlsx', 'parquet', 'jsonl', 'html')
+    
+    def __init__(self, config: Config, reporter: ExcelReporter):
+        self._config = config
+        self._reporter = reporter
+        self.formats = []
+        for fmt in config.OUTPUT_FORMATS:
+            fmt = fmt.lower().lstrip('.')
+            if fmt not in self.FORMATS:
+                raise ValueError(f"不支持的输出格式: {fmt}")
+            if fmt == 'parquet' and pa is None:
+                warnings.warn("未安装 pyarrow，跳过 parquet 输出")
+                continue
+            if fmt not in self.formats:
+                self.formats.append(fmt)
+    
+    def write(self, final_df: pd.DataFrame, file_base: str, title: str = "债券分析结果") -> List[str]:
+        """写出全部已配置的格式，返回输出文件路径"""
+        sinks = [self._sink(fmt, file_base, title) for fmt in self.formats]
+        frame = ExcelReporter.prepare_df(final_df, self._config.HEADER_MAPPING, self._config.COLS_ORDER)
+        frame = frame.reset_index(drop=True)
+        try:
+            for sink in sinks:
+                sink.open(final_df, frame)
+            streaming = [sink for sink in sinks if not isinstance(sink, ExcelSink)]
+            for start in range(0, len(frame) if streaming else 0, self._config.OUTPUT_CHUNK_ROWS):
+                chunk = frame.iloc[start:start + self._config.OUTPUT_CHUNK_ROWS]
+                for sink in streaming:
+                    sink.write(chunk)
+            for sink in sinks:
+                sink.close()
+        except BaseException:
+            for sink in sinks:
+                sink.abort()
+            raise
+        return [sink.path for sink in sinks]
+    
+    def _sink(self, fmt: str, file_base: str, title: str) -> ResultSink:
+        if fmt == 'xlsx':
+            return ExcelSink(file_base, self._reporter, self._config)
+        if fmt == 'parquet':
+            return ParquetSink(file_base)
+        if fmt == 'jsonl':
+            return JsonLinesSink(file_base)
+        return HtmlSink(file_base, title)
+
+
+# ==================== 盘中监控模块 ====================
+
+class BucketTopK:
+    """单个期限分组的增量排名 - 按税后收益率与成交量维护两条有序索引，增删只触及变化的债券"""
+    
+    def __init__(self, min_days: int, max_days: int, yield_cutoff: float, top_k: int):
+        self.min_days = min_days
+        self.max_days = max_days
+        self._yield_cutoff = yield_cutoff
+        self._top_k = top_k
+        self._entries: Dict[str, tuple] = {}  # 简称 -> (税后年收益率, 交易量)
+        self._by_yield: List[tuple] = []  # (-税后年收益率, 简称) 升序
+        self._by_volume: List[tuple] = []  # (-交易量, 简称) 升序，交易量为空的债券不参与
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def accepts(self, days: Any) -> bool:
+        return days is not None and not pd.isna(days) and self.min_days <= days <= self.max_days
+    
+    def remove(self, symbol: str) -> None:
+        entry = self._entries.pop(symbol, None)
+        if entry is None:
+            return
+        yield_val, volume = entry
+        self._discard(self._by_yield, (-yield_val, symbol))
+        if volume is not None:
+            self._discard(self._by_volume, (-volume, symbol))
+    
+    def update(self, symbol: str, days: Any, yield_val: Any, volume: Any) -> None:
+        """写入或更新一只债券；不在期限范围内或收益率为空时移出分组"""
+        self.remove(symbol)
+        if not self.accepts(days) or yield_val is None or pd.isna(yield_val):
+            return
+        volume = None if volume is None or pd.isna(volume) else float(volume)
+        self._entries[symbol] = (float(yield_val), volume)
+        bisect.insort(self._by_yield, (-float(yield_val), symbol))
+        if volume is not None:
+            bisect.insort(self._by_volume, (-volume, symbol))
+    
+    def top(self) -> List[str]:
+        """与 BucketRanker 相同的规则：收益率不低于组内最高值的 yield_cutoff，按成交量取前 K，再按收益率降序"""
+        if not self._by_yield:
+            return []
+        threshold = -self._by_yield[0][0] * self._yield_cutoff
+        selected = []
+        for _, symbol in self._by_volume:
+            if self._entries[symbol][0] >= threshold:
+                selected.append(symbol)
+                if len(selected) >= self._top_k:
+                    break
+        selected.sort(key=lambda s: -self._entries[s][0])
+        return selected
+    
+    @staticmethod
+    def _discard(index: List[tuple], key: tuple) -> None:
+        pos = bisect.bisect_left(index, key)
+        if pos < len(index) and index[pos] == key:
+            del index[pos]
+
+
+class LiveRanking:
+    """盘中增量排名 - 对比相邻两次成交快照，只对新增、变化或移除的债券更新各期限分组"""
+    
+    def __init__(self, buckets: List[tuple], yield_cutoff: float, top_k: int):
+        self.buckets = {
+            title: BucketTopK(min_days, max_days, yield_cutoff, top_k)
+            for title, min_days, max_days in buckets
+        }
+        self.rows: Dict[str, Dict] = {}  # 简称 -> 最近一次的计算结果
+        self._hashes = pd.Series(dtype='uint64')
+        self._unresolved: set = set()  # 缺少元数据的债券，每次都重新尝试
+    
+    def diff(self, deal_df: pd.DataFrame) -> tuple:
+        """返回 (需要重算的行, 已从快照中消失的简称)"""
+        snapshot = deal_df.drop_duplicates(subset=['债券简称'], keep='last').set_index('债券简称')
+        hashes = pd.util.hash_pandas_object(snapshot, index=False)
+        previous = self._hashes.reindex(hashes.index, fill_value=0)
+        
+        changed = (hashes.values != previous.values) | hashes.index.isin(list(self._unresolved))
+        removed = list(self._hashes.index.difference(hashes.index))
+        self._hashes = hashes
+        return snapshot[changed].reset_index(), removed
+    
+    def apply(self, results: pd.DataFrame, removed: List[str]) -> None:
+        for symbol in removed:
+            self.rows.pop(symbol, None)
+            self._unresolved.discard(symbol)
+            for bucket in self.buckets.values():
+                bucket.remove(symbol)
         
-        ws.merge_cells(start_row=start_row, start_column=1,
-                       end_row=start_row + 2, end_column=len(display_cols))
-        cell = ws.cell(row=start_row, column=1)
-        cell.value = "备注：\n1. 优先按照投资天数需求选择，再根据税后收益率排名获得购买结果。\n2. 所列债券日成交额均大于10亿，流动性有保证。\n3. 推荐购买6个月内的债券，属于无风险的现金等价物。"
-        cell.alignment = Alignment(horizontal='left', vertical='top', wrap_text=True)
-        cell.font = Font(size=10)
+        for row in results.to_dict('records'):
+            symbol = row['债券简称']
+            self.rows[symbol] = row
+            days = row.get('剩余天数')
+            if days is None or pd.isna(days):
+                self._unresolved.add(symbol)
+            else:
+                self._unresolved.discard(symbol)
+            for bucket in self.buckets.values():
+                bucket.update(symbol, days, row.get('税后年收益率'), row.get('交易量'))
+    
+    def top(self) -> Dict[str, List[Dict]]:
+        return {title: [self.rows[s] for s in bucket.top()] for title, bucket in self.buckets.items()}
+    
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(list(self.rows.values()))
 
 
 # ==================== 主程序 ====================
@@ -615,11 +3854,19 @@ class BondAnalysisApp:
         self._config = config
         self._cache_manager = CacheManager(self._config)
         self._data_fetcher = BondDataFetcher(self._config)
+        self._data_fetcher.bind_resolver(self._cache_manager.symbol_resolver)
         self._calculator = BondCalculator()
+        self._pricer = BondPricer(self._config)
+        self._curve_engine = YieldCurveEngine(self._config)
+        self._scenario_engine = ScenarioEngine(self._config, self._pricer, self._curve_engine)
+        self._holding_simulator = HoldingPeriodSimulator(self._config, self._pricer)
         self._reporter = ExcelReporter(self._config)
+        self._result_writer = ResultWriter(self._config, self._reporter)
     
-    def run(self) -> None:
-        """运行分析流程"""
+    def run(self, scenarios: bool = False, holding: bool = False) -> None:
+        """运行分析流程；scenarios 为 True 时另对结果做情景重估，holding 为 True 时另模拟持有期收益"""
+        self._data_fetcher.guard.start_run()
+        
         # 1. 确定日期和缓存策略
         settlement_dt_str = self._determine_settlement_date()
         
@@ -628,19 +3875,81 @@ class BondAnalysisApp:
         if deal_df is None:
             return
         
+        self._cache_manager.sync_deal_history()
         deal_df = self._filter_deal_data(deal_df)
         
-        # 3. 加载元数据缓存
-        cache = self._cache_manager.load_metadata_cache(settlement_dt_str)
+        # 3. 加载全局元数据缓存
+        cache = self._cache_manager.load_metadata_cache()
         
         # 4. 抓取缺失的元数据
-        self._fetch_missing_metadata(deal_df, cache, settlement_dt_str)
+        self._fetch_missing_metadata(deal_df, cache)
         
         # 5. 计算指标
         results = self._calculate_metrics(deal_df, cache, settlement_dt_str)
         
         # 6. 生成报表
         self._generate_report(results, settlement_dt_str)
+        if scenarios:
+            self._run_scenarios(results, settlement_dt_str)
+        if holding:
+            self._run_holding(results, settlement_dt_str)
+        
+        # 7. 执行缓存保留策略
+        self._cache_manager.apply_retention()
+    
+    def watch(self, interval: Optional[float] = None, max_ticks: Optional[int] = None) -> None:
+        """盘中监控：定时重新拉取成交快照，只重算变化的债券并更新各期限分组排名，退出时生成报表"""
+        if not self._config.ONLINE_MODE:
+            print("错误: 盘中监控需要 ONLINE_MODE = True。")
+            return
+        
+        interval = self._config.WATCH_INTERVAL_SECONDS if interval is None else interval
+        settlement_dt_str = datetime.now().strftime("%Y-%m-%d")
+        cache = self._cache_manager.load_metadata_cache()
+        ranking = LiveRanking(self._config.REPORT_BUCKETS, self._config.REPORT_YIELD_CUTOFF,
+                              self._config.WATCH_TOP_K)
+        self._data_fetcher.guard.start_run()
+        
+        print(f"进入盘中监控，每 {interval:g} 秒刷新一次，按 Ctrl+C 退出。")
+        last_snapshot = None
+        tick = 0
+        try:
+            while True:
+                tick += 1
+                start = time.perf_counter()
+                snapshot = self._data_fetcher.fetch_deal_snapshot()
+                if snapshot is not None:
+                    last_snapshot = snapshot
+                    # 每轮只打印排名，各步骤的过程信息不输出
+                    changed_df, removed = ranking.diff(self._filter_deal_data(snapshot, verbose=False))
+                    results = pd.DataFrame()
+                    if not changed_df.empty:
+                        self._fetch_missing_metadata(changed_df, cache, verbose=False)
+                        results = self._calculate_metrics(changed_df, cache, settlement_dt_str, verbose=False)
+                    ranking.apply(results, removed)
+                    self._print_watch_tick(tick, ranking, len(changed_df), len(removed),
+                                           time.perf_counter() - start)
+                
+                if max_ticks is not None and tick >= max_ticks:
+                    break
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print("\n监控已停止。")
+        
+        if last_snapshot is not None:
+            self._cache_manager.save_deal_cache(last_snapshot, settlement_dt_str)
+            self._generate_report(ranking.to_frame(), settlement_dt_str)
+    
+    def _print_watch_tick(self, tick: int, ranking: LiveRanking, changed: int, removed: int,
+                          elapsed: float) -> None:
+        """打印本轮各期限分组的排名"""
+        print(f"[{datetime.now():%H:%M:%S}] 第 {tick} 轮：变化 {changed} 只，移除 {removed} 只，"
+              f"共 {len(ranking.rows)} 只，耗时 {elapsed:.2f} 秒")
+        for title, rows in ranking.top().items():
+            print(f"  {title}:")
+            for row in rows:
+                print(f"    {row['债券简称']:<12} 税后 {row['税后年收益率']:.4f}  "
+                      f"成交 {row.get('交易量')}  {row.get('剩余期限_格式化') or ''}")
     
     def _determine_settlement_date(self) -> str:
         """确定结算日期"""
@@ -673,7 +3982,7 @@ class BondAnalysisApp:
         
         return deal_df
     
-    def _filter_deal_data(self, deal_df: pd.DataFrame) -> pd.DataFrame:
+    def _filter_deal_data(self, deal_df: pd.DataFrame, verbose: bool = True) -> pd.DataFrame:
         """筛选成交数据"""
         initial_count = len(deal_df)
         
@@ -684,136 +3993,134 @@ class BondAnalysisApp:
             mask = mask & (deal_df['交易量'] >= 10)
         
         deal_df = deal_df[mask].copy()
-        print(f"统一筛选完成：从 {initial_count} 条过滤至 {len(deal_df)} 条。")
+        if verbose:
+            print(f"统一筛选完成：从 {initial_count} 条过滤至 {len(deal_df)} 条。")
         
         return deal_df
     
-    def _fetch_missing_metadata(self, deal_df: pd.DataFrame, cache: Dict, 
-                                 settlement_dt_str: str) -> None:
-        """抓取缺失的元数据"""
-        normalized_cache = {k.replace(" ", ""): v for k, v in cache.items()}
-        symbols_to_fetch = [
-            s for s in deal_df['债券简称'].unique() 
-            if s.replace(" ", "") not in normalized_cache
-        ]
-        
-        if not symbols_to_fetch:
-            print("所有成交债券的元数据已在缓存中，跳过抓取。")
-            return
+    def _fetch_missing_metadata(self, deal_df: pd.DataFrame, cache: MetadataTable, verbose: bool = True) -> None:
+        """抓取缺失的元数据；verbose 为 False 时不打印过程信息"""
+        log = print if verbose else (lambda *args: None)
+        missing = [s for s in deal_df['债券简称'].unique() if s not in cache]
         
         if not self._config.ONLINE_MODE:
-            print(f"ONLINE_MODE = False，禁止抓取。缺少 {len(symbols_to_fetch)} 个债券的元数据。")
+            if missing:
+                log(f"ONLINE_MODE = False，禁止抓取。缺少 {len(missing)} 个债券的元数据。")
+            else:
+                log("所有成交债券的元数据已在缓存中，跳过抓取。")
             return
         
-        print(f"发现 {len(symbols_to_fetch)} 个新债券缺失元数据，正在抓取...")
+        # 字段过期的债券同样需要刷新，过期期间仍可使用旧值
+        stale = {normalize_symbol(k) for k in self._cache_manager.get_stale_symbols()}
+        symbols_to_fetch = missing + [
+            s for s in deal_df['债券简称'].unique()
+            if normalize_symbol(s) in stale and s not in missing
+        ]
         
-        session = self._data_fetcher._create_session()
+        # 近期多次抓取失败的债券处于冷却期，本次跳过
+        blocked = self._cache_manager.get_blocked_symbols()
+        skipped = [s for s in symbols_to_fetch if normalize_symbol(s) in blocked]
+        if skipped:
+            log(f"{len(skipped)} 个债券近期抓取失败，处于冷却期，本次跳过。")
+            symbols_to_fetch = [s for s in symbols_to_fetch if normalize_symbol(s) not in blocked]
         
-        with ThreadPoolExecutor(max_workers=self._config.CONCURRENT_THREADS) as executor:
-            future_to_symbol = {
-                executor.submit(self._data_fetcher.fetch_metadata, s, session): s 
-                for s in symbols_to_fetch
-            }
-            
-            for future in tqdm(as_completed(future_to_symbol), total=len(symbols_to_fetch), desc="抓取进度"):
-                symbol = future_to_symbol[future]
-                try:
-                    data = future.result()
-                    if data:
-                        cache[symbol] = data
-                        normalized_cache[symbol.replace(" ", "")] = data
-                    
-                    if len(cache) % self._config.SAVE_INTERVAL == 0:
-                        self._cache_manager.save_metadata_cache(cache, settlement_dt_str)
-                except:
-                    pass
+        if not symbols_to_fetch:
+            log("所有成交债券的元数据已在缓存中，跳过抓取。")
+            return
         
-        self._cache_manager.save_metadata_cache(cache, settlement_dt_str)
-        print(f"抓取完成。当前总缓存: {len(cache)} 条。")
-    
-    def _calculate_metrics(self, deal_df: pd.DataFrame, cache: Dict, 
-                           settlement_dt_str: str) -> pd.DataFrame:
-        """计算债券指标"""
-        print("正在计算剩余期限及久期...")
+        log(f"发现 {len(symbols_to_fetch)} 个新债券缺失元数据，正在抓取...")
         
-        normalized_cache = {k.replace(" ", ""): v for k, v in cache.items()}
-        results = []
+        self._data_fetcher.batch_fetch_metadata(symbols_to_fetch, cache, self._cache_manager)
+        log(f"抓取完成。当前总缓存: {len(cache)} 条。")
+    
+    def _calculate_metrics(self, deal_df: pd.DataFrame, cache: MetadataTable,
+                           settlement_dt_str: str, verbose: bool = True) -> pd.DataFrame:
+        """计算债券指标 - 成交数据与元数据一次合并后按列计算；verbose 为 False 时不打印过程信息"""
+        if verbose:
+            print("正在计算剩余期限及久期...")
         
-        session = self._data_fetcher._create_session()
+        symbols = deal_df['债券简称'].unique()
         
-        for _, row in tqdm(deal_df.iterrows(), total=len(deal_df), desc="计算进度"):
-            symbol = row['债券简称']
-            search_key = symbol.replace(" ", "")
-            meta = normalized_cache.get(search_key)
+        # 缓存未命中且不在冷却期的债券，一次性并发实时抓取
+        if self._config.ONLINE_MODE:
+            blocked = self._cache_manager.get_blocked_symbols()
+            pending = [s for s in symbols if s not in cache and normalize_symbol(s) not in blocked]
             
-            # 缓存未命中，尝试实时抓取
-            if not meta and self._config.ONLINE_MODE:
-                meta = self._data_fetcher.fetch_metadata(symbol, session)
+            def on_result(symbol: str, meta: Optional[Dict]) -> None:
                 if meta:
-                    cache[symbol] = meta
-                    normalized_cache[search_key] = meta
+                    cache.add(meta)
+                    self._cache_manager.record_metadata(meta)
+                elif symbol not in self._data_fetcher.guard.aborted:
+                    self._cache_manager.record_fetch_failure(symbol)
             
-            res_row = self._process_row(row, meta, settlement_dt_str)
-            results.append(res_row)
+            if pending:
+                session = self._data_fetcher._create_session()
+                self._data_fetcher.fetch_metadata_many(pending, session, on_result)
         
-        self._cache_manager.save_metadata_cache(cache, settlement_dt_str)
+        self._cache_manager.compact_metadata_journal()
         
-        final_df = pd.DataFrame(results)
+        final_df = self._build_metrics_frame(deal_df, cache, settlement_dt_str)
         if final_df.empty:
-            print("未发现符合条件的债券数据。")
+            if verbose:
+                print("未发现符合条件的债券数据。")
+            return final_df
         
-        return final_df
+        final_df = self._pricer.price_frame(final_df, settlement_dt_str, verbose)
+        return self._curve_engine.annotate(final_df, settlement_dt_str, verbose)
     
-    def _process_row(self, row, meta: Optional[Dict], settlement_dt_str: str) -> Dict:
-        """处理单行数据"""
-        res_row = row.to_dict()
+    def _build_metrics_frame(self, deal_df: pd.DataFrame, cache: MetadataTable,
+                             settlement_dt_str: str) -> pd.DataFrame:
+        """按行号从元数据表取列，按列计算剩余天数、期限、收益率与税后收益率"""
+        if deal_df.empty:
+            return pd.DataFrame()
         
-        # 格式化交易量
-        if '交易量' in res_row and not pd.isna(res_row['交易量']):
-            vol = res_row['交易量']
-            if isinstance(vol, (float, np.float64)) and vol.is_integer():
-                vol = int(vol)
-            res_row['交易量'] = vol
-        
-        if not meta:
-            return self._empty_result(res_row)
+        base_df = deal_df.reset_index(drop=True)
+        symbols, inverse = np.unique(base_df['债券简称'].to_numpy(dtype=object), return_inverse=True)
+        positions = cache.positions(symbols)[inverse.reshape(-1)]
+        has_meta = positions >= 0
+        merged = pd.DataFrame({
+            '到期日': cache.column('maturity_date', positions),
+            '票面利率': cache.column('coupon_rate', positions),
+            '付息频率': cache.column('frequency', positions),
+            '付息方式': cache.column('coupon_type', positions),
+            '债券类型': cache.column('bond_type', positions),
+        })
         
-        # 计算收益率
-        y_val = row['加权收益率'] if not pd.isna(row['加权收益率']) else row['最新收益率']
+        # 收益率优先取加权收益率，缺失时回退最新收益率
+        y_val = base_df['加权收益率'].where(base_df['加权收益率'].notna(), base_df['最新收益率'])
+        days = self._calculator.remaining_days_array(merged['到期日'].where(has_meta), settlement_dt_str)
+        after_tax = self._calculator.after_tax_yield_array(y_val, merged['债券类型'])
         
-        # 计算剩余天数
-        days = self._calculator.calculate_remaining_days(
-            meta['maturity_date'], settlement_dt_str
-        )
+        def column(values, valid):
+            values = np.asarray(values, dtype=object)
+            return np.where(valid, values, None).tolist()
         
-        # 格式化期限
-        tenor_display = self._calculator.format_tenor(days)
-        
-        # 填充元数据
-        bond_type = meta.get('bond_type', '')
-        after_tax_yield = self._calculator.calculate_after_tax_yield(y_val, bond_type)
-        
-        res_row.update({
-            '到期日': meta['maturity_date'],
-            '票面利率': meta['coupon_rate'],
-            '付息频率': meta['frequency'],
-            '付息方式': meta.get('coupon_type', '---'),
-            '剩余期限_格式化': tenor_display,
-            '剩余天数': days,
-            '债券类型': bond_type,
-            '税后年收益率': after_tax_yield
-        })
+        days_valid = has_meta & ~np.isnan(days)
+        computed = {
+            '到期日': column(merged['到期日'], has_meta),
+            '票面利率': column(merged['票面利率'], has_meta),
+            '付息频率': column(merged['付息频率'], has_meta),
+            '付息方式': column(merged['付息方式'], has_meta),
+            '剩余期限_格式化': column(self._calculator.format_tenor_array(days), has_meta),
+            '剩余天数': column(np.where(days_valid, days, 0).astype(np.int64).astype(object), days_valid),
+            '债券类型': column(merged['债券类型'], has_meta),
+            '税后年收益率': column(after_tax, has_meta & ~np.isnan(after_tax)),
+        }
         
-        return res_row
+        result = base_df.drop(columns=[c for c in computed if c in base_df.columns])
+        if '交易量' in result.columns:
+            result['交易量'] = self._normalize_volume(result['交易量'])
+        # 逐列推断类型，与逐行构建 DataFrame 时的推断结果一致（如整数与 None 混合推断为浮点）
+        metrics = pd.DataFrame({c: pd.Series(values) for c, values in computed.items()})
+        return pd.concat([result, metrics], axis=1)
     
-    def _empty_result(self, res_row: Dict) -> Dict:
-        """返回空结果"""
-        res_row.update({
-            '到期日': None, '票面利率': None, '付息频率': None,
-            '付息方式': None, '剩余期限_格式化': None, '剩余天数': None,
-            '税后年收益率': None, '债券类型': None
-        })
-        return res_row
+    @staticmethod
+    def _normalize_volume(volume: pd.Series) -> pd.Series:
+        """交易量全部为整数时转为整型"""
+        values = volume.to_numpy(dtype=float, na_value=np.nan)
+        if len(values) and not np.isnan(values).any() and (values == np.floor(values)).all():
+            return volume.astype(np.int64)
+        return volume
     
     def _generate_report(self, final_df: pd.DataFrame, settlement_dt_str: str) -> None:
         """生成报表"""
@@ -822,20 +4129,81 @@ class BondAnalysisApp:
         
         print("正在对债券进行分类并排序...")
         
-        output_file = f"{self._config.OUTPUT_FILE_BASE}_{settlement_dt_str}.xlsx"
+        output_files = self._result_writer.write(final_df, f"{self._config.OUTPUT_FILE_BASE}_{settlement_dt_str}",
+                                                 f"债券分析结果 {settlement_dt_str}")
         
-        self._reporter.generate_report(
-            output_file, final_df, 
-            self._config.HEADER_MAPPING, self._config.COLS_ORDER
-        )
+        print(f"分析完成！结果已保存至: {', '.join(output_files)}")
+    
+    def _run_scenarios(self, final_df: pd.DataFrame, settlement_dt_str: str) -> None:
+        """情景重估并保存情景汇总与债券汇总"""
+        scenario_df, bond_df, _ = self._scenario_engine.revalue(final_df, settlement_dt_str)
+        if scenario_df.empty:
+            print("没有可重估的债券或情景，跳过情景分析。")
+            return
+        self._save_sheets(self._config.SCENARIO_OUTPUT_FILE_BASE, settlement_dt_str,
+                          {'情景汇总': scenario_df, '债券汇总': bond_df}, "情景分析")
+    
+    def _run_holding(self, final_df: pd.DataFrame, settlement_dt_str: str) -> None:
+        """模拟持有期收益，打印各持有天数下税后收益最高的债券并保存明细"""
+        table = self._holding_simulator.simulate(final_df, settlement_dt_str)
+        if table.empty:
+            print("没有可模拟的债券，跳过持有期收益分析。")
+            return
         
-        print(f"分析完成！结果已保存至: {output_file}")
+        for horizon in self._config.HOLDING_HORIZONS_DAYS:
+            best = HoldingPeriodSimulator.best(table, horizon, top_n=1)
+            if not best.empty:
+                row = best.iloc[0]
+                print(f"  持有 {horizon} 天（退出收益率不变）税后年化最高: {row['债券简称']} "
+                      f"{row['税后年化收益率(%)']:.3f}%")
+        self._save_sheets(self._config.HOLDING_OUTPUT_FILE_BASE, settlement_dt_str,
+                          {'税后年化收益率': HoldingPeriodSimulator.pivot(table).reset_index(), '明细': table},
+                          "持有期收益分析")
+    
+    def _save_sheets(self, file_base: str, settlement_dt_str: str, sheets: Dict[str, pd.DataFrame],
+                     label: str) -> None:
+        """将若干表格分别写入同一工作簿的各个 sheet"""
+        output_file = f"{file_base}_{settlement_dt_str}.xlsx"
+        self._reporter.write_tables(output_file, {name: df.round(4) for name, df in sheets.items()})
+        print(f"{label}已保存至: {output_file}")
 
 
 def main():
     """主函数入口"""
+    parser = argparse.ArgumentParser(description="债券批量分析工具")
+    parser.add_argument("--migrate-cache", action="store_true",
+                        help="将 cache 目录中的旧版 CSV 缓存一次性转换为 CACHE_FORMAT 格式后退出")
+    parser.add_argument("--keep-csv", action="store_true", help="迁移时保留原 CSV 文件")
+    parser.add_argument("--record", metavar="FILE",
+                        help="录制元数据接口的请求与响应到 FILE，供 tools/replay_server.py 回放")
+    parser.add_argument("--base-url", help="元数据接口地址，如 http://127.0.0.1:8765 指向离线回放服务")
+    parser.add_argument("--watch", nargs="?", type=float, const=config.WATCH_INTERVAL_SECONDS, metavar="SECONDS",
+                        help="盘中监控模式，每隔 SECONDS 秒刷新成交快照并增量更新排名")
+    parser.add_argument("--max-ticks", type=int, help="监控模式下最多刷新的轮数")
+    parser.add_argument("--formats", nargs="+", choices=ResultWriter.FORMATS, metavar="FORMAT",
+                        help="结果输出格式，可多选：xlsx / parquet / jsonl / html（默认见 Config.OUTPUT_FORMATS）")
+    parser.add_argument("--scenarios", action="store_true",
+                        help="对分析结果做平移、扭曲及历史曲线变动情景重估，另存为情景分析报表")
+    parser.add_argument("--holding", action="store_true",
+                        help="模拟各持有天数与退出收益率下提前卖出的收益，另存为持有期收益报表")
+    args = parser.parse_args()
+    
+    if args.record:
+        config.HTTP_RECORD_FILE = args.record
+    if args.base_url:
+        config.CHINAMONEY_BASE_URL = args.base_url.rstrip('/')
+    if args.formats:
+        config.OUTPUT_FORMATS = args.formats
+    
+    if args.migrate_cache:
+        CacheManager(config).migrate_legacy_csv(keep_csv=args.keep_csv)
+        return
+    
     app = BondAnalysisApp()
-    app.run()
+    if args.watch is not None:
+        app.watch(args.watch, args.max_ticks)
+    else:
+        app.run(scenarios=args.scenarios, holding=args.holding)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,80 @@
+"""期限分组排名与原逐组筛选结果一致"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from batch_bond_analysis import BucketRanker, ExcelReporter, config
+
+BUCKETS = [
+    ("小于6个月到期债券", 0, 180),
+    ("小于1年到期债券", 0, 365),
+    ("小于3年到期债券", 0, 1095),
+    ("1至2年到期债券", 366, 730),
+    ("超长期债券", 20000, 30000),  # 无债券落入
+    ("边界颠倒", 500, 400),
+]
+
+
+def _filter_bonds(df, min_days, max_days):
+    return df[(df['剩余天数'] >= min_days) & (df['剩余天数'] <= max_days)].copy()
+
+
+def _apply_filters(df, yield_cutoff, top_n):
+    if df.empty:
+        return df
+
+    max_yield = df['税后年收益率'].max()
+    if max_yield is None or pd.isna(max_yield):
+        return df
+
+    df = df[df['税后年收益率'] >= max_yield * yield_cutoff]
+
+    if not df.empty and '交易量' in df.columns:
+        df = df.dropna(subset=['交易量'])
+        df = df.nlargest(top_n, '交易量')
+
+    return df
+
+
+def _random_bonds(seed, rows):
+    """取值集中在少数几档，制造剩余天数、收益率与成交量的并列"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        '债券简称': [f"{i}附息国债" for i in range(rows)],
+        '剩余天数': rng.choice([30, 90, 180, 181, 365, 400, 700, 1095, 2000], rows).astype(float),
+        '税后年收益率': rng.choice([1.2, 1.5, 1.8, 2.0, np.nan], rows),
+        '交易量': rng.choice([10.0, 20.0, 50.0, np.nan], rows),
+        '到期日': '2030-01-01',
+    }, index=rng.permutation(rows) + 1000)
+    df.loc[df.sample(frac=0.05, random_state=seed).index, '剩余天数'] = np.nan
+    return df
+
+
+@pytest.mark.parametrize("seed", range(40))
+@pytest.mark.parametrize("volume", [True, False])
+def test_matches_filter_pipeline(seed, volume):
+    df = _random_bonds(seed, rows=int(np.random.default_rng(seed).integers(0, 120)))
+    if not volume:
+        df = df.drop(columns='交易量')
+    top_n = 1 + seed % 12
+
+    ranked = BucketRanker(BUCKETS, config.REPORT_YIELD_CUTOFF, top_n).rank(df)
+
+    assert [title for title, _ in ranked] == [b[0] for b in BUCKETS]
+    for (title, min_days, max_days), (_, actual) in zip(BUCKETS, ranked):
+        expected = _apply_filters(_filter_bonds(df, min_days, max_days), config.REPORT_YIELD_CUTOFF, top_n)
+        assert list(actual.index) == list(expected.index), title
+        pd.testing.assert_frame_equal(
+            ExcelReporter.prepare_df(actual, config.HEADER_MAPPING, config.COLS_ORDER),
+            ExcelReporter.prepare_df(expected, config.HEADER_MAPPING, config.COLS_ORDER))
+
+
+def test_empty_bucket_is_empty():
+    ranked = dict(BucketRanker(BUCKETS, config.REPORT_YIELD_CUTOFF, 10).rank(_random_bonds(0, 50)))
+    assert ranked["超长期债券"].empty
+    assert ranked["边界颠倒"].empty
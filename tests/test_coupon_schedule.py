@@ -0,0 +1,104 @@
+"""付息日表生成与 LRU 缓存"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from batch_bond_analysis import BondCalculator, CouponScheduleCache
+
+
+def _baseline_coupon_dates(settlement_date, maturity_date, frequency_str):
+    """原 BondCalculator.get_coupon_dates 的逐期 DateOffset 实现"""
+    freq_map = {'年': 1, '半年': 2, '季': 4, '按年付息': 1, '半年付息': 2, '按季付息': 4}
+    months_step = 12 // freq_map.get(frequency_str, 1)
+
+    coupon_dates = []
+    current_date = maturity_date
+    while current_date > settlement_date:
+        coupon_dates.append(current_date)
+        current_date = current_date - pd.DateOffset(months=months_step)
+
+    coupon_dates.sort()
+    return coupon_dates, current_date
+
+
+def _days(values):
+    return np.array(values, dtype='datetime64[D]')
+
+
+@pytest.mark.parametrize("frequency", ['年', '半年', '按年付息', '半年付息'])
+def test_matches_baseline(frequency):
+    rng = np.random.default_rng(len(frequency))
+    for _ in range(200):
+        settlement = pd.Timestamp('2026-01-01') + pd.Timedelta(days=int(rng.integers(0, 730)))
+        # 日期不超过 28 日时原实现不会因月末逐期漂移，两者应完全一致
+        maturity = pd.Timestamp(int(rng.integers(2026, 2060)), int(rng.integers(1, 13)), int(rng.integers(1, 29)))
+        if maturity <= settlement:
+            continue
+
+        expected_dates, expected_prev = _baseline_coupon_dates(settlement, maturity, frequency)
+        dates, prev = BondCalculator.get_coupon_dates(settlement, maturity.strftime('%Y-%m-%d'), frequency)
+        np.testing.assert_array_equal(dates, _days([d.date() for d in expected_dates]))
+        assert prev == np.datetime64(expected_prev.date(), 'D')
+
+
+def test_month_end_maturity_clamps_to_short_months():
+    dates, prev = BondCalculator.get_coupon_dates('2026-03-11', '2029-08-31', '半年')
+    np.testing.assert_array_equal(dates, _days([
+        '2026-08-31', '2027-02-28', '2027-08-31', '2028-02-29', '2028-08-31', '2029-02-28', '2029-08-31']))
+    assert prev == np.datetime64('2026-02-28')
+
+
+def test_end_of_february_maturity_does_not_roll_to_month_end():
+    dates, prev = BondCalculator.get_coupon_dates('2026-03-11', '2028-02-28', '半年')
+    np.testing.assert_array_equal(dates, _days(['2026-08-28', '2027-02-28', '2027-08-28', '2028-02-28']))
+    assert prev == np.datetime64('2026-02-28')
+
+
+def test_dead_or_missing_maturity():
+    (dead, dead_prev), (missing, missing_prev) = BondCalculator.get_coupon_schedules(
+        '2026-03-11', ['2026-03-11', None], ['年', '年'])
+    assert len(dead) == 0 and dead_prev == np.datetime64('2026-03-11')
+    assert len(missing) == 0 and np.isnat(missing_prev)
+
+
+def test_schedule_matrix_matches_per_bond_schedules():
+    settlement = np.datetime64('2026-03-11')
+    maturities = _days(['2026-09-30', '2036-08-31', '2030-01-15', '2027-03-11'])
+    frequencies = np.array([2, 2, 1, 4])
+    grid, prev_dates, periods = BondCalculator.coupon_schedule_matrix(settlement, maturities, frequencies)
+
+    labels = {1: '年', 2: '半年', 4: '季'}
+    for i, (mat, freq) in enumerate(zip(maturities, frequencies)):
+        dates, prev = BondCalculator.get_coupon_dates(settlement, str(mat), labels[freq])
+        assert periods[i] == len(dates)
+        np.testing.assert_array_equal(grid[i, :periods[i]], dates)
+        assert (grid[i, periods[i]:] == mat).all()
+        assert prev_dates[i] == prev
+
+
+def test_cache_hit_returns_identical_arrays():
+    args = ('2026-03-11', ['2035-05-20', '2031-11-02'], ['半年', '年'])
+    first = BondCalculator.get_coupon_schedules(*args)
+    hits = BondCalculator._schedule_cache.hits
+    second = BondCalculator.get_coupon_schedules(*args)
+
+    assert BondCalculator._schedule_cache.hits == hits + 2
+    for (dates_a, prev_a), (dates_b, prev_b) in zip(first, second):
+        assert dates_a is dates_b and prev_a == prev_b
+        assert not dates_b.flags.writeable
+
+
+def test_lru_evicts_least_recently_used():
+    cache = CouponScheduleCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+
+    assert cache.get_many(['a', 'b', 'c']) == {'a': 1, 'b': None, 'c': 3}
+    assert len(cache) == 2
@@ -0,0 +1,56 @@
+"""Act/Act（ICMA）天数分数"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from batch_bond_analysis import BondCalculator
+
+
+def _act_act(start, end, frequency, ref_start=None, ref_end=None):
+    return BondCalculator.day_count_fraction_array(
+        np.array([start], dtype='datetime64[D]'), np.array([end], dtype='datetime64[D]'), 'Act/Act', frequency,
+        None if ref_start is None else np.array([ref_start], dtype='datetime64[D]'),
+        None if ref_end is None else np.array([ref_end], dtype='datetime64[D]'))[0]
+
+
+@pytest.mark.parametrize("start, end, frequency, expected", [
+    # 整数个规则付息期
+    ('2026-03-11', '2031-03-11', 1, 5.0),
+    ('2026-03-11', '2031-03-11', 2, 5.0),
+    ('2027-12-15', '2028-06-15', 2, 0.5),  # 含 2 月 29 日的半年期仍为 1/2
+    ('2026-02-28', '2026-08-31', 2, 0.5),  # 月末到期：2 月取当月最后一天
+    # 短首期：不足一期的部分按所在名义付息期的实际天数计
+    ('2026-03-11', '2027-01-15', 1, 310 / 365),
+    ('2028-01-01', '2028-06-15', 2, 166 / 183 / 2),
+    ('2026-03-11', '2026-08-31', 2, 173 / 184 / 2),
+    # 长首期：一个完整名义期 + 前一名义期中的零头
+    ('2025-06-01', '2026-09-15', 1, 1 + 106 / 365),
+    ('2027-06-01', '2028-09-15', 1, 1 + 106 / 365),  # 完整期含闰日，仍计 1
+    ('2026-03-11', '2031-01-15', 1, 4 + 310 / 365),
+])
+def test_nominal_periods(start, end, frequency, expected):
+    assert _act_act(start, end, frequency) == pytest.approx(expected, rel=1e-14)
+
+
+def test_reversed_dates_are_negative():
+    assert _act_act('2027-01-15', '2026-03-11', 1) == pytest.approx(-310 / 365, rel=1e-14)
+
+
+@pytest.mark.parametrize("start, end, frequency, ref_start, ref_end, expected", [
+    ('2027-03-11', '2027-09-11', 1, '2027-03-11', '2028-03-11', 184 / 366),  # 闰年付息期
+    ('2028-02-15', '2028-03-15', 2, '2027-09-15', '2028-03-15', 29 / (2 * 182)),
+    ('2026-02-28', '2026-03-11', 2, '2026-02-28', '2026-08-31', 11 / (2 * 184)),
+])
+def test_reference_period(start, end, frequency, ref_start, ref_end, expected):
+    assert _act_act(start, end, frequency, ref_start, ref_end) == pytest.approx(expected, rel=1e-14)
+
+
+def test_accrual_and_remaining_fractions_sum_to_one_period():
+    prev, settle, nxt = (np.array([d], dtype='datetime64[D]') for d in ('2027-09-15', '2028-02-29', '2028-03-15'))
+    accrued = BondCalculator.day_count_fraction_array(prev, settle, 'Act/Act', 2, prev, nxt)
+    remaining = BondCalculator.day_count_fraction_array(settle, nxt, 'Act/Act', 2, prev, nxt)
+    assert accrued[0] + remaining[0] == pytest.approx(0.5, rel=1e-15)
@@ -0,0 +1,50 @@
+"""历史成交库滚动统计"""
+
+import os
+import sys
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from batch_bond_analysis import CacheStorage, DealHistoryStore
+
+SYMBOLS = ["20附息国债01", "21附息国债02", "22国开05"]
+
+
+def _snapshot(rng, symbols):
+    return pd.DataFrame({
+        '债券简称': symbols,
+        '交易量': rng.uniform(1, 100, len(symbols)).round(2),
+        '加权收益率': rng.uniform(1.5, 3.0, len(symbols)).round(4),
+        '最新收益率': rng.uniform(1.5, 3.0, len(symbols)).round(4),
+    })
+
+
+def _state(store):
+    with closing(store._connect()) as conn:
+        windows = conn.execute("SELECT * FROM rolling_window ORDER BY symbol").fetchall()
+    return windows, store.get_rolling_stats()
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = DealHistoryStore(str(tmp_path), CacheStorage('csv'), window=4)
+    rng = np.random.default_rng(0)
+    for date_str in pd.bdate_range('2026-03-02', periods=8).strftime('%Y-%m-%d'):
+        store.ingest(date_str, _snapshot(rng, SYMBOLS))
+    return store
+
+
+@pytest.mark.parametrize("symbols", [SYMBOLS[1:], SYMBOLS[:1], SYMBOLS + ["23国开10"]])
+def test_reingest_latest_matches_rebuild(store, symbols):
+    latest = store.ingested_dates()[-1]
+    store.ingest(latest, _snapshot(np.random.default_rng(1), symbols))
+    incremental = _state(store)
+
+    store.rebuild_rolling_stats()
+    windows, stats = _state(store)
+    assert incremental[0] == windows
+    pd.testing.assert_frame_equal(incremental[1], stats)
@@ -0,0 +1,119 @@
+"""流式 Excel 报表：用 openpyxl 读回，核对取值、命名样式、合并区域与工作表设置"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+openpyxl = pytest.importorskip("openpyxl")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from batch_bond_analysis import ExcelReporter, config
+
+
+@pytest.fixture
+def bonds():
+    return pd.DataFrame({
+        '债券简称': ['26附息国债01', '25附息国债11', '24国债<&>', '23附息国债05'],
+        '剩余天数': np.array([90, 300, 700, 5000], dtype=np.int64),
+        '剩余期限_格式化': ['90天', '300天', '1年335天', '13年255天'],
+        '税后年收益率': [1.23456, 1.5, np.nan, 2.1],
+        '到期日': ['2026-06-09', '2027-01-05', '2028-02-09', '2039-11-18'],
+        '交易量': [120.0, 80.5, 30.0, np.nan],
+        '修正久期': [0.2456789, 0.81, 1.9, np.inf],
+        'DV01': [0.0024, 0.0081, 0.019, 0.11],
+        '债券类型': ['国债', '国债', '国债', '地方债'],
+    })
+
+
+@pytest.fixture
+def report(tmp_path, bonds):
+    path = str(tmp_path / "report.xlsx")
+    ExcelReporter(config).generate_report(path, bonds, config.HEADER_MAPPING, config.COLS_ORDER)
+    return openpyxl.load_workbook(path)
+
+
+def _values(ws):
+    return [[c.value for c in row] for row in ws.iter_rows()]
+
+
+def test_sheets_and_named_styles(report):
+    assert report.sheetnames == ["主页", ExcelReporter.FULL_SHEET_NAME]
+    assert set(ExcelReporter.STYLES) <= set(report.named_styles)
+
+
+def test_home_sheet_layout(report):
+    ws = report["主页"]
+    title = ws['A1']
+    assert title.value == config.REPORT_BUCKETS[0][0]
+    assert title.style == '标题' and title.font.b and title.font.color.rgb == '00FFFFFF'
+    assert title.fill.fgColor.rgb == '00366092'
+    assert 'A1:F1' in {str(r) for r in ws.merged_cells.ranges}
+
+    assert [c.value for c in ws[2]] == ExcelReporter.DISPLAY_COLS
+    assert ws['A2'].style == '表头' and ws['A2'].border.left.style == 'thin'
+
+    # 首个分组（6 个月内）只有一只债券，收益率按 4 位小数写出并使用收益率样式
+    assert [c.value for c in ws[3]] == ['26附息国债01', 1.2346, '90天', '2026-06-09', 0.2457, 0.0024]
+    assert ws['B3'].style == '收益率' and ws['B3'].fill.fgColor.rgb == '00FFE699'
+    assert ws['A3'].alignment.horizontal == 'center' and ws['C3'].alignment.horizontal == 'left'
+
+    widths = [ws.column_dimensions[letter].width for letter in 'ABCDEF']
+    assert widths == ExcelReporter.COLUMN_WIDTHS
+    assert ws.row_dimensions[3].height == ExcelReporter.ROW_HEIGHT
+
+    note_row = ws.max_row - 2
+    note = ws.cell(note_row, 1)
+    assert note.value.startswith("备注：") and note.style == '备注' and note.alignment.wrap_text
+    assert f"A{note_row}:F{ws.max_row}" in {str(r) for r in ws.merged_cells.ranges}
+
+
+def test_empty_bucket_shows_placeholder(report):
+    ws = report["主页"]
+    titles = [row[0] for row in _values(ws)]
+    hits = [i for i, v in enumerate(titles, 1) if v == "暂无符合条件的债券"]
+    empty_buckets = [b for b in config.REPORT_BUCKETS if not any(b[1] <= d <= b[2] for d in (90, 300, 700, 5000))]
+    assert len(hits) == len(empty_buckets)
+    for row in hits:
+        assert ws.cell(row, 1).style == '提示'
+        assert f"A{row}:F{row}" in {str(r) for r in ws.merged_cells.ranges}
+
+
+def test_full_sheet_round_trip(report, bonds):
+    ws = report[ExcelReporter.FULL_SHEET_NAME]
+    expected = ExcelReporter.prepare_df(bonds, config.HEADER_MAPPING, config.COLS_ORDER)
+    rows = _values(ws)
+
+    assert rows[0] == list(expected.columns)
+    # 缺失值与非有限值为空单元格，NumPy 标量读回为普通数值
+    expected_rows = [[None if isinstance(v, float) and not np.isfinite(v) else v for v in record]
+                     for record in expected.astype(object).to_numpy().tolist()]
+    assert rows[1:] == expected_rows
+    assert all(type(v) in (int, float, str, type(None)) for row in rows for v in row)
+
+    assert ws.freeze_panes == 'A2'
+    assert ws.auto_filter.ref == f"A1:{openpyxl.utils.get_column_letter(len(expected.columns))}{len(rows)}"
+    assert ws['A1'].style == '表头' and ws['A2'].style == '明细'
+
+
+def test_write_tables_cell_types(tmp_path):
+    frame = pd.DataFrame({
+        '数值': [1.5, np.nan, -np.inf],
+        '文本': [' 前后空格 ', '<&>"', None],
+        '布尔': [True, False, True],
+        '可空整数': pd.array([1, None, 3], dtype='Int64'),
+    })
+    pivot = pd.DataFrame({30: [np.float64(1.25)], 90: [np.int64(2)]})
+    path = str(tmp_path / "tables.xlsx")
+    ExcelReporter(config).write_tables(path, {'明细': frame, '矩阵': pivot})
+
+    wb = openpyxl.load_workbook(path)
+    assert _values(wb['明细']) == [
+        ['数值', '文本', '布尔', '可空整数'],
+        [1.5, ' 前后空格 ', True, 1],
+        [None, '<&>"', False, None],
+        [None, None, True, 3],
+    ]
+    assert _values(wb['矩阵']) == [[30, 90], [1.25, 2]]
@@ -0,0 +1,65 @@
+"""熔断器与请求守卫"""
+
+import os
+import sys
+import time
+from dataclasses import replace
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from batch_bond_analysis import BondDataFetcher, FetchAborted, FetchGuard, config
+
+
+def test_probe_passes_pre_check_after_cooldown():
+    guard = FetchGuard(replace(config, CIRCUIT_BREAKER_THRESHOLD=1, CIRCUIT_BREAKER_COOLDOWN=0.05))
+    guard.after_response(403)
+    with pytest.raises(FetchAborted):
+        guard.before_request("债券A", consume=False)
+
+    time.sleep(0.06)
+    guard.start_run()
+    guard.before_request("债券A", consume=False)
+    guard.before_request("债券A")
+    assert guard.breaker.state == 'half_open'
+
+    # 试探请求在途时其余请求仍被拦截，试探成功后恢复
+    with pytest.raises(FetchAborted):
+        guard.before_request("债券B", consume=False)
+    guard.after_response(200)
+    assert guard.breaker.state == 'closed'
+    guard.before_request("债券B", consume=False)
+
+
+class _ThrottledCaller:
+    """每次请求都返回 403 的假会话"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def post(self, *args, **kwargs):
+        self.calls += 1
+        return SimpleNamespace(status_code=403, json=dict)
+
+
+def test_listing_pages_stop_when_breaker_opens():
+    fetcher = BondDataFetcher(replace(config, CIRCUIT_BREAKER_THRESHOLD=2, RETRY_COUNT=5,
+                                      RATE_INITIAL=1000.0, RATE_MIN=1000.0, RATE_MAX=1000.0,
+                                      UNIVERSE_QUERIES=[{"bondType": "100001"}, {"bondType": "100002"}]))
+    caller = _ThrottledCaller()
+    listings, complete = fetcher.fetch_universe(caller)
+
+    assert (listings, complete) == ([], False)
+    assert caller.calls == 2
+    assert fetcher.guard.breaker.state == 'open'
+
+
+def test_listing_pages_count_against_run_budget():
+    fetcher = BondDataFetcher(replace(config, RUN_REQUEST_BUDGET=3, CIRCUIT_BREAKER_THRESHOLD=100,
+                                      RATE_INITIAL=1000.0, RATE_MIN=1000.0, RATE_MAX=1000.0))
+    caller = _ThrottledCaller()
+    fetcher.fetch_universe(caller)
+
+    assert caller.calls == 3
+    assert fetcher.guard.budget.requests == 3
@@ -0,0 +1,31 @@
+"""全局元数据存储"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from batch_bond_analysis import MetadataStore
+
+
+def _meta(symbol, bond_type):
+    return {'symbol': symbol, 'bond_code': 'C' + symbol, 'maturity_date': '2030-01-01',
+            'coupon_rate': 0.02, 'frequency': '年', 'bond_type': bond_type, 'coupon_type': None}
+
+
+def test_empty_field_is_stale_only_by_age(tmp_path):
+    store = MetadataStore(str(tmp_path / "meta.db"), {'bond_type': 180, 'coupon_type': 180})
+    fetched_at = datetime(2026, 1, 1)
+    store.upsert_many([_meta("债券A", None), _meta("债券B", "国债")], fetched_at)
+
+    assert store.stale_symbols(fetched_at + timedelta(days=10)) == set()
+    assert store.stale_symbols(fetched_at + timedelta(days=181)) == {"债券A", "债券B"}
+
+
+def test_empty_refetch_keeps_value_and_refreshes_stamp(tmp_path):
+    store = MetadataStore(str(tmp_path / "meta.db"), {'bond_type': 180})
+    store.upsert_many([_meta("债券A", "国债")], datetime(2026, 1, 1))
+    store.upsert_many([_meta("债券A", None)], datetime(2026, 7, 1))
+
+    assert store.find("债券A")['bond_type'] == "国债"
+    assert store.stale_symbols(datetime(2026, 8, 1)) == set()
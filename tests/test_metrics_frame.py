@@ -0,0 +1,76 @@
+"""按列计算的指标表与原逐行计算结果一致"""
+
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from batch_bond_analysis import BondAnalysisApp, BondCalculator, config
+
+SETTLEMENT = "2026-03-11"
+
+
+def _process_row(row, meta, settlement_dt_str):
+    """原 BondAnalysisApp._process_row / _empty_result 的逐行实现"""
+    res_row = row.to_dict()
+
+    if '交易量' in res_row and not pd.isna(res_row['交易量']):
+        vol = res_row['交易量']
+        if isinstance(vol, (float, np.float64)) and vol.is_integer():
+            vol = int(vol)
+        res_row['交易量'] = vol
+
+    if not meta:
+        res_row.update({
+            '到期日': None, '票面利率': None, '付息频率': None,
+            '付息方式': None, '剩余期限_格式化': None, '剩余天数': None,
+            '税后年收益率': None, '债券类型': None
+        })
+        return res_row
+
+    y_val = row['加权收益率'] if not pd.isna(row['加权收益率']) else row['最新收益率']
+    days = BondCalculator.calculate_remaining_days(meta['maturity_date'], settlement_dt_str)
+    bond_type = meta.get('bond_type', '')
+    res_row.update({
+        '到期日': meta['maturity_date'],
+        '票面利率': meta['coupon_rate'],
+        '付息频率': meta['frequency'],
+        '付息方式': meta.get('coupon_type', '---'),
+        '剩余期限_格式化': BondCalculator.format_tenor(days),
+        '剩余天数': days,
+        '债券类型': bond_type,
+        '税后年收益率': BondCalculator.calculate_after_tax_yield(y_val, bond_type)
+    })
+    return res_row
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    source = os.path.join(ROOT, "cache", SETTLEMENT)
+    if not os.path.isdir(source):
+        pytest.skip("缺少 cache/2026-03-11 快照")
+    shutil.copytree(source, tmp_path / "cache" / SETTLEMENT)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(config, "ONLINE_MODE", False)
+    return BondAnalysisApp()
+
+
+@pytest.mark.parametrize("unknown", [0, 3])
+def test_matches_row_wise_metrics(app, unknown):
+    deal_df = app._filter_deal_data(app._fetch_deal_data(SETTLEMENT), verbose=False)
+    # 末尾若干债券改为缓存中不存在的简称，覆盖缺少元数据的行
+    # （原实现的列顺序取决于首行是否有元数据，首行有元数据时即为固定顺序）
+    deal_df.loc[deal_df.index[len(deal_df) - unknown:], '债券简称'] = [f"未知国债{i}" for i in range(unknown)]
+    cache = app._cache_manager.load_metadata_cache()
+
+    expected = pd.DataFrame([_process_row(row, cache.get(row['债券简称']), SETTLEMENT)
+                             for _, row in deal_df.iterrows()])
+    actual = app._build_metrics_frame(deal_df, cache, SETTLEMENT)
+
+    assert len(actual) > 0
+    pd.testing.assert_frame_equal(actual, expected)
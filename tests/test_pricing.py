@@ -0,0 +1,109 @@
+"""批量定价引擎：收益率求解、久期与凸性"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from batch_bond_analysis import BondPricer, config
+
+SETTLEMENT = "2026-03-11"
+
+# (票面利率, 付息频率, 到期日, 收益率)
+BONDS = [
+    (0.0250, '年', '2031-03-11', 0.0250),      # 结算日恰为付息日、平价
+    (0.0275, '半年', '2036-08-31', 0.0180),    # 月末付息
+    (0.0300, '年', '2056-05-20', 0.0200),      # 30 年溢价
+    (0.0010, '年', '2056-05-20', 0.0800),      # 深度折价
+    (0.1200, '半年', '2046-11-15', 0.0050),    # 深度溢价
+    (0.0000, '年', '2029-01-05', 0.0150),      # 零息
+    (0.0220, '季', '2027-06-30', 0.0210),      # 按季付息
+    (0.0230, '半年', '2026-10-20', 0.0190),    # 剩两个付息周期
+    (0.0240, '年', '2026-03-21', 0.0200),      # 10 天到期，单利公式
+    (0.0240, '年', '2026-12-01', 0.0300),      # 最后一个付息周期
+]
+
+
+@pytest.fixture
+def flows():
+    coupon, freq, maturity, _ = zip(*BONDS)
+    return BondPricer(config).prepare(coupon, freq, maturity, SETTLEMENT)
+
+
+@pytest.fixture
+def target_yields():
+    return np.array([b[3] for b in BONDS])
+
+
+def _solve(flows, dirty):
+    coupon, freq, maturity, _ = zip(*BONDS)
+    return BondPricer(config).price(dirty - flows.accrued, coupon, freq, maturity, SETTLEMENT)
+
+
+def test_par_bond_on_coupon_date():
+    result, _ = BondPricer(config).price([100.0], [0.025], ['年'], ['2031-03-11'], SETTLEMENT)
+    assert result['应计利息'].iloc[0] == 0
+    assert result['到期收益率'].iloc[0] == pytest.approx(2.5, abs=1e-9)
+    # 平价年付债券的麦考利久期为年金久期
+    v = 1 / 1.025
+    annuity = sum(t * 2.5 * v ** t for t in range(1, 6)) + 5 * 100 * v ** 5
+    assert result['麦考利久期'].iloc[0] == pytest.approx(annuity / 100, rel=1e-9)
+
+
+def test_price_yield_price_round_trip(flows, target_yields):
+    dirty = flows.dirty_prices(target_yields)
+    result, report = _solve(flows, dirty)
+
+    assert report.converged == report.total == len(BONDS)
+    np.testing.assert_allclose(result['到期收益率'] / 100, target_yields, atol=1e-9)
+    np.testing.assert_allclose(flows.dirty_prices(result['到期收益率'].to_numpy() / 100), dirty,
+                               atol=config.PRICING_TOLERANCE * 10)
+    np.testing.assert_allclose(result['全价'], dirty)
+
+
+@pytest.mark.parametrize("target", [-0.03, 0.0, 0.12, 0.35, 0.8])
+def test_converges_on_deep_discount_and_premium(flows, target):
+    # 长债在 35%/80% 时为深度折价，负收益率时高票息债为深度溢价；近到期债券同样覆盖
+    target_yields = np.full(len(BONDS), target)
+    dirty = flows.dirty_prices(target_yields)
+    result, report = _solve(flows, dirty)
+
+    assert report.converged == report.total == len(BONDS)
+    assert report.max_residual < config.PRICING_TOLERANCE
+    np.testing.assert_allclose(result['到期收益率'] / 100, target_yields, atol=1e-8)
+
+
+def test_out_of_bounds_price_is_reported():
+    result, report = BondPricer(config).price([1.0], [0.03], ['年'], ['2036-03-11'], SETTLEMENT)
+    assert np.isnan(result['到期收益率'].iloc[0])
+    assert report.failed_symbols == ['0']
+
+
+def test_near_maturity_uses_simple_yield():
+    result, report = BondPricer(config).price([99.95], [0.024], ['年'], ['2026-03-21'], SETTLEMENT)
+    accrued = result['应计利息'].iloc[0]
+    expected = ((100 + 2.4) / (99.95 + accrued) - 1) * 365 / 10
+    assert report.closed_form == 1
+    assert result['到期收益率'].iloc[0] / 100 == pytest.approx(expected, rel=1e-12)
+
+
+def test_duration_and_convexity_match_finite_differences(flows, target_yields):
+    dirty = flows.dirty_prices(target_yields)
+    result, _ = _solve(flows, dirty)
+    y = result['到期收益率'].to_numpy() / 100
+    h = 1e-5
+    up, down = flows.dirty_prices(y + h), flows.dirty_prices(y - h)
+    centre = flows.dirty_prices(y)
+
+    np.testing.assert_allclose(result['修正久期'], (down - up) / (2 * h * centre), rtol=1e-6)
+    np.testing.assert_allclose(result['凸性'], (up + down - 2 * centre) / (h ** 2 * centre), rtol=1e-4)
+    bp = 1e-4
+    np.testing.assert_allclose(result['DV01'], (flows.dirty_prices(y - bp) - flows.dirty_prices(y + bp)) / 2,
+                               rtol=1e-4)
+
+    # 复利定价的债券：修正久期 = 麦考利久期 / (1 + y/m)
+    compound = ~flows.last
+    np.testing.assert_allclose(result['修正久期'][compound],
+                               result['麦考利久期'][compound] / (1 + y[compound] / flows.frequency[compound]))
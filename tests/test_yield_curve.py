@@ -0,0 +1,59 @@
+"""NSS 曲线逐日热启动拟合"""
+
+import os
+import sys
+from dataclasses import replace
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from batch_bond_analysis import NSSCurveFitter, YieldCurveEngine, config
+
+TENORS = np.array([0.25, 0.5, 1, 3, 5, 7, 10, 30])
+
+
+def _history(days=20, seed=0):
+    rng = np.random.default_rng(seed)
+    true = np.array([4.0, -1.5, -1.0, 1.0, 1.5, 8.0]) + np.cumsum(rng.normal(0, 0.01, (days, 6)), axis=0)
+    yields = NSSCurveFitter.evaluate(true[:, None, :], TENORS[None, :]) + rng.normal(0, 0.01, (days, len(TENORS)))
+    dates = pd.bdate_range('2026-01-05', periods=days).strftime('%Y-%m-%d').tolist()
+    return dates, yields
+
+
+def _spy(engine):
+    calls = []
+    fit_batch = engine._fitter.fit_batch
+
+    def record(tenors, yields, start=None, **kwargs):
+        result = fit_batch(tenors, yields, start, **kwargs)
+        calls.append((None if start is None else start.copy(), result[0].copy()))
+        return result
+
+    engine._fitter.fit_batch = record
+    return calls
+
+
+def test_each_day_starts_from_previous_accepted_fit(tmp_path):
+    engine = YieldCurveEngine(config, cache_dir=str(tmp_path))
+    calls = _spy(engine)
+    dates, yields = _history()
+    empty = pd.DataFrame(columns=['日期'] + NSSCurveFitter.PARAM_COLUMNS)
+    result = engine._fit_sequence(dates, TENORS, yields, empty)
+
+    assert len(calls) == len(dates)
+    assert calls[0][0] is None
+    for (_, previous), (start, _) in zip(calls, calls[1:]):
+        np.testing.assert_array_equal(start[0], previous[0])
+    assert (result['rmse'] * 100 < config.CURVE_WARM_START_MAX_RMSE_BP).all()
+
+
+def test_falls_back_to_grid_above_threshold(tmp_path):
+    engine = YieldCurveEngine(replace(config, CURVE_WARM_START_MAX_RMSE_BP=0.0), cache_dir=str(tmp_path))
+    calls = _spy(engine)
+    dates, yields = _history(days=3)
+    empty = pd.DataFrame(columns=['日期'] + NSSCurveFitter.PARAM_COLUMNS)
+    engine._fit_sequence(dates, TENORS, yields, empty)
+
+    # 首日只有网格拟合，其后每日先热启动、误差超限再网格重拟合
+    assert [start is None for start, _ in calls] == [True, False, True, False, True]
@@ -1,46 +1,131 @@
+"""
+久期与时间、利率的关系热力图
+w(r, N) = N / (1 + r)^(N - 1) + Σ_{i=1}^{N-1} i·r / (1 + r)^i，期限与 w 之比 N / w 即久期倍数；
+整个 (r, N) 网格按闭式解一次广播计算，倍数为 2/3/4 的等值线对全部期限同时二分精确求根
+"""
+
+import argparse
+import time
+
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.colors import BoundaryNorm
+
+plt.rcParams['font.sans-serif'] = ['SimHei']
+plt.rcParams['axes.unicode_minus'] = False
+
+SMALL_RATE = 1e-5  # 低于该利率时闭式解存在相消误差，改用二阶展开
+DISPLAY_ROWS = 2000  # 热力图最多显示的利率行数，超出屏幕分辨率的细节按步长抽取；等值线仍按精确根绘制
+
+
+def duration_weight(r, N):
+    """
+    闭式计算 w(r, N)，r 与 N 可为任意可广播的数组
+    Σ_{i=1}^{n} i·v^i = v·(1 - (n+1)·v^n + n·v^(n+1)) / (1 - v)^2，其中 v = 1 / (1 + r)，n = N - 1，
+    化简得 w = c + v^(N-1)·(N + c·((N-1)·v - N))，c = (1 + r) / r
+    """
+    r = np.asarray(r, dtype=float)
+    N = np.asarray(N, dtype=float)
+    small = np.abs(r) < SMALL_RATE
+    safe_r = np.where(small, 1.0, r)
+    v = 1 / (1 + r)
+    c = (1 + safe_r) / safe_r
+
+    # 网格级运算尽量原地进行，避免细网格下反复分配大数组
+    w = np.multiply(N - 1, np.log(v), out=np.empty(np.broadcast_shapes(r.shape, N.shape)))
+    np.exp(w, out=w)
+    inner = np.multiply(N - 1, v)
+    inner = inner - N
+    inner = inner * c
+    inner += N
+    w *= inner
+    w += c
+
+    # 小利率处闭式解相消严重：r·Σ i·v^i ≈ r·n(n+1)/2 - r²·n(n+1)(2n+1)/6
+    if small.any():
+        mask = np.broadcast_to(small, w.shape)
+        r_s, N_s = np.broadcast_to(r, w.shape)[mask], np.broadcast_to(N, w.shape)[mask]
+        n = N_s - 1
+        w[mask] = N_s * np.exp(-n * np.log1p(r_s)) + r_s * n * (n + 1) / 2 - r_s ** 2 * n * (n + 1) * (2 * n + 1) / 6
+    return w if w.ndim else float(w)
+
 
 def foo(r, N):
-    w = N / (1 + r) ** (N - 1) 
-    w += np.sum([(i * r) / ((1 + r) ** i) for i in range(1, N)])
-    return w
+    """兼容原接口"""
+    return duration_weight(r, N)
+
+
+def duration_grid(r_range, years):
+    """返回形状 (利率数, 期限数) 的 w 网格"""
+    return duration_weight(np.asarray(r_range, dtype=float)[:, None], np.asarray(years, dtype=float)[None, :])
+
+
+def iso_ratio_rates(ratio, years, r_range, tol=1e-12, max_iter=100):
+    """
+    对每个期限 N 求 N / w(r, N) = ratio 在 r_range 范围内的根，超出范围时为 NaN
+    N / w 随 r 单调递增，按两端点判定有无根后对全部期限同时二分至 tol，不依赖利率网格的疏密
+    """
+    r_range = np.asarray(r_range, dtype=float)
+    years = np.asarray(years, dtype=float)
+    lo = np.full(len(years), r_range[0])
+    hi = np.full(len(years), r_range[-1])
+    f_lo = years / duration_weight(lo, years) - ratio
+    f_hi = years / duration_weight(hi, years) - ratio
+    found = (f_lo <= 0) & (f_hi >= 0)
+
+    for _ in range(max_iter):
+        mid = (lo + hi) / 2
+        above = years / duration_weight(mid, years) - ratio >= 0
+        hi = np.where(above, mid, hi)
+        lo = np.where(above, lo, mid)
+        if np.max(hi - lo) < tol:
+            break
+    return np.where(found, (lo + hi) / 2, np.nan)
+
+
+def plot_duration_heatmap(r_range, years, ratios=(2, 3, 4), ax=None):
+    """绘制 w 热力图并叠加久期倍数等值线，返回 (ax, w 网格, {倍数: 各期限的根})"""
+    r_range = np.asarray(r_range, dtype=float)
+    years = np.asarray(years, dtype=float)
+    w = duration_grid(r_range, years)
+    contours = {k: iso_ratio_rates(k, years, r_range) for k in ratios}
+
+    if ax is None:
+        ax = plt.gca()
+    # 细网格下 contourf 绘制成本随点数增长，按相同分档用 imshow 渲染
+    levels = np.linspace(1, years.max(), 2 * len(years))
+    cmap = plt.get_cmap('viridis')
+    step = max(1, len(r_range) // DISPLAY_ROWS)
+    image = ax.imshow(w[::step], origin='lower', aspect='auto', interpolation='nearest', cmap=cmap,
+                      norm=BoundaryNorm(levels, cmap.N, extend='both'),
+                      extent=(years[0], years[-1], r_range[0], r_range[-1]))
+    for k, color in zip(ratios, 'rgbcmy'):
+        ax.plot(years, contours[k], color, label=f'{k:g}倍')
+    ax.set_xlabel('期限 N（年）')
+    ax.set_ylabel('利率 r')
+    ax.legend(loc='best')
+    plt.colorbar(image, ax=ax)
+    return ax, w, contours
+
+
+def main():
+    parser = argparse.ArgumentParser(description="久期与时间、利率关系热力图")
+    parser.add_argument("--rates", type=int, default=1000, help="利率网格点数")
+    parser.add_argument("--max-rate", type=float, default=0.1)
+    parser.add_argument("--years", type=int, default=30, help="最长期限（年）")
+    parser.add_argument("--output", help="保存图片而不弹出窗口")
+    args = parser.parse_args()
+
+    r_range = np.linspace(0, args.max_rate, args.rates)
+    years = np.arange(1, args.years + 1)
+    start = time.perf_counter()
+    plot_duration_heatmap(r_range, years)
+    print(f"{args.rates} × {args.years} 网格计算与绘制耗时 {time.perf_counter() - start:.3f} 秒")
+    if args.output:
+        plt.savefig(args.output, dpi=300)
+    else:
+        plt.show()
+
 
 if __name__ == "__main__":
-    r_range = np.linspace(0, 0.1, 1000)
-    N = 30
-    w = []
-    for r in r_range:
-        w.append([foo(r, n) for n in range(1, N+1)])
-    h_list = []
-    t_list = []
-    q_list = []
-    quantiality = 0.005
-    for n in range(1, N+1):
-        h = 0
-        t = 0
-        q = 0
-        for r in r_range:
-            t_w = foo(r, n)
-            if abs(n / t_w - 2) < quantiality and h == 0:
-                h = r
-                h_list.append(r)
-            elif abs(n / t_w - 3) < quantiality and t == 0:
-                t = r
-                t_list.append(r)
-            elif abs(n / t_w - 4) < quantiality and q == 0:
-                q = r
-                q_list.append(r)
-    hn = len(h_list)
-    tn = len(t_list)
-    qn = len(q_list)
-    h_list = np.array(h_list)
-    t_list = np.array(t_list)
-    q_list = np.array(q_list)
-    w = np.array(w)
-    plt.contourf(np.linspace(1, N, N), r_range, w, levels=np.linspace(1, N, 2 * N))
-    plt.plot(np.linspace(N - hn, N, hn), h_list, 'r')
-    plt.plot(np.linspace(N - tn, N, tn), t_list, 'g')
-    plt.plot(np.linspace(N - qn, N, qn), q_list, 'b')
-    plt.colorbar()
-    plt.show()
\ No newline at end of file
+    main()
@@ -0,0 +1,164 @@
+"""
+Excel 报表写入基准测试
+同一份合成分析结果分别用 StreamingXlsxWriter 与 openpyxl 只写模式（WriteOnlyCell + 共享 NamedStyle）
+写出主页与全部债券两张工作表，比较耗时与峰值内存，全程不联网
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from batch_bond_analysis import ExcelReporter, config
+
+
+def synthetic_results(rows: int, seed: int = 0) -> pd.DataFrame:
+    """与 BondAnalysisApp 输出同列的合成分析结果"""
+    rng = np.random.default_rng(seed)
+    days = rng.integers(1, 30 * 365, rows)
+    maturity = pd.Timestamp('2026-03-11') + pd.to_timedelta(days, unit='D')
+    ytm = rng.uniform(1.2, 2.6, rows)
+    duration = days / 365 * rng.uniform(0.7, 0.95, rows)
+    return pd.DataFrame({
+        '债券简称': [f"{i % 100:02d}附息国债{i:05d}" for i in range(rows)],
+        '成交净价': rng.uniform(90, 110, rows).round(2),
+        '最新收益率': ytm.round(4),
+        '涨跌': rng.normal(0, 2, rows).round(1),
+        '加权收益率': np.where(rng.random(rows) < 0.1, np.nan, ytm.round(4)),
+        '交易量': np.where(rng.random(rows) < 0.1, np.nan, rng.uniform(1, 800, rows).round(3)),
+        '到期日': maturity.strftime('%Y-%m-%d'),
+        '票面利率': rng.choice([0.0188, 0.0215, 0.0238, 0.0275], rows),
+        '付息频率': rng.choice(['年', '半年'], rows),
+        '付息方式': None,
+        '剩余期限_格式化': [f"{d // 365}年{d % 365}天" for d in days],
+        '剩余天数': days,
+        '债券类型': rng.choice(['国债', '地方债', '政金债'], rows),
+        '税后年收益率': ytm.round(4),
+        '应计利息': rng.uniform(0, 1.5, rows),
+        '全价': rng.uniform(90, 112, rows),
+        '到期收益率': ytm,
+        '麦考利久期': duration * 1.01,
+        '修正久期': duration,
+        '凸性': duration ** 2,
+        'DV01': duration / 100,
+        '收益率偏差': rng.normal(0, 3, rows),
+    })
+
+
+def write_openpyxl(path: str, reporter: ExcelReporter, final_df: pd.DataFrame) -> None:
+    """openpyxl 只写模式写出与 ExcelReporter.generate_report 相同的两张工作表"""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    thin = Side(style='thin', color='FF000000')
+    for name, style in ExcelReporter.STYLES.items():
+        wb.add_named_style(NamedStyle(
+            name=name,
+            font=Font(bold=style.bold, size=style.font_size, color=style.font_color),
+            fill=PatternFill('solid', fgColor=style.fill) if style.fill else PatternFill(),
+            border=Border(left=thin, right=thin, top=thin, bottom=thin) if style.border else Border(),
+            alignment=Alignment(horizontal=style.horizontal, vertical=style.vertical, wrap_text=style.wrap)))
+
+    def cells(ws, values, styles):
+        row = []
+        for value, style in zip(values, styles):
+            cell = WriteOnlyCell(ws, value)
+            cell.style = style
+            row.append(cell)
+        return row
+
+    # 主页
+    display_cols = ExcelReporter.DISPLAY_COLS
+    width = len(display_cols)
+    ws = wb.create_sheet("主页")
+    for i, w in enumerate(ExcelReporter.COLUMN_WIDTHS, 1):
+        ws.column_dimensions[get_column_letter(i)].width = w
+    row_no = 0
+
+    def append(values, style):
+        nonlocal row_no
+        row_no += 1
+        ws.row_dimensions[row_no].height = ExcelReporter.ROW_HEIGHT
+        styles = style if isinstance(style, list) else [style] * len(values)
+        ws.append(cells(ws, values, styles))
+        return row_no
+
+    cell_styles = ['收益率' if c == '税后年收益率' else '居中' if i < 2 else '居左' for i, c in enumerate(display_cols)]
+    for title, df in reporter._ranker.rank(final_df):
+        df = reporter.prepare_df(df, config.HEADER_MAPPING, config.COLS_ORDER)
+        row = append([title] + [None] * (width - 1), '标题')
+        ws.merged_cells.add(f"A{row}:{get_column_letter(width)}{row}")
+        append(display_cols, '表头')
+        for record in df[[c for c in display_cols if c in df.columns]].head(20).to_dict('records'):
+            append([reporter._format_cell_value(record[c], c) if c in record else '---' for c in display_cols],
+                   cell_styles)
+        append([], None)
+
+    # 全部债券：缺失值与非有限值写为空单元格
+    df = reporter.prepare_df(final_df, config.HEADER_MAPPING, config.COLS_ORDER)
+    ws = wb.create_sheet(ExcelReporter.FULL_SHEET_NAME)
+    for i, c in enumerate(df.columns, 1):
+        ws.column_dimensions[get_column_letter(i)].width = max(10, 2 * len(str(c)) + 2)
+    ws.freeze_panes = 'A2'
+    ws.append(cells(ws, list(df.columns), ['表头'] * df.shape[1]))
+    columns = [df[c].astype(object).where(df[c].notna() & ~df[c].isin([np.inf, -np.inf]), None).tolist()
+               for c in df.columns]
+    for values in zip(*columns):
+        ws.append(cells(ws, values, ['明细'] * df.shape[1]))
+    ws.auto_filter.ref = f"A1:{get_column_letter(df.shape[1])}{len(df) + 1}"
+    wb.save(path)
+
+
+def run_case(name, write, path):
+    """运行一次写入，返回耗时与峰值内存（内存在第二次运行中单独统计，避免 tracemalloc 拖慢计时）"""
+    start = time.perf_counter()
+    write(path)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    write(path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'写入方式': name, '耗时(秒)': round(elapsed, 2), '峰值内存(MB)': round(peak / 1e6, 1),
+            '文件大小(MB)': round(os.path.getsize(path) / 1e6, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Excel 报表写入离线基准测试")
+    parser.add_argument("--rows", type=int, nargs='+', default=[3000, 30000], help="合成债券数量")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-openpyxl", action="store_true", help="只测 StreamingXlsxWriter")
+    parser.add_argument("--output", help="结果另存为 CSV")
+    args = parser.parse_args()
+
+    reporter = ExcelReporter(config)
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.rows:
+            final_df = synthetic_results(n, args.seed)
+            print(f"运行: {n} 只债券 × {len(final_df.columns)} 列 ...")
+            cases = [('StreamingXlsxWriter', lambda path: reporter.generate_report(
+                path, final_df, config.HEADER_MAPPING, config.COLS_ORDER))]
+            if not args.skip_openpyxl:
+                cases.append(('openpyxl 只写模式', lambda path: write_openpyxl(path, reporter, final_df)))
+            for name, write in cases:
+                rows.append({'债券数': n, **run_case(name, write, os.path.join(tmp, f"{n}.xlsx"))})
+
+    result = pd.DataFrame(rows)
+    print(result.to_string(index=False))
+    if args.output:
+        result.to_csv(args.output, index=False, encoding='utf-8-sig')
+        print(f"结果已保存至: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
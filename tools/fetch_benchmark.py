@@ -0,0 +1,131 @@
+"""
+元数据抓取层基准测试
+在离线回放服务上按不同并发与速率参数运行抓取引擎，统计吞吐、尾延迟与重试开销，全程不联网
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import replace
+from itertools import product
+
+import numpy as np
+import pandas as pd
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from batch_bond_analysis import BondDataFetcher, config
+from replay_server import ReplayStore, start_server
+
+
+class CountingSession(requests.Session):
+    """统计每种响应状态码次数的会话"""
+
+    def __init__(self):
+        super().__init__()
+        self.status_counts = Counter()
+        self._lock = threading.Lock()
+
+    def request(self, method, url, *args, **kwargs):
+        response = super().request(method, url, *args, **kwargs)
+        with self._lock:
+            self.status_counts[response.status_code] += 1
+        return response
+
+
+async def _timed_fetch(engine, symbols, session, concurrency):
+    """并发抓取并记录每个债券从开始到完成的耗时"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, successes = [], 0
+
+    async def worker(symbol):
+        nonlocal successes
+        async with semaphore:
+            start = time.perf_counter()
+            metadata = await engine.fetch_one(symbol, session)
+            latencies.append(time.perf_counter() - start)
+            successes += metadata is not None
+
+    await asyncio.gather(*(worker(s) for s in symbols))
+    return latencies, successes
+
+
+def run_case(base_url, symbols, concurrency, rate, retry_count):
+    """运行单组参数，返回统计结果"""
+    case_config = replace(config, CHINAMONEY_BASE_URL=base_url, FETCH_ENGINE='async',
+                          ASYNC_CONCURRENCY=concurrency, RATE_INITIAL=rate,
+                          RATE_MAX=max(rate, config.RATE_MAX), RETRY_COUNT=retry_count,
+                          RUN_REQUEST_BUDGET=None, RUN_TIME_BUDGET_SECONDS=None)
+    fetcher = BondDataFetcher(case_config)
+    engine = fetcher._async_engine
+    session = CountingSession()
+
+    start = time.perf_counter()
+    latencies, successes = asyncio.run(_timed_fetch(engine, symbols, session, concurrency))
+    elapsed = time.perf_counter() - start
+
+    total_requests = sum(session.status_counts.values())
+    throttled = sum(session.status_counts[s] for s in BondDataFetcher.THROTTLE_STATUS)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if latencies else (np.nan,) * 3
+    return {
+        '并发数': concurrency,
+        '初始速率': rate,
+        '成功数': successes,
+        '耗时(秒)': round(elapsed, 2),
+        '债券/秒': round(len(symbols) / elapsed, 3),
+        'P50(秒)': round(p50, 2),
+        'P95(秒)': round(p95, 2),
+        'P99(秒)': round(p99, 2),
+        '请求/债券': round(total_requests / max(len(symbols), 1), 2),
+        '限流次数': throttled,
+        '最终速率': round(engine.bucket.rate, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="元数据抓取层离线基准测试")
+    parser.add_argument("--record-file", action="append", default=[], help="录制文件，可多次指定")
+    parser.add_argument("--synthetic", type=int, default=0, help="不使用录制，生成 N 个合成债券")
+    parser.add_argument("--concurrency", type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument("--rate", type=float, nargs='+', default=[0.5, 2.0], help="初始请求速率（次/秒）")
+    parser.add_argument("--retry-count", type=int, default=config.RETRY_COUNT)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--max-rate", type=float, default=None, help="回放服务每秒请求上限，超出返回 403/421")
+    parser.add_argument("--throttle-prob", type=float, default=0.0)
+    parser.add_argument("--output", help="结果另存为 CSV")
+    args = parser.parse_args()
+
+    store = ReplayStore(synthetic=args.synthetic > 0)
+    for record_file in args.record_file:
+        store.load(record_file)
+
+    symbols = store.symbols() or [f"{i:02d}附息国债{i:02d}" for i in range(args.synthetic)]
+    if not symbols:
+        print("没有可用的债券：请指定 --record-file 或 --synthetic N")
+        return
+
+    server, throttle = start_server(store, latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                                    max_rate=args.max_rate, throttle_probability=args.throttle_prob)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    print(f"回放服务: {base_url}，债券数: {len(symbols)}")
+
+    rows = []
+    for concurrency, rate in product(args.concurrency, args.rate):
+        print(f"运行: 并发 {concurrency}，初始速率 {rate} 次/秒 ...")
+        rows.append(run_case(base_url, symbols, concurrency, rate, args.retry_count))
+
+    server.shutdown()
+    result = pd.DataFrame(rows)
+    print(result.to_string(index=False))
+    if args.output:
+        result.to_csv(args.output, index=False, encoding='utf-8-sig')
+        print(f"结果已保存至: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,28 @@ import akshare as ak
 import pandas as pd
 import matplotlib.pyplot as plt
 import os
+import sys
+import json
+import shutil
 import time
 import random
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from batch_bond_analysis import CacheStorage, NSSCurveFitter, YieldCurveEngine, config
+
 # 配置
 CACHE_DIR = "cache"
-CACHE_FILE = os.path.join(CACHE_DIR, "china_bond_yield_cache.csv")
+# 缓存路径不含扩展名，实际格式由 config.CACHE_FORMAT 决定
+CACHE_FILE = os.path.join(CACHE_DIR, "china_bond_yield_cache")
+# 分段抓取检查点：记录每个时间窗口的完成状态
+CHECKPOINT_FILE = os.path.join(CACHE_DIR, "china_bond_yield_windows.json")
+# 已完成窗口的数据先单独落盘于此，本次运行结束时再一次性合并入主缓存
+WINDOW_PARTS_DIR = os.path.join(CACHE_DIR, "china_bond_yield_windows")
+storage = CacheStorage(config.CACHE_FORMAT)
 CURVE_NAME = "中债国债收益率曲线"
 # 抓取的时间跨度限制（单次请求小于一年，建议300天）
 FETCH_STEP_DAYS = 300
@@ -17,114 +32,239 @@ FETCH_STEP_DAYS = 300
 DEFAULT_START_DATE = "2005-01-01"
 # 默认截止时间（None 表示持续更新至今天）
 DEFAULT_END_DATE = None
+# 并发抓取的窗口数
+FETCH_WORKERS = 3
+# 相邻两次请求的最小间隔（秒），所有线程共享
+FETCH_MIN_INTERVAL = 1.5
+# 单次运行中每个窗口的最多尝试次数，仍失败的窗口留待下次运行
+MAX_WINDOW_ATTEMPTS = 3
+# 无检查点的旧缓存窗口：数据行数低于工作日数的该比例视为存在缺口，需要重抓
+MIN_WINDOW_COVERAGE = 0.85
 
 # 设置中文字体（Windows常用字体）
 plt.rcParams['font.sans-serif'] = ['SimHei']
 plt.rcParams['axes.unicode_minus'] = False
 
-def fetch_yield_data(start_date_str, end_date_str):
+class RateLimiter:
+    """线程安全的请求节流器，保证相邻请求间隔不小于 min_interval（附加随机抖动）"""
+
+    def __init__(self, min_interval, jitter=0.5):
+        self._min_interval = min_interval
+        self._jitter = jitter
+        self._next_time = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_time)
+            self._next_time = start + self._min_interval + random.uniform(0, self._jitter)
+        time.sleep(max(0.0, start - now))
+
+
+def build_windows(start_date_str, end_date_str):
     """
-    分段抓取收益率数据，带拟人化延迟
+    从起始日期按 FETCH_STEP_DAYS 切分固定网格窗口，保证多次运行的窗口边界一致
     """
     start_dt = datetime.strptime(start_date_str, "%Y-%m-%d")
     end_dt = datetime.strptime(end_date_str, "%Y-%m-%d")
-    
-    all_data = []
+
+    windows = []
     current_start = start_dt
-    
-    while current_start < end_dt:
+    while current_start <= end_dt:
         current_end = min(current_start + timedelta(days=FETCH_STEP_DAYS), end_dt)
-        
-        s_str = current_start.strftime("%Y%m%d")
-        e_str = current_end.strftime("%Y%m%d")
-        
-        print(f"正在抓取 {s_str} 到 {e_str} 的数据...")
-        
+        windows.append((current_start, current_end))
+        current_start = current_start + timedelta(days=FETCH_STEP_DAYS + 1)
+    return windows
+
+
+def window_key(window_start):
+    return window_start.strftime("%Y-%m-%d")
+
+
+def load_checkpoints():
+    if os.path.exists(CHECKPOINT_FILE):
         try:
-            # 拟人操作：随机延迟
-            time.sleep(random.uniform(3.0, 6.0))
-            
-            df = ak.bond_china_yield(start_date=s_str, end_date=e_str)
-            if not df.empty:
-                # 只保留国债曲线
-                df_cgb = df[df['曲线名称'] == CURVE_NAME]
-                all_data.append(df_cgb)
-                print(f"  成功获取 {len(df_cgb)} 条国债记录")
-            
-        except Exception as e:
-            print(f"  抓取失败: {e}")
-            time.sleep(10) # 失败后多等一会
-            
-        current_start = current_end + timedelta(days=1)
-        
-    if not all_data:
+            with open(CHECKPOINT_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"检查点文件损坏，将按缓存数据重新判断 ({e})")
+    return {}
+
+
+def save_checkpoints(checkpoints):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = CHECKPOINT_FILE + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoints, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, CHECKPOINT_FILE)
+
+
+def window_business_days(w_start, w_end):
+    return np.busday_count(np.datetime64(w_start.date()), np.datetime64(w_end.date()) + 1)
+
+
+def plan_windows(windows, checkpoints, cache_df):
+    """
+    找出需要抓取的窗口：检查点未完成、失败或未覆盖到窗口末尾的窗口；
+    无检查点的窗口按缓存数据覆盖率判断，覆盖率不足视为缺口
+    """
+    if cache_df is not None and not cache_df.empty:
+        cached_dates = pd.to_datetime(cache_df['日期']).values.astype('datetime64[D]')
+        cached_dates.sort()
+    else:
+        cached_dates = np.array([], dtype='datetime64[D]')
+
+    pending = []
+    for w_start, w_end in windows:
+        entry = checkpoints.get(window_key(w_start))
+        if entry is not None:
+            if entry.get('status') != 'done' or entry.get('end', '') < w_end.strftime("%Y-%m-%d"):
+                pending.append((w_start, w_end))
+            continue
+
+        lo, hi = np.datetime64(w_start.date()), np.datetime64(w_end.date())
+        rows = np.searchsorted(cached_dates, hi, side='right') - np.searchsorted(cached_dates, lo, side='left')
+        business_days = window_business_days(w_start, w_end)
+        if business_days > 0 and rows < business_days * MIN_WINDOW_COVERAGE:
+            pending.append((w_start, w_end))
+    return pending
+
+
+def fetch_window(limiter, w_start, w_end):
+    """抓取单个窗口的国债曲线数据，失败时抛出异常"""
+    limiter.wait()
+    df = ak.bond_china_yield(start_date=w_start.strftime("%Y%m%d"), end_date=w_end.strftime("%Y%m%d"))
+    if df is None or df.empty:
         return pd.DataFrame()
-        
-    return pd.concat(all_data, ignore_index=True)
+    return df[df['曲线名称'] == CURVE_NAME]
+
+
+def merge_into_cache(cache_df, new_df):
+    """合并新数据并统一日期格式、去重、排序"""
+    frames = [f for f in (cache_df, new_df) if f is not None and not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    merged = pd.concat(frames, ignore_index=True)
+    merged['日期'] = pd.to_datetime(merged['日期']).dt.strftime("%Y-%m-%d")
+    merged.drop_duplicates(subset=['日期', '曲线名称'], keep='last', inplace=True)
+    merged.sort_values('日期', inplace=True)
+    merged.reset_index(drop=True, inplace=True)
+    return merged
+
+
+def fold_window_parts(cache_df):
+    """将已落盘的窗口数据一次性合并入主缓存并删除，返回 (合并后的缓存, 是否有合并)"""
+    if not os.path.isdir(WINDOW_PARTS_DIR):
+        return cache_df, False
+
+    bases = sorted({os.path.splitext(name)[0] for name in os.listdir(WINDOW_PARTS_DIR)
+                    if not name.endswith(".tmp")})
+    parts = [storage.read(os.path.join(WINDOW_PARTS_DIR, b)) for b in bases]
+    if not parts:
+        return cache_df, False
+
+    cache_df = merge_into_cache(cache_df, pd.concat(parts, ignore_index=True))
+    storage.write(cache_df, CACHE_FILE)
+    shutil.rmtree(WINDOW_PARTS_DIR, ignore_errors=True)
+    return cache_df, True
+
+
+def backfill(cache_df, start_date_str, end_date_str):
+    """
+    并发抓取所有缺失窗口：每完成一个窗口立即单独落盘并写检查点，失败窗口在本次运行内重试，
+    全部结束后一次性合并入主缓存。含工作日却返回空数据的窗口视为失败，不标记完成
+    """
+    checkpoints = load_checkpoints()
+    windows = build_windows(start_date_str, end_date_str)
+    pending = plan_windows(windows, checkpoints, cache_df)
+
+    if not pending:
+        return cache_df, False
+
+    print(f"共 {len(windows)} 个时间窗口，其中 {len(pending)} 个需要抓取（含缺口与失败重试）...")
+    limiter = RateLimiter(FETCH_MIN_INTERVAL)
+    updated = False
+
+    for attempt in range(1, MAX_WINDOW_ATTEMPTS + 1):
+        failed = []
+        with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+            futures = {executor.submit(fetch_window, limiter, s, e): (s, e) for s, e in pending}
+            for future in as_completed(futures):
+                w_start, w_end = futures[future]
+                key = window_key(w_start)
+                label = f"{w_start:%Y%m%d} 到 {w_end:%Y%m%d}"
+                try:
+                    df_cgb = future.result()
+                except Exception as e:
+                    print(f"  {label} 抓取失败（第 {attempt} 次）: {e}")
+                    checkpoints[key] = {'status': 'failed', 'attempts': checkpoints.get(key, {}).get('attempts', 0) + 1}
+                    failed.append((w_start, w_end))
+                    save_checkpoints(checkpoints)
+                    continue
+
+                if df_cgb.empty and window_business_days(w_start, w_end) > 0:
+                    # 空响应可能是临时故障，保持未完成状态，避免留下永久缺口
+                    print(f"  {label} 返回空数据（第 {attempt} 次），稍后重试")
+                    checkpoints[key] = {'status': 'empty', 'attempts': checkpoints.get(key, {}).get('attempts', 0) + 1}
+                    failed.append((w_start, w_end))
+                    save_checkpoints(checkpoints)
+                    continue
+
+                # 检查点：先落盘窗口数据，再标记窗口完成
+                if not df_cgb.empty:
+                    storage.write(df_cgb, os.path.join(WINDOW_PARTS_DIR, key))
+                    updated = True
+                checkpoints[key] = {
+                    'status': 'done', 'end': w_end.strftime("%Y-%m-%d"), 'rows': len(df_cgb),
+                    'fetched_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                }
+                save_checkpoints(checkpoints)
+                print(f"  {label} 成功获取 {len(df_cgb)} 条国债记录")
+
+        if not failed:
+            break
+        pending = failed
+        if attempt < MAX_WINDOW_ATTEMPTS:
+            print(f"{len(failed)} 个窗口失败，稍后重试...")
+            time.sleep(10)
+    else:
+        print(f"仍有 {len(pending)} 个窗口失败，已记录在检查点中，下次运行将自动重试。")
+
+    cache_df, _ = fold_window_parts(cache_df)
+    return cache_df, updated
+
 
 def load_and_update_cache():
     """
-    加载并更新缓存数据，支持双向更新
+    加载缓存并补齐设定时间范围内的所有缺失窗口（包括缓存范围中间的缺口）
     """
-    today = datetime.now().strftime("%Y-%m-%d")
-    
-    if os.path.exists(CACHE_FILE):
-        print(f"加载现有缓存: {CACHE_FILE}")
-        cache_df = pd.read_csv(CACHE_FILE)
-        cache_df['日期'] = pd.to_datetime(cache_df['日期']).dt.strftime("%Y-%m-%d")
-        
-        # 获取缓存的时间范围
-        min_date_str = cache_df['日期'].min()
-        max_date_str = cache_df['日期'].max()
-        
-        new_data_list = [cache_df]
-        needs_save = False
-
-        # 1. 检查是否需要向后更新（补齐历史数据）
-        if min_date_str > DEFAULT_START_DATE:
-            history_end = (datetime.strptime(min_date_str, "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d")
-            print(f"缓存最早日期为 {min_date_str}，晚于设定起始日期 {DEFAULT_START_DATE}。")
-            print(f"准备补全历史数据: {DEFAULT_START_DATE} 到 {history_end}...")
-            hist_data = fetch_yield_data(DEFAULT_START_DATE, history_end)
-            if not hist_data.empty:
-                new_data_list.append(hist_data)
-                needs_save = True
-
-        # 2. 检查是否需要向前更新（同步最新数据）
-        if max_date_str < today:
-            update_start = (datetime.strptime(max_date_str, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
-            print(f"缓存最后日期为 {max_date_str}，早于今天 {today}。")
-            print(f"准备同步最新数据: {update_start} 到 {today}...")
-            latest_data = fetch_yield_data(update_start, today)
-            if not latest_data.empty:
-                new_data_list.append(latest_data)
-                needs_save = True
-
-        if needs_save:
-            updated_df = pd.concat(new_data_list, ignore_index=True)
-            # 统一日期格式为字符串，确保排序和去重一致
-            updated_df['日期'] = pd.to_datetime(updated_df['日期']).dt.strftime("%Y-%m-%d")
-            updated_df.drop_duplicates(subset=['日期', '曲线名称'], inplace=True)
-            updated_df.sort_values('日期', inplace=True)
-            updated_df.to_csv(CACHE_FILE, index=False)
-            print(f"缓存已更新，当前共有 {len(updated_df)} 条记录。")
-            return updated_df
-        else:
-            print("当前缓存已覆盖设定时间范围，无需更新。")
-            return cache_df
+    end_date = DEFAULT_END_DATE or datetime.now().strftime("%Y-%m-%d")
+
+    cache_df = None
+    if storage.exists(CACHE_FILE):
+        print(f"加载现有缓存: {storage.path(CACHE_FILE)}")
+        cache_df = merge_into_cache(storage.read(CACHE_FILE), None)
     else:
-        print(f"未发现缓存，开始从 {DEFAULT_START_DATE} 到 {today} 完整抓取...")
-        full_data = fetch_yield_data(DEFAULT_START_DATE, today)
-        if not full_data.empty:
-            full_data['日期'] = pd.to_datetime(full_data['日期']).dt.strftime("%Y-%m-%d")
-            full_data.sort_values('日期', inplace=True)
-            full_data.to_csv(CACHE_FILE, index=False)
-            print(f"全量抓取完成，共 {len(full_data)} 条记录。")
-        return full_data
-
-def plot_yield_curves(df):
+        print(f"未发现缓存，开始从 {DEFAULT_START_DATE} 到 {end_date} 完整抓取...")
+
+    # 上次运行中断时已完成但尚未合并的窗口
+    cache_df, recovered = fold_window_parts(cache_df)
+    cache_df, updated = backfill(cache_df, DEFAULT_START_DATE, end_date)
+    updated = updated or recovered
+    if cache_df is None or cache_df.empty:
+        return pd.DataFrame()
+
+    if updated:
+        print(f"缓存已更新，当前共有 {len(cache_df)} 条记录。")
+    else:
+        print("当前缓存已覆盖设定时间范围，无需更新。")
+    return cache_df
+
+
+def plot_yield_curves(df, nss_params=None):
     """
-    绘制收益率曲线走势
+    绘制收益率曲线走势；传入 NSS 参数时在最新曲线上叠加拟合曲线
     """
     if df.empty:
         print("无数据可供绘图")
@@ -173,7 +313,15 @@ def plot_yield_curves(df):
     
     plt.figure(figsize=(12, 6))
     curve_data = [latest_row[c] for c in period_cols]
-    plt.plot(period_cols, curve_data, marker='o', linestyle='-', linewidth=2)
+    plt.plot(period_cols, curve_data, marker='o', linestyle='-', linewidth=2, label='中债收益率')
+    if nss_params is not None:
+        latest_params = nss_params[nss_params['日期'] == latest_date.strftime('%Y-%m-%d')]
+        if not latest_params.empty:
+            tenor_years = [tenor_to_months(c) / 12 for c in period_cols]
+            fitted = NSSCurveFitter.evaluate(
+                latest_params[NSSCurveFitter.PARAM_COLUMNS].iloc[-1].to_numpy(dtype=float), tenor_years)
+            plt.plot(period_cols, fitted, linestyle='--', linewidth=1.5, label='NSS 拟合曲线')
+            plt.legend(loc='best')
     plt.title(f'最新国债收益率曲线 (日期: {latest_date.strftime("%Y-%m-%d")})', fontsize=14)
     plt.xlabel('期限', fontsize=12)
     plt.ylabel('收益率 (%)', fontsize=12)
@@ -191,10 +339,12 @@ def main():
     df = load_and_update_cache()
     
     # 再次从缓存读取，确保数据是最完整的
-    if os.path.exists(CACHE_FILE):
-        df = pd.read_csv(CACHE_FILE)
+    if storage.exists(CACHE_FILE):
+        df = storage.read(CACHE_FILE)
         print(f"数据全部拉取并缓存完成，当前共有 {len(df)} 条记录。开始进行分析绘图...")
-        plot_yield_curves(df)
+        # 增量拟合 NSS 曲线参数，供 batch_bond_analysis 计算曲线利差
+        nss_params = YieldCurveEngine(config, cache_dir=CACHE_DIR).update(df)
+        plot_yield_curves(df, nss_params)
     else:
         print("未能获取到数据，请检查网络或接口限制。")
 
@@ -0,0 +1,188 @@
+"""
+中国货币网元数据接口离线回放服务
+回放 batch_bond_analysis.py --record 录制的请求，可注入延迟与 403/421 限流，用于不联网调优抓取参数
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+SEARCH_PATH = "/ags/ms/cm-u-bond-md/BondMarketInfoList2"
+DETAIL_PATH = "/ags/ms/cm-u-bond-md/BondDetailInfo"
+
+
+def request_key(path, data):
+    """回放匹配键：路径 + 去除空值后排序的表单参数"""
+    items = sorted((k, str(v)) for k, v in (data or {}).items() if v not in ("", None))
+    return path, tuple(items)
+
+
+class ReplayStore:
+    """录制数据 - 按请求匹配键返回录制的响应，未录制的请求可选用合成数据"""
+
+    def __init__(self, synthetic=False):
+        self._responses = {}
+        self._synthetic = synthetic
+
+    def __len__(self):
+        return len(self._responses)
+
+    def load(self, record_file):
+        """加载录制文件，同一请求多次录制时以最后一次成功响应为准"""
+        with open(record_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if entry.get('method') != 'POST':
+                    continue
+                key = request_key(entry['path'], entry.get('data'))
+                if entry['status'] == 200 or key not in self._responses:
+                    self._responses[key] = (entry['status'], entry['body'])
+
+    def symbols(self):
+        """录制中出现过的单券搜索简称（批量列表请求除外）"""
+        return sorted({
+            dict(items)['bondName'] for path, items in self._responses
+            if path == SEARCH_PATH and dict(items).get('pageSize') == '15' and 'bondName' in dict(items)
+        })
+
+    def lookup(self, path, data):
+        key = request_key(path, data)
+        if key in self._responses:
+            return self._responses[key]
+        if self._synthetic:
+            return 200, json.dumps(self._synthesize(path, data), ensure_ascii=False)
+        if path == SEARCH_PATH:
+            return 200, json.dumps({'data': {'resultList': []}})
+        return 200, json.dumps({'data': {}})
+
+    @staticmethod
+    def _synthesize(path, data):
+        """按请求参数确定性地生成响应"""
+        if path == SEARCH_PATH:
+            name = data.get('bondName', '')
+            code = hashlib.md5(name.encode('utf-8')).hexdigest()[:10]
+            return {'data': {'resultList': [{'bondName': name, 'bondDefinedCode': code}], 'pageTotal': 1}}
+
+        code = data.get('bondDefinedCode', '')
+        seed = int(hashlib.md5(code.encode('utf-8')).hexdigest(), 16)
+        return {'data': {'bondBaseInfo': {
+            'mrtyDate': f"{2027 + seed % 30}-{1 + seed % 12:02d}-{1 + seed % 28:02d}",
+            'parCouponRate': f"{1.5 + (seed % 200) / 100:.2f}",
+            'couponFrqncy': '半年' if seed % 2 else '年',
+            'bondType': '国债',
+            'intrstPayMeth': '固定利率'
+        }}}
+
+
+class ThrottleModel:
+    """限流模型 - 滑动 1 秒窗口内请求数超过上限或按概率随机返回 403/421"""
+
+    def __init__(self, max_rate=None, probability=0.0, statuses=(403, 421)):
+        self._max_rate = max_rate
+        self._probability = probability
+        self._statuses = statuses
+        self._recent = deque()
+        self._lock = threading.Lock()
+        self.served = 0
+        self.throttled = 0
+
+    def check(self):
+        """返回应响应的限流状态码，不限流时返回 None"""
+        now = time.monotonic()
+        with self._lock:
+            self.served += 1
+            while self._recent and now - self._recent[0] > 1.0:
+                self._recent.popleft()
+            self._recent.append(now)
+
+            over_rate = self._max_rate is not None and len(self._recent) > self._max_rate
+            if over_rate or random.random() < self._probability:
+                self.throttled += 1
+                return random.choice(self._statuses)
+        return None
+
+
+def make_handler(store, throttle, latency, jitter):
+    """构建请求处理器"""
+
+    class ReplayHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status, body):
+            payload = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json;charset=UTF-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            self._send(200, "")
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            data = dict(parse_qsl(self.rfile.read(length).decode('utf-8'), keep_blank_values=True))
+
+            time.sleep(latency + random.uniform(0, jitter))
+
+            status = throttle.check()
+            if status is not None:
+                self._send(status, "")
+                return
+            self._send(*store.lookup(self.path, data))
+
+        def log_message(self, format, *args):
+            pass
+
+    return ReplayHandler
+
+
+def start_server(store, host="127.0.0.1", port=0, latency=0.2, jitter=0.1,
+                 max_rate=None, throttle_probability=0.0):
+    """在后台线程启动回放服务，返回 (server, throttle)；port=0 时自动分配端口"""
+    throttle = ThrottleModel(max_rate, throttle_probability)
+    server = ThreadingHTTPServer((host, port), make_handler(store, throttle, latency, jitter))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, throttle
+
+
+def main():
+    parser = argparse.ArgumentParser(description="中国货币网元数据接口离线回放服务")
+    parser.add_argument("--record-file", action="append", default=[], help="录制文件，可多次指定")
+    parser.add_argument("--synthetic", action="store_true", help="未录制的请求返回合成数据")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=200, help="每个请求的基础延迟")
+    parser.add_argument("--jitter-ms", type=float, default=100, help="在基础延迟上叠加的随机延迟上限")
+    parser.add_argument("--max-rate", type=float, default=None, help="每秒请求数上限，超出返回 403/421")
+    parser.add_argument("--throttle-prob", type=float, default=0.0, help="随机返回 403/421 的概率")
+    args = parser.parse_args()
+
+    store = ReplayStore(synthetic=args.synthetic)
+    for record_file in args.record_file:
+        store.load(record_file)
+
+    server, throttle = start_server(store, args.host, args.port, args.latency_ms / 1000,
+                                    args.jitter_ms / 1000, args.max_rate, args.throttle_prob)
+    print(f"回放服务已启动: http://{args.host}:{server.server_address[1]} （已加载 {len(store)} 条录制）")
+    print(f"运行 python batch_bond_analysis.py --base-url http://{args.host}:{server.server_address[1]} 即可离线抓取")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print(f"共处理 {throttle.served} 个请求，其中限流 {throttle.throttled} 个。")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()